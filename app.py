@@ -1,12 +1,25 @@
+from dataclasses import replace
+from typing import Optional
+
 from screenshot_app.config import get_app_config, load_service_account_credentials
-from screenshot_app.google_clients import build_google_clients
+from screenshot_app.google_clients import build_drive_service, build_google_clients
 from screenshot_app.logging_setup import configure_logging
 from screenshot_app.processor import process_batch
 
 
-def main() -> bool:
+def main(shard_index: Optional[int] = None, shard_count: Optional[int] = None) -> bool:
+    """Run one batch; ``shard_index``/``shard_count`` override SHARD_INDEX/SHARD_COUNT."""
     logger = configure_logging()
     cfg = get_app_config()
+    shard = cfg.shard
+    if shard_index is not None or shard_count is not None:
+        shard = replace(
+            shard,
+            index=shard.index if shard_index is None else shard_index,
+            count=shard.count if shard_count is None else shard_count,
+        )
+        if not 0 <= shard.index < shard.count:
+            raise ValueError(f"Invalid shard {shard.index} of {shard.count}")
     logger.info("Starting screenshot batch run")
     try:
         credentials = load_service_account_credentials(cfg.scopes, cfg.delegated_user)
@@ -18,6 +31,22 @@ def main() -> bool:
             database_sheet_name=cfg.database_sheet_name,
             config_sheet_name=cfg.config_sheet_name,
             debug_cloudflare=cfg.debug_cloudflare,
+            pool=cfg.pool,
+            upload=cfg.upload,
+            capture=cfg.capture,
+            encode=cfg.encode,
+            sheets=cfg.sheets,
+            checkpoint=cfg.checkpoint,
+            budget=cfg.budget,
+            politeness=cfg.politeness,
+            readiness=cfg.readiness,
+            interception=cfg.interception,
+            cloudflare=cfg.cloudflare,
+            capture_cache=cfg.capture_cache,
+            shard=shard,
+            metrics=cfg.metrics,
+            # httplib2 is not thread-safe, so each uploader thread gets its own client
+            drive_service_factory=lambda: build_drive_service(credentials),
         )
     except Exception:
         logger.exception("Fatal error running batch")
@@ -0,0 +1,510 @@
+"""Offline throughput benchmark for ``process_batch``.
+
+Serves a synthetic site farm from a local HTTP server (plain articles, tall
+pages, client-rendered SPA pages, pages held open by slow trackers and a fake
+Cloudflare challenge) on ``*.localhost`` domains, and runs the real batch
+pipeline against in-memory stand-ins for the Sheets and Drive APIs. Only
+Chrome and chromedriver are needed; nothing leaves the machine.
+
+    python benchmark.py --rows 60 --preset legacy --preset default --preset workers-4
+
+Reports rows/minute, p50/p95 per phase, peak resident memory of the process
+tree (Chrome included) and row statuses for each preset.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from screenshot_app.config import (
+    BudgetConfig,
+    CaptureCacheConfig,
+    CaptureConfig,
+    CheckpointConfig,
+    CloudflareConfig,
+    EncodeConfig,
+    InterceptionConfig,
+    MetricsConfig,
+    PolitenessConfig,
+    PoolConfig,
+    ReadinessConfig,
+    SheetsConfig,
+    UploadConfig,
+)
+from screenshot_app.driver_manager import tree_memory_mb
+from screenshot_app.logging_setup import configure_logging
+from screenshot_app.metrics import PHASES, percentile
+from screenshot_app.processor import process_batch
+
+
+# Page kinds in the corpus and how many rows of each per cycle
+CORPUS = (("plain", 4), ("tall", 2), ("spa", 2), ("trackers", 2), ("giant", 1), ("challenge", 1))
+
+# How long the fake tracker endpoints hold their responses
+TRACKER_DELAY_SECONDS = 6.0
+
+# Config overrides per preset: section name -> dataclass field overrides
+PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    # Before the adaptive readiness engine, CDP capture and request blocking
+    "legacy": {
+        "readiness": {"engine": "fixed"},
+        "capture": {"engine": "window"},
+        "interception": {"block_ads": False, "block_media": False},
+        "upload": {"check_folders": False},
+    },
+    "default": {},
+    "workers-4": {"pool": {"workers": 4}},
+    "workers-4-webp": {"pool": {"workers": 4}, "encode": {"format": "webp"}},
+    "playwright-8": {"pool": {"workers": 8, "backend": "playwright"}},
+    "tiled": {"capture": {"engine": "tiled"}},
+}
+
+
+ARTICLE = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12 + "</p>"
+
+PAGES = {
+    "plain": "<html><head><title>Article {n}</title></head><body><h1>Article {n}</h1>" + ARTICLE * 8 + "</body></html>",
+    "tall": (
+        "<html><head><title>Tall {n}</title></head><body>"
+        + "".join(
+            f'<section style="height:400px;background:linear-gradient(#{i % 10}a{i % 7}, #fff)">'
+            f"<h2>Section {i}</h2>{ARTICLE}</section>"
+            for i in range(45)
+        )
+        + "</body></html>"
+    ),
+    # Taller than CAPTURE_MAX_HEIGHT, like an infinite-scroll feed
+    "giant": (
+        "<html><head><title>Feed {n}</title></head><body>"
+        + "".join(
+            f'<article style="height:600px;border-bottom:4px solid #{i % 9}{i % 7}{i % 5}">{ARTICLE}</article>'
+            for i in range(100)
+        )
+        + "</body></html>"
+    ),
+    "spa": (
+        "<html><head><title>App {n}</title></head><body><div id='app'>Loading...</div><script>"
+        "setTimeout(function () {{ fetch('/api/{n}').then(function (r) {{ return r.json(); }})"
+        ".then(function (d) {{ document.getElementById('app').innerHTML = d.items.map(function (i) {{"
+        " return '<article><h2>' + i + '</h2>" + ARTICLE + "</article>'; }}).join(''); }}); }}, 800);"
+        "</script></body></html>"
+    ),
+    "trackers": (
+        "<html><head><title>Tracked {n}</title><script async src='/slow/tracker.js'></script></head><body>"
+        "<h1>Tracked {n}</h1>" + ARTICLE * 6 + "<img src='/slow/pixel.gif' width='1' height='1'>"
+        "<script>setInterval(function () {{ fetch('/slow/beacon'); }}, 1500);</script></body></html>"
+    ),
+    # Carries the title, DOM markers and header cloudflare.challenge_markers looks for
+    "challenge": (
+        "<html><head><title>Just a moment...</title></head><body><div id='challenge-stage'></div>"
+        "<form id='challenge-form'></form><script src='/cdn-cgi/challenge-platform/h/b/orchestrate/v1'></script>"
+        "</body></html>"
+    ),
+}
+
+
+class SiteFarmHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        kind, n = parts[0], parts[-1]
+        try:
+            if kind == "api":
+                time.sleep(0.5)
+                body = json.dumps({"items": [f"Item {n}.{i}" for i in range(20)]}).encode()
+                self._send(200, body, "application/json")
+            elif kind == "slow":
+                time.sleep(TRACKER_DELAY_SECONDS)
+                self._send(200, b"", "application/javascript")
+            elif kind == "cdn-cgi":
+                self._send(200, b"", "application/javascript")
+            elif kind == "challenge":
+                headers = {"cf-mitigated": "challenge", "Server": "cloudflare"}
+                self._send(403, PAGES[kind].format(n=n).encode(), "text/html", headers)
+            elif kind in PAGES:
+                self._send(200, PAGES[kind].format(n=n).encode(), "text/html")
+            else:
+                self._send(404, b"not found", "text/plain")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_site_farm() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteFarmHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="site-farm", daemon=True).start()
+    return server
+
+
+def build_corpus(rows: int, domains: int, port: int) -> List[str]:
+    """URLs spread over ``domains`` hosts; challenge pages share one host, like a real challenged site."""
+    kinds = list(itertools.chain.from_iterable([kind] * weight for kind, weight in CORPUS))
+    urls = []
+    for i in range(rows):
+        kind = kinds[i % len(kinds)]
+        host = "challenged.localhost" if kind == "challenge" else f"site{i % domains}.localhost"
+        urls.append(f"http://{host}:{port}/{kind}/{i}")
+    return urls
+
+
+class FakeWorksheet:
+    """In-memory worksheet implementing the gspread calls the app makes."""
+
+    def __init__(self, rows: List[List[str]], latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[int, int], str] = {}
+        for r, row in enumerate(rows, start=1):
+            for c, value in enumerate(row, start=1):
+                self._cells[(r, c)] = value
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _bounds(a1: str) -> Tuple[int, int, int, int]:
+        first, _, last = a1.partition(":")
+        r1, c1 = a1_to_rowcol(first)
+        r2, c2 = a1_to_rowcol(last) if last else (r1, c1)
+        return r1, c1, r2, c2
+
+    def _get(self, a1: str) -> List[List[str]]:
+        r1, c1, r2, c2 = self._bounds(a1)
+        values = []
+        for r in range(r1, r2 + 1):
+            row = [self._cells.get((r, c), "") for c in range(c1, c2 + 1)]
+            while row and row[-1] == "":
+                row.pop()
+            values.append(row)
+        # Like the Sheets API, trailing empty rows are left out
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _update(self, range_name: str, values: List[List[Any]]) -> None:
+        r1, c1, _, _ = self._bounds(range_name)
+        for dr, row in enumerate(values):
+            for dc, value in enumerate(row):
+                self._cells[(r1 + dr, c1 + dc)] = str(value)
+
+    def get(self, a1: str) -> List[List[str]]:
+        with self._lock:
+            self._call()
+            return self._get(a1)
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        with self._lock:
+            self._call()
+            return [self._get(a1) for a1 in ranges]
+
+    def row_values(self, row: int) -> List[str]:
+        with self._lock:
+            self._call()
+            values = self._get(f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, 26)}")
+            return values[0] if values else []
+
+    def col_values(self, col: int) -> List[str]:
+        with self._lock:
+            self._call()
+            last_row = max((r for (r, c), value in self._cells.items() if c == col and value != ""), default=0)
+            return [self._cells.get((r, col), "") for r in range(1, last_row + 1)]
+
+    def update(self, range_name: str, values: List[List[Any]]) -> None:
+        with self._lock:
+            self._call()
+            self._update(range_name, values)
+
+    def batch_update(self, data: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._call()
+            for item in data:
+                self._update(item["range"], item["values"])
+
+    def column(self, col: int, first_row: int, last_row: int) -> List[str]:
+        with self._lock:
+            return [self._cells.get((r, col), "") for r in range(first_row, last_row + 1)]
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets: Dict[str, FakeWorksheet]):
+        self.worksheets = worksheets
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        return self.worksheets[name]
+
+
+class FakeSheetsClient:
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.spreadsheet
+
+
+class FakeDriveRequest:
+    def __init__(self, drive: "FakeDrive", media: Any = None):
+        self.drive = drive
+        self.media = media
+        self.resumable_uri = None
+
+    def next_chunk(self):
+        size = self.media.size() if self.media is not None else 0
+        return None, {"id": self.drive.store(size)}
+
+    def execute(self) -> Dict[str, str]:
+        return {"id": self.drive.store(0)}
+
+
+class FakeDriveLookup:
+    """A metadata call; it takes no time of its own when sent in a batch."""
+
+    def __init__(self, drive: "FakeDrive", response: Dict[str, Any]):
+        self.drive = drive
+        self.response = response
+
+    def execute(self) -> Dict[str, Any]:
+        self.drive.request()
+        return self.response
+
+
+class FakeBatch:
+    def __init__(self, drive: "FakeDrive", callback: Callable[[str, Any, Any], None]):
+        self.drive = drive
+        self.callback = callback
+        self.requests: List[Tuple[str, FakeDriveLookup]] = []
+
+    def add(self, request: FakeDriveLookup, request_id: str) -> None:
+        self.requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self.drive.request()
+        for request_id, request in self.requests:
+            self.callback(request_id, request.response, None)
+
+
+class FakeDriveFiles:
+    def __init__(self, drive: "FakeDrive"):
+        self.drive = drive
+
+    def get(self, fileId: str, fields: str = "", supportsAllDrives: bool = False) -> FakeDriveLookup:
+        return FakeDriveLookup(
+            self.drive,
+            {
+                "id": fileId,
+                "name": fileId,
+                "mimeType": "application/vnd.google-apps.folder",
+                "trashed": False,
+                "capabilities": {"canAddChildren": True},
+            },
+        )
+
+    def list(self, **kwargs: Any) -> FakeDriveLookup:
+        return FakeDriveLookup(self.drive, {"files": []})
+
+    def create(self, body: Dict[str, Any], media_body: Any = None, fields: str = "") -> FakeDriveRequest:
+        return FakeDriveRequest(self.drive, media_body)
+
+    def copy(self, fileId: str, body: Dict[str, Any], fields: str = "") -> FakeDriveRequest:
+        return FakeDriveRequest(self.drive)
+
+
+class FakeDrive:
+    """Drive v3 stand-in: uploads take ``latency`` plus their size at ``mbps``."""
+
+    def __init__(self, latency: float = 0.2, mbps: float = 20.0):
+        self.latency = latency
+        self.mbps = mbps
+        self.files_created = 0
+        self.bytes_uploaded = 0
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def files(self) -> FakeDriveFiles:
+        return FakeDriveFiles(self)
+
+    def new_batch_http_request(self, callback: Callable[[str, Any, Any], None]) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def request(self) -> None:
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+
+    def store(self, size: int) -> str:
+        time.sleep(self.latency + size * 8 / (self.mbps * 1_000_000))
+        with self._lock:
+            self.files_created += 1
+            self.requests += 1
+            self.bytes_uploaded += size
+            return f"fake-{next(self._ids)}"
+
+
+class MemorySampler:
+    """Peak resident memory of this process and every descendant (Chrome included)."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, tree_memory_mb(os.getpid()) or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_preset(name: str, urls: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    overrides = PRESETS[name]
+    header = ["Link", "Platform", "Link to folder", "Client", "Notes", "Status"]
+    database = FakeWorksheet(
+        [header] + [[url, "Web", f"folder-{i % 5}", f"Client {i % 7}"] for i, url in enumerate(urls)],
+        latency=args.sheets_latency,
+    )
+    configurations = FakeWorksheet([["Batch size", str(len(urls))], ["Start row", "0"]], latency=args.sheets_latency)
+    # Duck-typed stand-in for gspread.Client
+    gc: Any = FakeSheetsClient(FakeSpreadsheet({"Database": database, "Configurations": configurations}))
+    drive = FakeDrive(latency=args.drive_latency, mbps=args.drive_mbps)
+
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as state:
+        report_path = os.path.join(state, "report.jsonl")
+
+        def section(key: str, config: Any) -> Any:
+            return replace(config, **overrides.get(key, {}))
+
+        started = time.monotonic()
+        with MemorySampler() as memory:
+            process_batch(
+                gc=gc,
+                drive_service=drive,
+                spreadsheet_id="benchmark",
+                database_sheet_name="Database",
+                config_sheet_name="Configurations",
+                debug_cloudflare=False,
+                pool=section("pool", PoolConfig()),
+                upload=section("upload", UploadConfig(session_dir=os.path.join(state, "sessions"))),
+                capture=section("capture", CaptureConfig()),
+                encode=section("encode", EncodeConfig()),
+                sheets=section("sheets", SheetsConfig()),
+                drive_service_factory=lambda: drive,
+                checkpoint=CheckpointConfig(path=os.path.join(state, "progress.sqlite3")),
+                budget=BudgetConfig(),
+                politeness=section(
+                    "politeness",
+                    PolitenessConfig(min_interval_seconds=args.min_interval, max_interval_seconds=args.max_interval),
+                ),
+                readiness=section("readiness", ReadinessConfig()),
+                interception=section("interception", InterceptionConfig()),
+                cloudflare=CloudflareConfig(memory_path=os.path.join(state, "cloudflare.json"), memory_sheet=""),
+                capture_cache=CaptureCacheConfig(path=os.path.join(state, "captures.sqlite3")),
+                metrics=MetricsConfig(report_path=report_path),
+            )
+        elapsed = time.monotonic() - started
+        with open(report_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+
+    statuses: Dict[str, int] = {}
+    for status in database.column(6, 2, len(urls) + 1):
+        statuses[status or "(none)"] = statuses.get(status or "(none)", 0) + 1
+    phases = {}
+    for phase in PHASES:
+        values = [row[phase] for row in rows if phase in row]
+        if values:
+            phases[phase] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "rows": len(values)}
+    return {
+        "preset": name,
+        "rows": len(urls),
+        "seconds": elapsed,
+        "rows_per_minute": len(urls) / elapsed * 60 if elapsed else 0.0,
+        "peak_rss_mb": memory.peak_mb,
+        "capture_peak_mb": max((row.get("capture_peak_mb", 0.0) for row in rows), default=0.0),
+        "phases": phases,
+        "statuses": statuses,
+        "sheets_calls": database.calls + configurations.calls,
+        "drive_files": drive.files_created,
+        "drive_requests": drive.requests,
+        "drive_mb": drive.bytes_uploaded / 1_000_000,
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(
+        f"\n== {result['preset']}: {result['rows']} rows in {result['seconds']:.1f}s"
+        f" = {result['rows_per_minute']:.1f} rows/min, peak RSS {result['peak_rss_mb']:.0f} MB,"
+        f" capture peak {result['capture_peak_mb']:.0f} MB"
+    )
+    for phase, stats in result["phases"].items():
+        print(f"   {phase:<11} p50 {stats['p50']:7.2f}s   p95 {stats['p95']:7.2f}s   ({stats['rows']} rows)")
+    print("   statuses: " + ", ".join(f"{status} x{count}" for status, count in sorted(result["statuses"].items())))
+    print(
+        f"   sheets calls {result['sheets_calls']}, drive files {result['drive_files']}"
+        f" ({result['drive_mb']:.1f} MB) in {result['drive_requests']} requests"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=40, help="rows per preset")
+    parser.add_argument("--domains", type=int, default=8, help="hosts the corpus is spread over")
+    parser.add_argument("--preset", action="append", choices=sorted(PRESETS), help="repeatable; default: all")
+    parser.add_argument("--min-interval", type=float, default=2.0, help="per-domain politeness interval")
+    parser.add_argument("--max-interval", type=float, default=5.0)
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="seconds per fake Sheets call")
+    parser.add_argument("--drive-latency", type=float, default=0.2, help="seconds per fake Drive request")
+    parser.add_argument("--drive-mbps", type=float, default=20.0, help="fake Drive upload bandwidth")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    configure_logging()
+    if os.getenv("LOG_LEVEL") is None:
+        logging.getLogger().setLevel(logging.WARNING)
+    server = start_site_farm()
+    urls = build_corpus(args.rows, args.domains, server.server_address[1])
+    results = []
+    try:
+        for name in args.preset or list(PRESETS):
+            result = run_preset(name, urls, args)
+            print_result(result)
+            results.append(result)
+    finally:
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,27 @@ Modules:
 - config: Configuration and environment loading
 - logging_setup: Logger configuration
 - google_clients: Google Sheets and Drive clients
+- sheets: Sheet reads and batched status write-back
 - driver_factory: Selenium/Chrome driver creation
+- cdp_driver: Shared-Chrome backend driving isolated contexts over CDP (Playwright; imported on demand)
+- driver_manager: Driver health checks, recycling and process cleanup
+- interception: Blocking of ad, analytics and media requests
 - cloudflare: Cloudflare detection/bypass helpers
 - screenshotter: Screenshot logic and filename utilities
+- devices: Device profiles captured from a single page load
+- encoding: Output format conversion and size budgets
+- capture_cache: Capture fingerprints for skipping unchanged pages and duplicate uploads
 - processor: Batch processing orchestration
+- pool: Concurrent browser worker pool
+- uploader: Background Drive upload pipeline
+- drive_folders: Batched Drive folder checks and lookup of files already uploaded
+- watchdog: Per-phase deadlines enforced from a background thread
+- checkpoint: Durable per-row progress for crash-safe resumption
+- budget: Wall-clock budget and per-row latency estimate
+- scheduler: Per-domain politeness scheduling of batch rows
+- sharding: Splitting a run across several runners
+- readiness: Page readiness detection after navigation
+- metrics: Per-row phase timings and run reports
 - models: Typed models used across the app
 """
 
@@ -15,10 +32,26 @@ from . import (
     config,
     logging_setup,
     google_clients,
+    sheets,
     driver_factory,
+    driver_manager,
+    interception,
     cloudflare,
     screenshotter,
+    devices,
+    encoding,
+    capture_cache,
     processor,
+    pool,
+    uploader,
+    drive_folders,
+    watchdog,
+    checkpoint,
+    budget,
+    scheduler,
+    sharding,
+    readiness,
+    metrics,
     models,
 )
 
@@ -26,10 +59,26 @@ __all__ = [
     "config",
     "logging_setup",
     "google_clients",
+    "sheets",
     "driver_factory",
+    "driver_manager",
+    "interception",
     "cloudflare",
     "screenshotter",
+    "devices",
+    "encoding",
+    "capture_cache",
     "processor",
+    "pool",
+    "uploader",
+    "drive_folders",
+    "watchdog",
+    "checkpoint",
+    "budget",
+    "scheduler",
+    "sharding",
+    "readiness",
+    "metrics",
     "models",
 ]
 
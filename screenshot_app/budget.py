@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+
+
+class TimeBudget:
+    """Wall-clock budget for a run, with a running estimate of per-row latency.
+
+    ``admit`` is asked before each row starts. It refuses once the projected
+    finish of one more row (``now + estimate``) would run into the last
+    ``reserve_seconds`` of the budget, which are kept for draining uploads and
+    writing statuses back. The estimate is an exponentially weighted moving
+    average of observed row times, seeded with ``initial_estimate``. Safe to
+    call from worker threads.
+    """
+
+    def __init__(
+        self,
+        seconds: float,
+        reserve_seconds: float = 120.0,
+        initial_estimate: float = 30.0,
+        smoothing: float = 0.3,
+    ):
+        self.seconds = seconds
+        self.reserve_seconds = reserve_seconds
+        self.smoothing = smoothing
+        self.logger = logging.getLogger("screenshot_app.budget")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._estimate = initial_estimate
+        self._observed = 0
+        self._exhausted = False
+
+    @property
+    def estimate(self) -> float:
+        return self._estimate
+
+    @property
+    def exhausted(self) -> bool:
+        return self._exhausted
+
+    def remaining(self) -> float:
+        return self.seconds - (time.monotonic() - self._started)
+
+    def observe(self, elapsed: float) -> None:
+        with self._lock:
+            if self._observed == 0:
+                self._estimate = elapsed
+            else:
+                self._estimate += self.smoothing * (elapsed - self._estimate)
+            self._observed += 1
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self._exhausted:
+                return False
+            remaining = self.remaining()
+            if remaining - self._estimate >= self.reserve_seconds:
+                return True
+            self._exhausted = True
+        self.logger.info(
+            "Time budget reached: %.0fs left, ~%.1fs per row over %s row(s), %.0fs reserved",
+            remaining,
+            self._estimate,
+            self._observed,
+            self.reserve_seconds,
+        )
+        return False
@@ -0,0 +1,383 @@
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from googleapiclient.errors import HttpError
+from PIL import Image
+
+from .models import CaptureStats, Fingerprint
+
+
+# Query parameters that only track where a click came from, never what the page shows
+TRACKING_PARAMS = ("fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "yclid", "_ga")
+
+# dHash grid; a 16x16 grid gives a 256-bit hash
+HASH_SIZE = 16
+
+# Drive appProperties an uploaded screenshot carries, so its capture is known without the local cache
+URL_PROPERTY = "captureUrl"
+SHA256_PROPERTY = "captureSha256"
+PHASH_PROPERTY = "capturePhash"
+SIZE_PROPERTY = "captureSize"
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: rows that differ only cosmetically share one capture.
+
+    The scheme, ``www.``, default ports, the fragment and tracking parameters
+    (``utm_*``, ``gclid``, ...) are dropped, the host lower-cased, remaining
+    parameters sorted and a trailing slash stripped from the path.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port and not (scheme == "http" and port == 80) and not (scheme == "https" and port == 443):
+        host = f"{host}:{port}"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    key = host + parts.path.rstrip("/")
+    # http and https almost always serve the same page, so the scheme is left out
+    return f"{key}?{urlencode(query)}" if query else key
+
+
+class DHash:
+    """Difference hash of an image fed to it from top to bottom, a strip at a time.
+
+    The image is reduced to a ``HASH_SIZE + 1`` by ``HASH_SIZE`` grayscale
+    grid and each bit records whether a cell is brighter than its right-hand
+    neighbour, so re-encoding noise and tiny repaints leave it unchanged. Each
+    strip is narrowed to the grid's columns with Pillow and its rows are added
+    into the grid's bands by how much of a band they cover, so only one strip
+    is ever decoded. ``begin`` sets the height of the whole image.
+    """
+
+    def __init__(self) -> None:
+        self.height = 0
+        self.rows = 0
+        self._bands: List[List[float]] = [[0.0] * (HASH_SIZE + 1) for _ in range(HASH_SIZE)]
+
+    def begin(self, height: int) -> None:
+        self.height = max(1, height)
+        self.rows = 0
+        self._bands = [[0.0] * (HASH_SIZE + 1) for _ in range(HASH_SIZE)]
+
+    def add_image(self, image: Image.Image, rows: Optional[int] = None) -> None:
+        """Add the next ``rows`` rows (default: all of ``image``); rows past its bottom are white."""
+        rows = image.height if rows is None else rows
+        columns = list(image.convert("L").resize((HASH_SIZE + 1, image.height), Image.Resampling.BOX).getdata())
+        white = [255.0] * (HASH_SIZE + 1)
+        for y in range(rows):
+            start = y * (HASH_SIZE + 1)
+            self._add_row(columns[start:start + HASH_SIZE + 1] if y < image.height else white)
+
+    def _add_row(self, values: Sequence[float]) -> None:
+        top = self.rows * HASH_SIZE / self.height
+        bottom = (self.rows + 1) * HASH_SIZE / self.height
+        self.rows += 1
+        band = int(top)
+        while band < HASH_SIZE and band < bottom:
+            weight = min(bottom, band + 1) - max(top, band)
+            cells = self._bands[band]
+            for col, value in enumerate(values):
+                cells[col] += weight * value
+            band += 1
+
+    def hexdigest(self) -> str:
+        # Cells of a band share their weights, so sums compare like means
+        bits = 0
+        for cells in self._bands:
+            for col in range(HASH_SIZE):
+                bits = (bits << 1) | (1 if cells[col] > cells[col + 1] else 0)
+        return f"{bits:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def fingerprint(png: bytes, hasher: Optional[DHash] = None, stats: Optional[CaptureStats] = None) -> Fingerprint:
+    """Exact and perceptual hash of a captured screenshot.
+
+    A ``hasher`` the capture already fed with every row of ``png`` (see
+    ``screenshotter.capture_page_png``) supplies the perceptual hash, so the
+    image is not decoded; otherwise the whole image is decoded and hashed, and
+    the memory that takes is added to ``stats``.
+    """
+    with Image.open(io.BytesIO(png)) as image:
+        # Opening only reads the header; pixels are decoded on first use
+        width, height = image.size
+        if hasher is None or hasher.height != height or hasher.rows < height:
+            hasher = DHash()
+            hasher.begin(height)
+            hasher.add_image(image)
+            if stats is not None:
+                # The decoded bitmap and its grayscale copy sit next to the PNG
+                held = len(png) + width * height * (len(image.getbands()) + 1)
+                stats.peak_bytes = max(stats.peak_bytes, held)
+    return Fingerprint(
+        sha256=hashlib.sha256(png).hexdigest(),
+        phash=hasher.hexdigest(),
+        width=width,
+        height=height,
+    )
+
+
+def url_property(url: str) -> str:
+    # Drive caps a property at 124 bytes, so the URL's cache key goes in hashed
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def app_properties(url: str, capture: Fingerprint) -> Dict[str, str]:
+    """Drive ``appProperties`` recording which capture of which URL a file holds."""
+    return {
+        URL_PROPERTY: url_property(url),
+        SHA256_PROPERTY: capture.sha256,
+        PHASH_PROPERTY: capture.phash,
+        SIZE_PROPERTY: f"{capture.width}x{capture.height}",
+    }
+
+
+def _fingerprint_from(properties: Dict[str, str]) -> Optional[Fingerprint]:
+    sha256, phash = properties.get(SHA256_PROPERTY), properties.get(PHASH_PROPERTY)
+    width, _, height = properties.get(SIZE_PROPERTY, "").partition("x")
+    if not (sha256 and phash and width.isdigit() and height.isdigit()):
+        return None
+    return Fingerprint(sha256, phash, int(width), int(height))
+
+
+def hash_distance(a: str, b: str) -> int:
+    """Number of differing bits between two hex perceptual hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+@dataclass
+class CachedCapture:
+    url_key: str
+    fingerprint: Fingerprint
+    # Drive folder id -> id of the file holding this capture in that folder
+    files: Dict[str, str] = field(default_factory=dict)
+    # Drive folder id -> extension of that file; empty for files cached before extensions were
+    extensions: Dict[str, str] = field(default_factory=dict)
+
+    def matches(self, other: Fingerprint, max_distance: int = 0) -> bool:
+        """Whether ``other`` shows the same page as this capture.
+
+        Identical bytes always match. With ``max_distance`` >= 0 a capture of
+        the same size whose perceptual hash differs in at most that many bits
+        matches too; a negative ``max_distance`` only accepts identical bytes.
+        """
+        mine = self.fingerprint
+        if mine.sha256 == other.sha256:
+            return True
+        if max_distance < 0 or (mine.width, mine.height) != (other.width, other.height):
+            return False
+        return hash_distance(mine.phash, other.phash) <= max_distance
+
+
+class CaptureCache:
+    """Record of what each URL looked like when it was last uploaded.
+
+    Keyed by ``normalize_url``; each entry holds the capture's fingerprint and
+    the Drive file it was uploaded to in every folder, so a later capture that
+    still matches can be reported as unchanged or copied on Drive instead of
+    uploaded again. A new fingerprint for a URL replaces its old files. Entries
+    unused for ``max_age_days`` are pruned, and beyond ``max_entries`` the least
+    recently used go first. Safe to call from worker threads.
+
+    The SQLite file only lives as long as the runner's cache. With a
+    ``drive_service``, a URL missing from it is looked up on Drive by the
+    ``app_properties`` its uploads carry, and ``exists`` confirms a cached
+    file is still there before a row is reported unchanged. The client is used
+    under ``lock`` when one is given.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5000,
+        max_age_days: float = 90.0,
+        max_distance: int = 6,
+        drive_service: Any = None,
+        lock: Optional[threading.Lock] = None,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.max_distance = max_distance
+        self.drive_service = drive_service
+        self.drive_lock = lock
+        self.logger = logging.getLogger("screenshot_app.cache")
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS captures (
+                url_key TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                url_key TEXT NOT NULL,
+                folder_id TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                extension TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (url_key, folder_id)
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "extension" not in columns:
+            self._conn.execute("ALTER TABLE files ADD COLUMN extension TEXT NOT NULL DEFAULT ''")
+
+    def lookup(self, url: str) -> Optional[CachedCapture]:
+        key = normalize_url(url)
+        cached = self._lookup_local(key)
+        if cached is None and self.drive_service is not None and self._load_from_drive(url):
+            cached = self._lookup_local(key)
+        return cached
+
+    def _lookup_local(self, key: str) -> Optional[CachedCapture]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, phash, width, height FROM captures WHERE url_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            files = self._conn.execute(
+                "SELECT folder_id, file_id, extension FROM files WHERE url_key = ?", (key,)
+            ).fetchall()
+            self._conn.execute("UPDATE captures SET used = ? WHERE url_key = ?", (time.time(), key))
+        return CachedCapture(
+            url_key=key,
+            fingerprint=Fingerprint(*row),
+            files={folder_id: file_id for folder_id, file_id, _ in files},
+            extensions={folder_id: extension for folder_id, _, extension in files},
+        )
+
+    def _load_from_drive(self, url: str) -> bool:
+        """Store the newest capture of ``url`` found on Drive by its properties; False when there is none."""
+        query = f"appProperties has {{ key='{URL_PROPERTY}' and value='{url_property(url)}' }} and trashed = false"
+        try:
+            with self.drive_lock if self.drive_lock is not None else nullcontext():
+                response = (
+                    self.drive_service.files()
+                    .list(
+                        q=query,
+                        fields="files(id, parents, fileExtension, appProperties)",
+                        orderBy="modifiedTime desc",
+                        pageSize=100,
+                        supportsAllDrives=True,
+                        includeItemsFromAllDrives=True,
+                    )
+                    .execute()
+                )
+        except Exception as e:
+            self.logger.warning("Could not look up earlier captures of %s on Drive: %s", url, e)
+            return False
+        newest: Optional[Fingerprint] = None
+        for item in response.get("files", []):
+            capture = _fingerprint_from(item.get("appProperties") or {})
+            # Older captures of the page are not what it looked like last
+            if capture is None or (newest is not None and capture.sha256 != newest.sha256):
+                continue
+            newest = newest or capture
+            for folder_id in item.get("parents", []):
+                self.store(url, capture, folder_id, item["id"], extension=item.get("fileExtension", ""))
+        if newest is not None:
+            self.logger.info("Found the last capture of %s on Drive", url)
+        return newest is not None
+
+    def exists(self, file_id: str) -> bool:
+        """Whether ``file_id`` is still on Drive and not trashed; True without a Drive client."""
+        if self.drive_service is None:
+            return True
+        try:
+            with self.drive_lock if self.drive_lock is not None else nullcontext():
+                request = self.drive_service.files().get(fileId=file_id, fields="id, trashed", supportsAllDrives=True)
+                response = request.execute()
+        except HttpError as e:
+            if e.resp.status != 404:
+                self.logger.warning("Could not check Drive file %s: %s", file_id, e)
+            return False
+        except Exception as e:
+            self.logger.warning("Could not check Drive file %s: %s", file_id, e)
+            return False
+        return not response.get("trashed")
+
+    def forget(self, url: str, folder_id: str) -> None:
+        """Drop the file recorded for ``url`` in ``folder_id``, e.g. once it is gone from Drive."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM files WHERE url_key = ? AND folder_id = ?", (normalize_url(url), folder_id)
+            )
+
+    def match(self, url: str, capture: Fingerprint) -> Optional[CachedCapture]:
+        """The cache entry for ``url`` if ``capture`` still shows the same page."""
+        cached = self.lookup(url)
+        if cached is None or not cached.matches(capture, self.max_distance):
+            return None
+        return cached
+
+    def store(self, url: str, capture: Fingerprint, folder_id: str, file_id: str, extension: str = "") -> None:
+        """Remember that ``capture`` of ``url`` is on Drive as ``file_id``, an ``extension`` file, in ``folder_id``."""
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, phash, width, height FROM captures WHERE url_key = ?", (key,)
+            ).fetchone()
+            if row is None or not CachedCapture(key, Fingerprint(*row)).matches(capture, self.max_distance):
+                # The page changed; files holding the old capture no longer represent it
+                self._conn.execute("DELETE FROM files WHERE url_key = ?", (key,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO captures (url_key, sha256, phash, width, height, used)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, capture.sha256, capture.phash, capture.width, capture.height, time.time()),
+                )
+            else:
+                self._conn.execute("UPDATE captures SET used = ? WHERE url_key = ?", (time.time(), key))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (url_key, folder_id, file_id, extension) VALUES (?, ?, ?, ?)",
+                (key, folder_id, file_id, extension),
+            )
+
+    def prune(self) -> None:
+        """Evict entries unused for ``max_age_days``, then the least recently used beyond ``max_entries``."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM captures WHERE used < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            if self.max_entries > 0:
+                deleted += self._conn.execute(
+                    "DELETE FROM captures WHERE url_key NOT IN"
+                    " (SELECT url_key FROM captures ORDER BY used DESC LIMIT ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.execute("DELETE FROM files WHERE url_key NOT IN (SELECT url_key FROM captures)")
+        if deleted:
+            self.logger.info("Evicted %s cached capture(s)", deleted)
@@ -0,0 +1,326 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from .driver_factory import StartupTimer, _browser_arguments, find_chrome_binary
+from .interception import apply_request_blocking
+from .watchdog import current_deadline
+
+try:
+    from playwright.async_api import async_playwright  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - optional dependency
+    async_playwright = None
+
+
+BROWSER_BACKENDS = ("selenium", "playwright")
+
+# Viewport of every page context; matches a maximized desktop window
+DEFAULT_VIEWPORT = {"width": 1920, "height": 1080}
+
+# CDP Network events the network-idle readiness probe reads from the performance log
+NETWORK_EVENTS = (
+    "Network.requestWillBeSent",
+    "Network.responseReceived",
+    "Network.loadingFinished",
+    "Network.loadingFailed",
+)
+
+
+# Bound on a page call made outside any phase deadline
+CALL_TIMEOUT_SECONDS = 120.0
+
+# Past the phase deadline, so the watchdog's expiry (and its abort of the page) normally wins
+DEADLINE_GRACE_SECONDS = 1.0
+
+
+class CdpBrowser:
+    """One Chrome driven over a single CDP connection from an asyncio event loop.
+
+    The loop runs on a background thread and owns the Playwright connection;
+    ``new_driver`` opens an isolated browser context (its own cookies, cache
+    and storage) with one page, wrapped in a ``PageDriver`` that worker threads
+    call like a Selenium driver. Every worker shares the same browser process,
+    so a page costs a context instead of a chromedriver plus a Chrome. With
+    ``debugger_address`` (``CHROME_DEBUGGER_ADDRESS``) it attaches to a running
+    Chrome instead of launching one. A browser that crashed is relaunched on
+    the next ``new_driver``.
+    """
+
+    def __init__(self, headless: bool = True, debugger_address: Optional[str] = None):
+        if async_playwright is None:
+            raise RuntimeError(
+                "The playwright browser backend needs the playwright package (pip install -r requirements-playwright.txt)"
+            )
+        self._async_playwright = async_playwright
+        self.headless = headless
+        if debugger_address is None:
+            debugger_address = os.getenv("CHROME_DEBUGGER_ADDRESS", "").strip()
+        self.debugger_address = debugger_address
+        self.logger = logging.getLogger("screenshot_app.driver")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="cdp-loop", daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _launch(self) -> None:
+        timer = StartupTimer()
+        if self._playwright is None:
+            self._playwright = await self._async_playwright().start()
+            timer.phase("playwright")
+        if self.debugger_address:
+            self._browser = await self._playwright.chromium.connect_over_cdp(f"http://{self.debugger_address}")
+            timer.phase("attach")
+            self.logger.info("Attached to Chrome at %s over CDP (%s)", self.debugger_address, timer.summary())
+            return
+        # Playwright adds its own headless switch
+        args = [arg for arg in _browser_arguments(self.headless) if not arg.startswith("--headless")]
+        self._browser = await self._playwright.chromium.launch(
+            headless=self.headless,
+            executable_path=find_chrome_binary(),
+            args=args,
+            ignore_default_args=["--enable-automation"],
+        )
+        timer.phase("launch")
+        self.logger.info("Launched shared Chrome %s for page contexts (%s)", self._browser.version, timer.summary())
+
+    def new_driver(self, performance_log: bool = False, blocked_urls: Sequence[str] = ()) -> "PageDriver":
+        with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._browser is not None:
+                    self.logger.warning("Shared Chrome disconnected; relaunching")
+                self.run(self._launch())
+            browser = self._browser
+        driver = PageDriver(self, browser, performance_log=performance_log)
+        apply_request_blocking(driver, blocked_urls)
+        return driver
+
+    async def _shutdown(self) -> None:
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+        finally:
+            if self._playwright is not None:
+                await self._playwright.stop()
+
+    def close(self) -> None:
+        try:
+            self.run(self._shutdown(), timeout=30)
+        except Exception:
+            self.logger.warning("Shared Chrome did not shut down cleanly", exc_info=True)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class PageElement:
+    """The few WebElement calls the Cloudflare helpers make, on a Playwright element handle."""
+
+    def __init__(self, driver: "PageDriver", handle: Any):
+        self._driver = driver
+        self.handle = handle
+
+    @property
+    def tag_name(self) -> str:
+        return self._driver._call(self.handle.evaluate("(e) => e.tagName.toLowerCase()"))
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        return self._driver._call(self.handle.get_attribute(name))
+
+    def click(self) -> None:
+        self._driver._call(self.handle.click(timeout=5000))
+
+
+class _SwitchTo:
+    def __init__(self, driver: "PageDriver"):
+        self._driver = driver
+
+    def frame(self, element: PageElement) -> None:
+        frame = self._driver._call(element.handle.content_frame())
+        if frame is None:
+            raise WebDriverException("Element is not a frame")
+        self._driver._frame = frame
+
+    def default_content(self) -> None:
+        self._driver._frame = None
+
+
+class PageDriver:
+    """A Selenium-compatible driver for one page of a shared ``CdpBrowser``.
+
+    Implements the WebDriver calls the capture pipeline makes (scripts, CDP
+    commands, the performance log, element lookup and screenshots) on an
+    isolated browser context, so navigation, readiness probes, Cloudflare
+    handling and capture engines work unchanged. Failures surface as Selenium
+    exceptions. ``abort`` is the counterpart of killing chromedriver: calls
+    blocked on this page fail at once and its context is closed, while the
+    other pages of the browser carry on.
+    """
+
+    def __init__(self, browser: CdpBrowser, playwright_browser: Any, performance_log: bool = False):
+        self._browser = browser
+        self._events: deque = deque()
+        self._inflight: Set[concurrent.futures.Future] = set()
+        self._inflight_lock = threading.Lock()
+        self._aborted = False
+        self._frame = None
+        self.script_timeout = 30.0
+        self.switch_to = _SwitchTo(self)
+        self.context, self.page, self.session = browser.run(self._open(playwright_browser, performance_log))
+
+    async def _open(self, playwright_browser: Any, performance_log: bool):
+        context = await playwright_browser.new_context(viewport=DEFAULT_VIEWPORT, bypass_csp=True)
+        await context.add_init_script('Object.defineProperty(navigator, "webdriver", {get: () => undefined})')
+        page = await context.new_page()
+        session = await context.new_cdp_session(page)
+        if performance_log:
+            for method in NETWORK_EVENTS:
+                session.on(method, self._recorder(method))
+            await session.send("Network.enable")
+        return context, page, session
+
+    def _recorder(self, method: str):
+        def record(params: Dict) -> None:
+            # Same shape as Selenium's performance log entries
+            message = json.dumps({"message": {"method": method, "params": params}})
+            self._events.append({"level": "INFO", "message": message, "timestamp": int(time.time() * 1000)})
+
+        return record
+
+    def _call(self, coro, timeout: Optional[float] = None) -> Any:
+        """Run ``coro`` on the browser's loop, for at most ``timeout`` or what is left of the phase deadline."""
+        if self._aborted:
+            coro.close()
+            raise WebDriverException("Page driver was aborted")
+        if timeout is None:
+            deadline = current_deadline()
+            timeout = deadline.remaining() + DEADLINE_GRACE_SECONDS if deadline is not None else CALL_TIMEOUT_SECONDS
+        future = self._browser.submit(coro)
+        with self._inflight_lock:
+            self._inflight.add(future)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutException(f"Page call did not finish within {timeout:.0f}s")
+        except concurrent.futures.CancelledError:
+            raise WebDriverException("Page driver was aborted")
+        except WebDriverException:
+            raise
+        except Exception as e:
+            raise WebDriverException(str(e)) from e
+        finally:
+            with self._inflight_lock:
+                self._inflight.discard(future)
+
+    def _target(self):
+        return self._frame or self.page.main_frame
+
+    # Scripts run as the body of a function, like Selenium's, so ``return`` and ``arguments`` work
+    def execute_script(self, script: str, *args: Any) -> Any:
+        source = f"(args) => (function () {{ {script} \n}}).apply(null, args)"
+        return self._call(self._target().evaluate(source, list(args)))
+
+    def execute_async_script(self, script: str, *args: Any) -> Any:
+        source = (
+            "(args) => new Promise(function (resolve) {"
+            f" (function () {{ {script} \n}}).apply(null, args.concat([resolve])); }})"
+        )
+        return self._call(self._evaluate_async(source, list(args)))
+
+    async def _evaluate_async(self, source: str, args: List[Any]) -> Any:
+        try:
+            return await asyncio.wait_for(self._target().evaluate(source, args), self.script_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"Script did not finish within {self.script_timeout:.0f}s")
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: Dict) -> Dict:
+        return self._call(self.session.send(cmd, cmd_args)) or {}
+
+    def get_log(self, log_type: str) -> List[Dict]:
+        if log_type != "performance":
+            return []
+        entries = []
+        while self._events:
+            entries.append(self._events.popleft())
+        return entries
+
+    def find_elements(self, by: str, value: str) -> List[PageElement]:
+        if by == By.XPATH:
+            selector = f"xpath={value}"
+        elif by == By.TAG_NAME or by == By.CSS_SELECTOR:
+            selector = value
+        else:
+            raise WebDriverException(f"Unsupported locator strategy: {by}")
+        return [PageElement(self, handle) for handle in self._call(self._target().query_selector_all(selector))]
+
+    def find_element(self, by: str, value: str) -> PageElement:
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {by}={value}")
+        return elements[0]
+
+    @property
+    def title(self) -> str:
+        return self._call(self.page.title())
+
+    @property
+    def page_source(self) -> str:
+        return self._call(self.page.content())
+
+    @property
+    def current_url(self) -> str:
+        return self.page.url
+
+    def set_window_size(self, width: int, height: int) -> None:
+        self._call(self.page.set_viewport_size({"width": int(width), "height": int(height)}))
+
+    def get_screenshot_as_png(self) -> bytes:
+        return self._call(self.page.screenshot(type="png"))
+
+    def set_script_timeout(self, seconds: float) -> None:
+        self.script_timeout = seconds
+
+    def set_page_load_timeout(self, seconds: float) -> None:
+        pass
+
+    def implicitly_wait(self, seconds: float) -> None:
+        pass
+
+    def maximize_window(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        """Fail every call in flight on this page and close its context in the background."""
+        self._aborted = True
+        with self._inflight_lock:
+            inflight = list(self._inflight)
+        for future in inflight:
+            future.cancel()
+        self._browser.submit(self._close())
+
+    async def _close(self) -> None:
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+
+    def quit(self) -> None:
+        if not self._aborted:
+            self._aborted = True
+            self._browser.run(self._close(), timeout=30)
@@ -0,0 +1,149 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+# Per-row checkpoint states
+PENDING = "pending"
+CAPTURED = "captured"
+UPLOADED = "uploaded"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Rows in these states are never processed again within a cycle
+DONE_STATES = (UPLOADED, SKIPPED)
+
+# Sheet status of an uploaded capture that was cut at the height cap
+TRUNCATED_STATUS = "True (truncated)"
+
+# Sheet statuses of rows whose screenshot is on Drive
+UPLOADED_STATUSES = ("True", TRUNCATED_STATUS)
+
+# Sheet statuses that end a row for good without an upload
+SKIP_STATUSES = ("Skipped (blacklist)", "Skipped (Cloudflare)", "Unchanged")
+
+
+@dataclass
+class Checkpoint:
+    row_idx: int
+    link: str
+    state: str
+    status: str
+    attempts: int
+    updated: float
+
+
+def state_for_status(status: str) -> str:
+    """Map a sheet status onto the checkpoint state it leaves the row in."""
+    if status in UPLOADED_STATUSES:
+        return UPLOADED
+    if status == "Captured":
+        return CAPTURED
+    if status in SKIP_STATUSES:
+        return SKIPPED
+    return FAILED
+
+
+class CheckpointStore:
+    """Durable per-row progress in a local SQLite file.
+
+    Every row records its state, last sheet status and attempt count as it moves
+    through capture and upload, so a run killed mid-batch can be restarted
+    without redoing finished rows. Entries are keyed by sheet and row index and
+    only trusted while the row still holds the same link. The store is cleared
+    whenever the sheet cursor wraps back to 0, and entries older than
+    ``max_age_seconds`` are pruned so a later cycle never inherits them.
+    Safe to call from worker threads.
+    """
+
+    def __init__(self, path: str, sheet_key: str, max_age_seconds: float = 72 * 3600):
+        self.path = path
+        self.sheet_key = sheet_key
+        self.max_age_seconds = max_age_seconds
+        self.logger = logging.getLogger("screenshot_app.checkpoint")
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                sheet TEXT NOT NULL,
+                row_idx INTEGER NOT NULL,
+                link TEXT NOT NULL,
+                state TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL,
+                PRIMARY KEY (sheet, row_idx)
+            )
+            """
+        )
+
+    def load(self, start_row: int, end_row: int) -> Dict[int, Checkpoint]:
+        """Checkpoints for data rows ``[start_row, end_row)``."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT row_idx, link, state, status, attempts, updated FROM rows"
+                " WHERE sheet = ? AND row_idx >= ? AND row_idx < ?",
+                (self.sheet_key, start_row, end_row),
+            )
+            return {row[0]: Checkpoint(*row) for row in cursor.fetchall()}
+
+    def get(self, row_idx: int) -> Optional[Checkpoint]:
+        return self.load(row_idx, row_idx + 1).get(row_idx)
+
+    def start(self, row_idx: int, link: str) -> int:
+        """Mark a row pending before an attempt and return its attempt number.
+
+        A row whose link changed since it was checkpointed starts over at 1.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO rows (sheet, row_idx, link, state, attempts, updated)
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT (sheet, row_idx) DO UPDATE SET
+                    attempts = CASE WHEN rows.link = excluded.link THEN rows.attempts + 1 ELSE 1 END,
+                    link = excluded.link,
+                    state = excluded.state,
+                    updated = excluded.updated
+                """,
+                (self.sheet_key, row_idx, link, PENDING, now),
+            )
+            row = self._conn.execute(
+                "SELECT attempts FROM rows WHERE sheet = ? AND row_idx = ?",
+                (self.sheet_key, row_idx),
+            ).fetchone()
+        return int(row[0]) if row else 1
+
+    def record(self, row_idx: int, status: str) -> None:
+        """Store a row's latest sheet status and the state it implies."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rows SET state = ?, status = ?, updated = ? WHERE sheet = ? AND row_idx = ?",
+                (state_for_status(status), status, time.time(), self.sheet_key, row_idx),
+            )
+
+    def clear(self) -> None:
+        """Forget every row of this sheet, e.g. once a full pass has finished."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows WHERE sheet = ?", (self.sheet_key,))
+        self.logger.info("Checkpoints cleared for %s", self.sheet_key)
+
+    def prune(self) -> None:
+        """Drop entries older than ``max_age_seconds``."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM rows WHERE updated < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+        if deleted:
+            self.logger.info("Pruned %s stale checkpoint(s)", deleted)
@@ -1,24 +1,60 @@
+import calendar
+import json
+import logging
+import os
+import threading
 import time
 import uuid
-from typing import List
+from typing import Dict, List, Optional
 
+import gspread
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
 
 
-def is_cloudflare_verification(driver) -> bool:
+# One script reads every page-side challenge signal in a single round trip
+CHALLENGE_PROBE_SCRIPT = """
+    const title = (document.title || '').toLowerCase();
+    const titles = ['just a moment', 'attention required! | cloudflare', 'verify you are human'];
+    const selectors = [
+      '#challenge-form', '#challenge-stage', '#challenge-running', '#cf-challenge-running',
+      'div.cf-browser-verification', '#cf-wrapper #cf-error-details',
+      'script[src*="/cdn-cgi/challenge-platform/"]',
+    ];
+    const found = [];
+    titles.forEach(function (t) { if (title.indexOf(t) === 0) { found.push('title:' + t); } });
+    selectors.forEach(function (s) { if (document.querySelector(s)) { found.push(s); } });
+    const heading = Array.from(document.querySelectorAll('h1, h2')).some(function (h) {
+      return (h.textContent || '').indexOf('Verify you are human') !== -1;
+    });
+    if (heading) { found.push('heading'); }
+    // Turnstile widgets also sit on ordinary forms, so the iframe only counts on a near-empty page
+    const turnstile = document.querySelector('iframe[src*="challenges.cloudflare.com"]');
+    const text = document.body ? (document.body.innerText || '').length : 0;
+    if (turnstile && text < 500) { found.push('turnstile'); }
+    return found;
+"""
+
+
+def challenge_markers(driver, headers: Optional[Dict[str, str]] = None) -> List[str]:
+    """Cloudflare challenge signals on the current page; empty for a clean page.
+
+    ``headers`` are the main document's lower-cased response headers when they
+    are known (see ``NetworkStats``); ``cf-mitigated: challenge`` is
+    Cloudflare's own marker for a challenge response.
+    """
+    markers: List[str] = []
+    if headers and headers.get("cf-mitigated", "").lower() == "challenge":
+        markers.append("header:cf-mitigated")
     try:
-        WebDriverWait(driver, 5).until(
-            lambda d: d.find_elements(By.CSS_SELECTOR, "div.cf-browser-verification")
-            or d.find_elements(By.XPATH, "//h1[contains(text(), 'Verify you are human')]")
-            or d.find_elements(By.XPATH, "//iframe[contains(@src, 'challenges.cloudflare.com')]")
-        )
-        return True
-    except TimeoutException:
-        return False
+        markers.extend(driver.execute_script(CHALLENGE_PROBE_SCRIPT) or [])
+    except Exception:
+        pass
+    return markers
+
+
+def is_cloudflare_verification(driver, headers: Optional[Dict[str, str]] = None) -> bool:
+    return bool(challenge_markers(driver, headers))
 
 
 def bypass_cloudflare_verification(driver, max_wait: int = 60) -> bool:
@@ -118,3 +154,156 @@ def sanitize_filename(text: str, max_length: int = 100) -> str:
     return safe_text
 
 
+# Columns of the worksheet ChallengeMemory keeps its history in; Updated is UTC
+MEMORY_HEADER = ["Domain", "Failures", "Challenges", "Bypassed", "Clean", "Updated"]
+MEMORY_COUNTS = ("failures", "challenges", "bypassed", "clean")
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class ChallengeMemory:
+    """Per-domain record of Cloudflare challenge outcomes, persisted across runs.
+
+    Each domain keeps its run of consecutive failed bypasses plus totals.
+    ``policy`` turns that into a decision for the next row of the domain:
+    ``skip`` after ``skip_after`` failures in a row (no 60s bypass attempt),
+    ``defer`` when bypasses have failed before but not that often, and
+    ``normal`` otherwise. Entries older than ``max_age_days`` are ignored, so a
+    skipped domain is retried on a later run. Safe to call from worker threads.
+
+    The history lives in a JSON file at ``path`` (empty for none), saved on
+    every ``record``, and in ``sheet`` when given: a worksheet read when the
+    memory is created and written back by ``flush``. The sheet outlives the
+    runner's cache between monthly runs; where both hold a domain, the newer
+    entry wins, also when shards flush their domains into one sheet.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        skip_after: int = 2,
+        max_age_days: float = 45.0,
+        sheet: Optional[gspread.Worksheet] = None,
+    ):
+        self.path = path
+        self.sheet = sheet
+        self.skip_after = max(1, skip_after)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.logger = logging.getLogger("screenshot_app.cloudflare")
+        self._lock = threading.Lock()
+        self._domains: Dict[str, Dict[str, float]] = {}
+        # Something was recorded since the sheet was last written
+        self._dirty = False
+        # Data rows the sheet held when last read, all of which a flush overwrites
+        self._sheet_rows = 0
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._domains = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if sheet is not None:
+            self._merge(self._read_sheet())
+
+    def _read_sheet(self) -> Dict[str, Dict[str, float]]:
+        assert self.sheet is not None
+        try:
+            values = self.sheet.get_all_values()
+        except Exception:
+            self.logger.exception("Failed to read Cloudflare domain memory from the %s sheet", self.sheet.title)
+            return {}
+        self._sheet_rows = max(0, len(values) - 1)
+        domains: Dict[str, Dict[str, float]] = {}
+        for row in values[1:]:
+            row = [str(v).strip() for v in row] + [""] * (len(MEMORY_HEADER) - len(row))
+            try:
+                entry: Dict[str, float] = {name: int(value or 0) for name, value in zip(MEMORY_COUNTS, row[1:5])}
+                entry["updated"] = calendar.timegm(time.strptime(row[5], TIME_FORMAT))
+            except ValueError:
+                continue
+            if row[0]:
+                domains[row[0]] = entry
+        return domains
+
+    def _merge(self, domains: Dict[str, Dict[str, float]]) -> None:
+        for domain, entry in domains.items():
+            current = self._domains.get(domain)
+            if current is None or entry.get("updated", 0) > current.get("updated", 0):
+                self._domains[domain] = entry
+
+    def _entry(self, domain: str) -> Optional[Dict[str, float]]:
+        entry = self._domains.get(domain)
+        if entry is None or time.time() - entry.get("updated", 0) > self.max_age_seconds:
+            return None
+        return entry
+
+    def policy(self, domain: str) -> str:
+        with self._lock:
+            entry = self._entry(domain)
+        if entry is None:
+            return "normal"
+        if entry.get("failures", 0) >= self.skip_after:
+            return "skip"
+        if entry.get("failures", 0) > 0:
+            return "defer"
+        return "normal"
+
+    def record(self, domain: str, challenged: bool, bypassed: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(domain) or {"failures": 0, "challenges": 0, "bypassed": 0, "clean": 0}
+            if not challenged:
+                entry["clean"] = entry.get("clean", 0) + 1
+                entry["failures"] = 0
+            else:
+                entry["challenges"] = entry.get("challenges", 0) + 1
+                if bypassed:
+                    entry["bypassed"] = entry.get("bypassed", 0) + 1
+                    entry["failures"] = 0
+                else:
+                    entry["failures"] = entry.get("failures", 0) + 1
+            entry["updated"] = time.time()
+            self._domains[domain] = entry
+            self._dirty = True
+            if self.path:
+                self._save_locked()
+
+    def flush(self) -> None:
+        """Write the history to the sheet, if there is one and anything was recorded."""
+        if self.sheet is None or not self._dirty:
+            return
+        # Re-read first so domains other shards recorded since this run started are kept
+        latest = self._read_sheet()
+        with self._lock:
+            self._merge(latest)
+            now = time.time()
+            rows = [
+                [domain, *(int(entry.get(name, 0)) for name in MEMORY_COUNTS), _format_time(entry["updated"])]
+                for domain, entry in sorted(self._domains.items())
+                if now - entry.get("updated", 0) <= self.max_age_seconds
+            ]
+            self._dirty = False
+        # Blank out rows left over from a longer history instead of leaving forgotten domains behind
+        blank = [[""] * len(MEMORY_HEADER)] * max(0, self._sheet_rows - len(rows))
+        try:
+            self.sheet.update(range_name="A1", values=[MEMORY_HEADER] + rows + blank)
+        except Exception:
+            self.logger.exception("Failed to save Cloudflare domain memory to the %s sheet", self.sheet.title)
+            self._dirty = True
+            return
+        self._sheet_rows = len(rows)
+        self.logger.info("Cloudflare history of %s domain(s) saved to the %s sheet", len(rows), self.sheet.title)
+
+    def _save_locked(self) -> None:
+        directory = os.path.dirname(self.path)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._domains, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self.logger.exception("Failed to save Cloudflare domain memory to %s", self.path)
+
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime(TIME_FORMAT, time.gmtime(timestamp))
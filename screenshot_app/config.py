@@ -1,7 +1,7 @@
 import os
 import json
 from dataclasses import dataclass
-from typing import List
+from typing import List, Tuple
 
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials
@@ -11,6 +11,188 @@ from google.oauth2.service_account import Credentials
 load_dotenv()
 
 
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    return value in ("1", "true", "yes") if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    return float(value) if value else default
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    # Number of concurrent Chrome drivers draining a batch
+    workers: int = 1
+    # Hard cap on a single navigation before the driver is considered wedged
+    navigate_timeout_seconds: int = 45
+    # Drivers are replaced after this many rows; 0 never recycles on count
+    max_pages_per_driver: int = 100
+    # Drivers are replaced once their renderers use more resident memory than this; 0 disables
+    max_renderer_mb: float = 1500.0
+    # Launch one Chrome per worker in the background before the batch is read
+    prespawn_browsers: bool = False
+    # "selenium" runs a chromedriver and Chrome per worker; "playwright" shares one Chrome over CDP
+    backend: str = "selenium"
+
+
+@dataclass(frozen=True)
+class UploadConfig:
+    # Background uploader threads draining captured screenshots
+    workers: int = 2
+    # Captures allowed to wait for an uploader before capture workers block
+    queue_size: int = 4
+    # Consecutive retryable failures tolerated per upload
+    max_attempts: int = 5
+    chunk_size_mb: int = 8
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 60.0
+    # Where resumable session URIs are persisted; empty disables cross-run resume
+    session_dir: str = ".upload_sessions"
+    # Give up on an upload, retries included, after this long
+    timeout_seconds: int = 900
+    # Look up each window's Drive folders in batch requests and fail rows whose folder cannot take uploads
+    check_folders: bool = True
+    # Settle rows whose screenshot was already uploaded today instead of capturing them again
+    skip_existing: bool = False
+
+
+@dataclass(frozen=True)
+class CaptureConfig:
+    # Keep screenshots in memory and stream them to Drive without temp files
+    in_memory: bool = False
+    # One of screenshotter.CAPTURE_ENGINES
+    engine: str = "cdp"
+    # Pages taller than this (CSS px) are truncated; bounds peak memory
+    max_height: int = 20000
+    tile_height: int = 4096
+    # Hard cap on taking the screenshot before the browser is killed
+    timeout_seconds: int = 60
+    # devices profile names captured for rows without a Devices cell; empty takes one plain capture
+    device_profiles: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class EncodeConfig:
+    # One of encoding.OUTPUT_FORMATS: png, webp or jpeg
+    format: str = "png"
+    quality: int = 85
+    # Downscale captures wider than this many pixels; 0 keeps the original width
+    max_width: int = 0
+    # Per-file byte budget; 0 disables
+    max_bytes: int = 0
+    optimize_png: bool = False
+
+
+@dataclass(frozen=True)
+class SheetsConfig:
+    # Statuses and the B2 cursor are flushed every N finished rows or T seconds
+    flush_rows: int = 10
+    flush_seconds: float = 60.0
+
+
+@dataclass(frozen=True)
+class CheckpointConfig:
+    # SQLite file holding per-row progress across runs; empty disables
+    path: str = ".checkpoints/progress.sqlite3"
+    # Attempts a failed row gets across restarts before it is left as is
+    max_attempts: int = 3
+    # Checkpoints older than this are ignored by later runs
+    max_age_hours: float = 72.0
+
+
+@dataclass(frozen=True)
+class BudgetConfig:
+    # Wall-clock minutes a run may spend pulling rows; 0 processes exactly B1 rows
+    minutes: float = 0.0
+    # Seconds kept at the end of the budget for draining uploads and flushing statuses
+    reserve_seconds: float = 120.0
+
+
+@dataclass(frozen=True)
+class PolitenessConfig:
+    # Random gap after a domain's previous row before the next one of that domain starts
+    min_interval_seconds: float = 2.0
+    max_interval_seconds: float = 5.0
+    # Rows of one domain allowed in flight at once across browser workers
+    max_per_domain: int = 1
+    # Longest wait for any domain to free up before the rest of the batch is left for the next run; 0 waits forever
+    stall_seconds: float = 900.0
+
+
+@dataclass(frozen=True)
+class ReadinessConfig:
+    # One of readiness.READINESS_ENGINES: adaptive probes or a fixed wait
+    engine: str = "adaptive"
+    # Subset of readiness.READINESS_PROBES the adaptive engine waits for
+    probes: Tuple[str, ...] = ("network", "dom", "fonts", "images")
+    # How long the network and DOM must stay quiet before the page counts as stable
+    quiet_seconds: float = 0.5
+    # Capture anyway once this much time has passed after navigation
+    timeout_seconds: float = 15.0
+    # Wait used by the fixed engine
+    settle_seconds: float = 2.0
+
+
+@dataclass(frozen=True)
+class InterceptionConfig:
+    # Drop requests to known ad/analytics hosts (interception.AD_ANALYTICS_DOMAINS)
+    block_ads: bool = True
+    # Drop video and audio files (interception.MEDIA_EXTENSIONS)
+    block_media: bool = True
+    # Additional Network.setBlockedURLs patterns
+    extra_patterns: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class CloudflareConfig:
+    # Per-domain challenge history (cloudflare.ChallengeMemory); empty disables
+    memory_path: str = ".checkpoints/cloudflare_domains.json"
+    # Worksheet of the spreadsheet that keeps the history between runs, created when missing; empty disables
+    memory_sheet: str = "Cloudflare"
+    # Consecutive failed bypasses after which a domain's rows are skipped outright
+    skip_after: int = 2
+    # History older than this is forgotten, so skipped domains are retried eventually; outlasts the monthly cron
+    memory_days: float = 45.0
+
+
+@dataclass(frozen=True)
+class CaptureCacheConfig:
+    # SQLite file remembering each URL's last uploaded capture (capture_cache.CaptureCache); empty disables
+    path: str = ".checkpoints/captures.sqlite3"
+    # Least recently used entries beyond this many URLs are evicted; 0 disables
+    max_entries: int = 5000
+    # Entries unused for this long are evicted
+    max_age_days: float = 90.0
+    # Same-size captures whose perceptual hashes differ in at most this many of 256 bits are unchanged; -1 exact only
+    phash_distance: int = 6
+    # Capture each URL once per batch and give repeated rows the same screenshot
+    dedupe_batch: bool = True
+
+
+@dataclass(frozen=True)
+class ShardConfig:
+    # This runner's shard and the number of runners splitting the sheet by domain (sharding.shard_of)
+    index: int = 0
+    count: int = 1
+    # Configurations column holding one progress cell per shard, rows 1..count
+    cursor_column: str = "D"
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    # Per-row phase timings written after the run: JSONL, or CSV for a .csv path; empty disables
+    report_path: str = "reports/run_report.jsonl"
+    # Prometheus textfile-collector dump of p50/p95 per phase and domain; empty disables
+    prometheus_path: str = ""
+
+
 @dataclass(frozen=True)
 class AppConfig:
     spreadsheet_id: str
@@ -19,6 +201,20 @@ class AppConfig:
     delegated_user: str
     scopes: List[str]
     debug_cloudflare: bool
+    pool: PoolConfig
+    upload: UploadConfig
+    capture: CaptureConfig
+    encode: EncodeConfig
+    sheets: SheetsConfig
+    checkpoint: CheckpointConfig
+    budget: BudgetConfig
+    politeness: PolitenessConfig
+    readiness: ReadinessConfig
+    interception: InterceptionConfig
+    cloudflare: CloudflareConfig
+    capture_cache: CaptureCacheConfig
+    shard: ShardConfig
+    metrics: MetricsConfig
 
 
 def get_app_config() -> AppConfig:
@@ -34,6 +230,109 @@ def get_app_config() -> AppConfig:
         "https://www.googleapis.com/auth/spreadsheets",
     ]
     debug_cloudflare = os.getenv("DEBUG_CLOUDFLARE", "true").lower() in ("1", "true", "yes")
+    pool = PoolConfig(
+        workers=max(1, _env_int("BROWSER_WORKERS", 1)),
+        navigate_timeout_seconds=_env_int("NAVIGATE_TIMEOUT_SECONDS", 45),
+        max_pages_per_driver=_env_int("DRIVER_MAX_PAGES", 100),
+        max_renderer_mb=_env_float("DRIVER_MAX_RENDERER_MB", 1500.0),
+        prespawn_browsers=_env_bool("PRESPAWN_BROWSERS", False),
+        backend=os.getenv("BROWSER_BACKEND", "selenium").strip().lower(),
+    )
+    upload = UploadConfig(
+        workers=max(1, _env_int("UPLOAD_WORKERS", 2)),
+        queue_size=max(1, _env_int("UPLOAD_QUEUE_SIZE", 4)),
+        max_attempts=max(1, _env_int("UPLOAD_MAX_ATTEMPTS", 5)),
+        chunk_size_mb=max(1, _env_int("UPLOAD_CHUNK_SIZE_MB", 8)),
+        backoff_base_seconds=_env_float("UPLOAD_BACKOFF_BASE_SECONDS", 1.0),
+        backoff_max_seconds=_env_float("UPLOAD_BACKOFF_MAX_SECONDS", 60.0),
+        session_dir=os.getenv("UPLOAD_SESSION_DIR", ".upload_sessions"),
+        timeout_seconds=_env_int("UPLOAD_TIMEOUT_SECONDS", 900),
+        check_folders=_env_bool("DRIVE_CHECK_FOLDERS", True),
+        skip_existing=_env_bool("DRIVE_SKIP_EXISTING", False),
+    )
+    capture = CaptureConfig(
+        in_memory=_env_bool("SCREENSHOT_IN_MEMORY", False),
+        engine=os.getenv("CAPTURE_ENGINE", "cdp").lower(),
+        max_height=_env_int("CAPTURE_MAX_HEIGHT", 20000),
+        tile_height=max(256, _env_int("CAPTURE_TILE_HEIGHT", 4096)),
+        timeout_seconds=_env_int("CAPTURE_TIMEOUT_SECONDS", 60),
+        device_profiles=tuple(p.strip().lower() for p in os.getenv("DEVICE_PROFILES", "").split(",") if p.strip()),
+    )
+    encode = EncodeConfig(
+        format=os.getenv("SCREENSHOT_FORMAT", "png").lower(),
+        quality=min(100, max(1, _env_int("SCREENSHOT_QUALITY", 85))),
+        max_width=_env_int("SCREENSHOT_MAX_WIDTH", 0),
+        max_bytes=_env_int("SCREENSHOT_MAX_BYTES", 0),
+        optimize_png=_env_bool("SCREENSHOT_PNG_OPTIMIZE", False),
+    )
+    sheets = SheetsConfig(
+        flush_rows=max(1, _env_int("STATUS_FLUSH_ROWS", 10)),
+        flush_seconds=_env_float("STATUS_FLUSH_SECONDS", 60.0),
+    )
+    checkpoint = CheckpointConfig(
+        path=os.getenv("CHECKPOINT_PATH", ".checkpoints/progress.sqlite3"),
+        max_attempts=max(1, _env_int("CHECKPOINT_MAX_ATTEMPTS", 3)),
+        max_age_hours=_env_float("CHECKPOINT_MAX_AGE_HOURS", 72.0),
+    )
+    budget = BudgetConfig(
+        minutes=_env_float("BATCH_TIME_BUDGET_MINUTES", 0.0),
+        reserve_seconds=_env_float("BATCH_RESERVE_SECONDS", 120.0),
+    )
+    politeness = PolitenessConfig(
+        min_interval_seconds=_env_float("DOMAIN_MIN_INTERVAL_SECONDS", 2.0),
+        max_interval_seconds=_env_float("DOMAIN_MAX_INTERVAL_SECONDS", 5.0),
+        max_per_domain=max(1, _env_int("DOMAIN_MAX_CONCURRENCY", 1)),
+        stall_seconds=max(0.0, _env_float("DOMAIN_STALL_SECONDS", 900.0)),
+    )
+    readiness = ReadinessConfig(
+        engine=os.getenv("READINESS_ENGINE", "adaptive").lower(),
+        probes=tuple(
+            p.strip().lower() for p in os.getenv("READINESS_PROBES", "network,dom,fonts,images").split(",") if p.strip()
+        ),
+        quiet_seconds=_env_float("READINESS_QUIET_SECONDS", 0.5),
+        timeout_seconds=_env_float("READINESS_TIMEOUT_SECONDS", 15.0),
+        settle_seconds=_env_float("PAGE_SETTLE_SECONDS", 2.0),
+    )
+    interception = InterceptionConfig(
+        block_ads=_env_bool("BLOCK_ADS", True),
+        block_media=_env_bool("BLOCK_MEDIA", True),
+        extra_patterns=tuple(p.strip() for p in os.getenv("BLOCK_URL_PATTERNS", "").split(",") if p.strip()),
+    )
+    cloudflare = CloudflareConfig(
+        memory_path=os.getenv("CLOUDFLARE_MEMORY_PATH", ".checkpoints/cloudflare_domains.json"),
+        memory_sheet=os.getenv("CLOUDFLARE_MEMORY_SHEET", "Cloudflare"),
+        skip_after=max(1, _env_int("CLOUDFLARE_SKIP_AFTER", 2)),
+        memory_days=_env_float("CLOUDFLARE_MEMORY_DAYS", 45.0),
+    )
+    capture_cache = CaptureCacheConfig(
+        path=os.getenv("CAPTURE_CACHE_PATH", ".checkpoints/captures.sqlite3"),
+        max_entries=_env_int("CAPTURE_CACHE_MAX_ENTRIES", 5000),
+        max_age_days=_env_float("CAPTURE_CACHE_MAX_AGE_DAYS", 90.0),
+        phash_distance=_env_int("CAPTURE_CACHE_PHASH_DISTANCE", 6),
+        dedupe_batch=_env_bool("DEDUPE_BATCH_URLS", True),
+    )
+    shard = ShardConfig(
+        index=_env_int("SHARD_INDEX", 0),
+        count=max(1, _env_int("SHARD_COUNT", 1)),
+        cursor_column=os.getenv("SHARD_CURSOR_COLUMN", "D").strip().upper(),
+    )
+    metrics = MetricsConfig(
+        report_path=os.getenv("RUN_REPORT_PATH", "reports/run_report.jsonl"),
+        prometheus_path=os.getenv("METRICS_TEXTFILE_PATH", ""),
+    )
+    if not 0 <= shard.index < shard.count:
+        raise ValueError(f"Invalid SHARD_INDEX {shard.index} for SHARD_COUNT {shard.count}")
+    if pool.backend not in ("selenium", "playwright"):
+        raise ValueError(f"Invalid BROWSER_BACKEND: {pool.backend}")
+    if capture.engine not in ("window", "cdp", "tiled"):
+        raise ValueError(f"Invalid CAPTURE_ENGINE: {capture.engine}")
+    if encode.format not in ("png", "webp", "jpeg", "jpg"):
+        raise ValueError(f"Invalid SCREENSHOT_FORMAT: {encode.format}")
+    if readiness.engine not in ("adaptive", "fixed"):
+        raise ValueError(f"Invalid READINESS_ENGINE: {readiness.engine}")
+    unknown_probes = set(readiness.probes) - {"network", "dom", "fonts", "images"}
+    if unknown_probes:
+        raise ValueError(f"Invalid READINESS_PROBES: {', '.join(sorted(unknown_probes))}")
     return AppConfig(
         spreadsheet_id=spreadsheet_id,
         database_sheet_name=database_sheet_name,
@@ -41,6 +340,20 @@ def get_app_config() -> AppConfig:
         delegated_user=delegated_user,
         scopes=scopes,
         debug_cloudflare=debug_cloudflare,
+        pool=pool,
+        upload=upload,
+        capture=capture,
+        encode=encode,
+        sheets=sheets,
+        checkpoint=checkpoint,
+        budget=budget,
+        politeness=politeness,
+        readiness=readiness,
+        interception=interception,
+        cloudflare=cloudflare,
+        capture_cache=capture_cache,
+        shard=shard,
+        metrics=metrics,
     )
 
 
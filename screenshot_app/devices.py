@@ -0,0 +1,138 @@
+import logging
+import re
+from typing import Generator, List, Optional, Sequence, Tuple
+
+from .models import CaptureStats, DeviceProfile
+from .readiness import DomQuiescenceProbe, ImagesProbe, ReadinessEngine
+from .screenshotter import CHROME_MAX_TEXTURE_HEIGHT, capture_page_png
+
+
+MOBILE_UA = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1"
+)
+ANDROID_UA = (
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/126.0.0.0 Mobile Safari/537.36"
+)
+TABLET_UA = (
+    "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1"
+)
+
+# Profiles selectable by name in the Devices column or DEVICE_PROFILES
+PRESET_PROFILES = {
+    "desktop": DeviceProfile("desktop", 1920, 1080),
+    "laptop": DeviceProfile("laptop", 1366, 768),
+    "tablet": DeviceProfile("tablet", 820, 1180, scale=2.0, mobile=True, user_agent=TABLET_UA),
+    "mobile": DeviceProfile("mobile", 390, 844, scale=3.0, mobile=True, user_agent=MOBILE_UA),
+    "android": DeviceProfile("android", 412, 915, scale=2.625, mobile=True, user_agent=ANDROID_UA),
+}
+
+# Custom desktop viewports are written as WIDTHxHEIGHT, optionally @SCALE, e.g. 1440x900@2
+CUSTOM_PROFILE = re.compile(r"^(\d{2,5})x(\d{2,5})(?:@(\d+(?:\.\d+)?))?$")
+
+# How long a re-laid-out page may take to settle after the viewport changes
+LAYOUT_TIMEOUT_SECONDS = 5.0
+
+
+def parse_profile(name: str) -> DeviceProfile:
+    name = name.strip().lower()
+    if name in PRESET_PROFILES:
+        return PRESET_PROFILES[name]
+    match = CUSTOM_PROFILE.match(name)
+    if match is None:
+        raise ValueError(f"Unknown device profile: {name}")
+    width, height, scale = match.groups()
+    return DeviceProfile(name, int(width), int(height), scale=float(scale or 1.0))
+
+
+def parse_profiles(value: str) -> List[DeviceProfile]:
+    """Profiles from a comma-separated list of names; repeated names are captured once."""
+    profiles: List[DeviceProfile] = []
+    for name in value.split(","):
+        if name.strip():
+            profile = parse_profile(name)
+            if profile.name not in {p.name for p in profiles}:
+                profiles.append(profile)
+    return profiles
+
+
+def emulate(driver, profile: DeviceProfile, default_user_agent: Optional[str] = None) -> None:
+    """Apply ``profile``; profiles without a User-Agent of their own report ``default_user_agent``."""
+    driver.execute_cdp_cmd(
+        "Emulation.setDeviceMetricsOverride",
+        {
+            "width": profile.width,
+            "height": profile.height,
+            "deviceScaleFactor": profile.scale,
+            "mobile": profile.mobile,
+        },
+    )
+    driver.execute_cdp_cmd(
+        "Emulation.setTouchEmulationEnabled", {"enabled": profile.mobile, "maxTouchPoints": 5 if profile.mobile else 1}
+    )
+    user_agent = profile.user_agent or default_user_agent
+    if user_agent:
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+
+
+def clear_emulation(driver, user_agent: Optional[str]) -> None:
+    """Undo ``emulate``; overrides outlive navigations, so the next row would inherit them."""
+    driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": False})
+    if user_agent:
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+
+
+def capture_profiles(
+    driver,
+    profiles: Sequence[DeviceProfile],
+    engine: str = "cdp",
+    max_height: int = 20000,
+    tile_height: int = 4096,
+    quiet_seconds: float = 0.5,
+    stats: Optional[CaptureStats] = None,
+) -> Generator[Tuple[DeviceProfile, bytes], None, None]:
+    """Capture the loaded page once per device profile, without loading it again.
+
+    Each profile is applied through CDP device-metrics emulation, then the
+    capture waits for the re-laid-out page to stop mutating and for newly
+    needed images before taking it, so media queries and script-driven layouts
+    show as they would on the device. The page is not reloaded: sites that
+    choose their mobile markup on the server by User-Agent keep serving what
+    they sent for the first load. Captures are yielded one at a time so each
+    can be encoded and written before the next is taken. Emulation is cleared
+    afterwards, also when capturing fails. ``stats`` accumulates over all
+    profiles (see ``screenshotter.capture_page_png``).
+    """
+    logger = logging.getLogger("screenshot_app.devices")
+    # Resizing the window would fight the emulated viewport
+    engine = "cdp" if engine == "window" else engine
+    try:
+        user_agent = driver.execute_script("return navigator.userAgent;")
+    except Exception:
+        user_agent = None
+    try:
+        for profile in profiles:
+            emulate(driver, profile, user_agent)
+            settle = ReadinessEngine(
+                [DomQuiescenceProbe(quiet_seconds=quiet_seconds), ImagesProbe()],
+                timeout_seconds=LAYOUT_TIMEOUT_SECONDS,
+            ).wait(driver)
+            logger.debug("Profile %s laid out after %.2fs (%s)", profile.name, settle.seconds, settle.reason)
+            # Strips are rasterized in device pixels, so high-DPR profiles need shorter ones
+            strip_limit = int(CHROME_MAX_TEXTURE_HEIGHT / max(1.0, profile.scale))
+            yield profile, capture_page_png(
+                driver,
+                engine=engine,
+                max_height=max_height,
+                tile_height=min(tile_height, strip_limit),
+                texture_height=strip_limit,
+                stats=stats,
+            )
+    finally:
+        try:
+            clear_emulation(driver, user_agent)
+        except Exception:
+            logger.warning("Could not clear device emulation", exc_info=True)
@@ -0,0 +1,227 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from .models import DriveFolder
+from .uploader import http_error_reason, is_retryable_upload_error
+
+
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+
+# Drive accepts at most 100 calls in one batch request
+BATCH_LIMIT = 100
+
+FOLDER_FIELDS = "id, name, mimeType, trashed, capabilities/canAddChildren"
+
+# 403 reasons that mean the folder is not ours to upload into; other 403s leave it unknown
+PERMISSION_REASONS = ("insufficientPermissions", "forbidden")
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _stem(name: str) -> str:
+    return os.path.splitext(name)[0]
+
+
+class DriveFolderCache:
+    """Metadata of the Drive folders a run uploads into, fetched in batch requests.
+
+    ``prefetch`` looks up every folder id it has not seen yet, up to
+    ``BATCH_LIMIT`` per HTTP request, and remembers why a folder cannot take
+    uploads (missing, no access, not a folder, trashed or read-only). With a
+    ``name_prefix`` it also lists the files in each usable folder whose name
+    starts with it, so ``find_file`` can tell whether a screenshot is already
+    on Drive without a call per row. Files are matched by name without the
+    extension, since the encoder may have fallen back to another format.
+
+    Calls failing with retryable errors, including Drive's 403 rate limits,
+    are retried with backoff; folders whose lookup still fails are left
+    unknown, which lets their rows through. Only a 403 for lack of permission
+    marks a folder as having no access. The client is used under ``lock``
+    when one is given, for sharing it with other threads.
+    """
+
+    def __init__(
+        self,
+        drive_service: Any,
+        lock: Optional[threading.Lock] = None,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.drive_service = drive_service
+        self.lock = lock
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logging.getLogger("screenshot_app.drive_folders")
+        self._folders: Dict[str, DriveFolder] = {}
+        # Folder id -> file name without extension -> file id
+        self._files: Dict[str, Dict[str, str]] = {}
+        self._listed: Dict[str, str] = {}
+
+    def prefetch(self, folder_ids: Iterable[str], name_prefix: str = "") -> None:
+        pending = [folder_id for folder_id in dict.fromkeys(folder_ids) if folder_id not in self._folders]
+        for folder_id in pending:
+            if not folder_id.strip():
+                self._folders[folder_id] = DriveFolder(folder_id, problem="empty")
+        lookups = [folder_id for folder_id in pending if folder_id.strip()]
+        if lookups:
+            t0 = time.time()
+            for folder_id, (response, error) in self._execute(
+                {folder_id: self._get_request(folder_id) for folder_id in lookups}
+            ).items():
+                folder = self._folder_from(folder_id, response, error)
+                if folder is not None:
+                    self._folders[folder_id] = folder
+            dead = [f for f in lookups if self.problem(f)]
+            self.logger.info(
+                "Checked %s Drive folder(s) in %.2fs; %s cannot take uploads", len(lookups), time.time() - t0, len(dead)
+            )
+            for folder_id in dead:
+                self.logger.warning("Drive folder %s is unusable: %s", folder_id, self.problem(folder_id))
+        if name_prefix:
+            # Folders are listed once per prefix; unchecked and unusable ones are left out
+            unlisted = [
+                folder_id
+                for folder_id in dict.fromkeys(folder_ids)
+                if folder_id in self._folders and not self.problem(folder_id)
+                and self._listed.get(folder_id) != name_prefix
+            ]
+            self._list_files(unlisted, name_prefix)
+
+    def folder(self, folder_id: str) -> Optional[DriveFolder]:
+        return self._folders.get(folder_id)
+
+    def problem(self, folder_id: str) -> str:
+        """Why ``folder_id`` cannot take uploads; empty when it can or was never checked."""
+        folder = self._folders.get(folder_id)
+        return folder.problem if folder is not None else ""
+
+    def find_file(self, folder_id: str, name: str) -> Optional[str]:
+        """Id of a listed file in ``folder_id`` named ``name``, in whatever format it was uploaded."""
+        return self._files.get(folder_id, {}).get(_stem(name))
+
+    def _get_request(self, folder_id: str) -> Callable[[], Any]:
+        return lambda: self.drive_service.files().get(fileId=folder_id, fields=FOLDER_FIELDS, supportsAllDrives=True)
+
+    def _list_request(self, folder_id: str, name_prefix: str, page_token: Optional[str]) -> Callable[[], Any]:
+        query = (
+            f"{_quote(folder_id)} in parents and trashed = false"
+            f" and mimeType != {_quote(FOLDER_MIMETYPE)} and name contains {_quote(name_prefix)}"
+        )
+        return lambda: self.drive_service.files().list(
+            q=query,
+            fields="nextPageToken, files(id, name)",
+            pageSize=1000,
+            pageToken=page_token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True,
+        )
+
+    def _folder_from(self, folder_id: str, response: Any, error: Optional[Exception]) -> Optional[DriveFolder]:
+        if error is not None:
+            status = error.resp.status if isinstance(error, HttpError) else 0
+            # Drive answers 404 both for ids that never existed and for folders not shared with us
+            if status == 404:
+                return DriveFolder(folder_id, problem="not found or not shared")
+            if status == 403 and http_error_reason(error) in PERMISSION_REASONS:
+                return DriveFolder(folder_id, problem="no access")
+            self.logger.warning("Could not look up Drive folder %s: %s", folder_id, error)
+            return None
+        name = response.get("name", "")
+        if response.get("mimeType") != FOLDER_MIMETYPE:
+            return DriveFolder(folder_id, name, problem="not a folder")
+        if response.get("trashed"):
+            return DriveFolder(folder_id, name, problem="trashed")
+        if response.get("capabilities", {}).get("canAddChildren") is False:
+            return DriveFolder(folder_id, name, problem="read-only")
+        return DriveFolder(folder_id, name)
+
+    def _list_files(self, folder_ids: List[str], name_prefix: str) -> None:
+        t0 = time.time()
+        pages: Dict[str, Optional[str]] = {folder_id: None for folder_id in folder_ids}
+        listed = 0
+        while pages:
+            responses = self._execute(
+                {folder_id: self._list_request(folder_id, name_prefix, token) for folder_id, token in pages.items()}
+            )
+            pages = {}
+            for folder_id, (response, error) in responses.items():
+                if error is not None:
+                    self.logger.warning("Could not list Drive folder %s: %s", folder_id, error)
+                    continue
+                files = self._files.setdefault(folder_id, {})
+                for item in response.get("files", []):
+                    # ``contains`` matches words anywhere in the name, so check the prefix here
+                    if item.get("name", "").startswith(name_prefix):
+                        files.setdefault(_stem(item["name"]), item["id"])
+                        listed += 1
+                if response.get("nextPageToken"):
+                    pages[folder_id] = response["nextPageToken"]
+                else:
+                    self._listed[folder_id] = name_prefix
+        if folder_ids:
+            self.logger.info(
+                "Listed %s Drive folder(s) in %.2fs; %s screenshot(s) from %s* already uploaded",
+                len(folder_ids),
+                time.time() - t0,
+                listed,
+                name_prefix,
+            )
+
+    def _execute(self, requests: Dict[str, Callable[[], Any]]) -> Dict[str, Tuple[Any, Optional[Exception]]]:
+        """Run one call per key in batch requests and return each key's response or error.
+
+        Calls that fail with a retryable error, alone or because the whole
+        batch did, are sent again in the next round, up to ``max_attempts``.
+        """
+        results: Dict[str, Tuple[Any, Optional[Exception]]] = {}
+        pending = dict(requests)
+        attempt = 0
+        while pending:
+            attempt += 1
+            retry: Dict[str, Callable[[], Any]] = {}
+            keys = list(pending)
+            for start in range(0, len(keys), BATCH_LIMIT):
+                chunk = keys[start:start + BATCH_LIMIT]
+                answers: Dict[str, Tuple[Any, Optional[Exception]]] = {}
+
+                def callback(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+                    answers[request_id] = (response, exception)
+
+                try:
+                    with self.lock if self.lock is not None else nullcontext():
+                        batch = self.drive_service.new_batch_http_request(callback=callback)
+                        # Keys become request ids, which must be unique within a batch
+                        for key in chunk:
+                            batch.add(pending[key](), request_id=key)
+                        batch.execute()
+                except Exception as e:
+                    answers = {key: (None, e) for key in chunk}
+                for key in chunk:
+                    response, error = answers.get(key, (None, RuntimeError("No response in batch")))
+                    if error is not None and is_retryable_upload_error(error) and attempt < self.max_attempts:
+                        retry[key] = pending[key]
+                    else:
+                        results[key] = (response, error)
+            pending = retry
+            if pending:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))) * random.uniform(0.5, 1.0)
+                self.logger.warning(
+                    "%s Drive call(s) failed (%s/%s); retrying in %.1fs",
+                    len(pending),
+                    attempt,
+                    self.max_attempts,
+                    delay,
+                )
+                time.sleep(delay)
+        return results
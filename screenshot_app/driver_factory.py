@@ -1,23 +1,112 @@
+import json
 import os
 import random
 import logging
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import InvalidArgumentException
+from selenium.common.exceptions import WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
+from .driver_manager import register_browser
+from .interception import apply_request_blocking
+
 try:
     import undetected_chromedriver as uc
 except Exception:  # pragma: no cover - optional dependency
     uc = None
 
 
-def create_chrome_driver(headless: bool = True):
+# Where the resolved chromedriver path is remembered between runs; lives in the
+# webdriver-manager cache directory so CI caches both together
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".wdm", "screenshot_app_chromedriver.json")
+
+CHROME_BINARY_NAMES = ("chrome", "google-chrome", "google-chrome-stable", "chromium", "chromium-browser")
+
+
+class StartupTimer:
+    """Collect named phase durations for one driver startup and log them together."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started = time.monotonic()
+        self._mark = self._started
+
+    def phase(self, name: str) -> None:
+        now = time.monotonic()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def summary(self) -> str:
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in self.phases.items()]
+        parts.append(f"total {time.monotonic() - self._started:.2f}s")
+        return ", ".join(parts)
+
+
+def _is_executable(path: Optional[str]) -> bool:
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def resolve_chromedriver_path(refresh: bool = False) -> Optional[str]:
+    """Find a chromedriver binary without touching the network when possible.
+
+    Order: ``CHROMEDRIVER_PATH``, the path pinned in ``DRIVER_CACHE_FILE`` by an
+    earlier run, then webdriver-manager (which may download) and finally a
+    ``chromedriver`` on PATH. ``refresh`` skips the pinned path, e.g. after it
+    failed to start a session. Returns None to let Selenium Manager decide.
+    """
     logger = logging.getLogger("screenshot_app.driver")
+    cache_file = os.getenv("DRIVER_CACHE_FILE", DRIVER_CACHE_FILE)
+    explicit = os.getenv("CHROMEDRIVER_PATH", "").strip()
+    if _is_executable(explicit):
+        return explicit
+    if not refresh:
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                pinned = json.load(f).get("path")
+        except (OSError, ValueError):
+            pinned = None
+        if _is_executable(pinned):
+            return pinned
+    try:
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        logger.warning("webdriver-manager could not resolve chromedriver: %s", e)
+        path = shutil.which("chromedriver")
+    if _is_executable(path):
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump({"path": path, "resolved": time.time()}, f)
+        except OSError:
+            logger.debug("Could not pin chromedriver path in %s", cache_file)
+        return path
+    return None
+
+
+def find_chrome_binary() -> Optional[str]:
+    explicit = os.getenv("CHROME_BINARY", "").strip()
+    if _is_executable(explicit):
+        return explicit
+    for name in CHROME_BINARY_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def _browser_arguments(headless: bool) -> List[str]:
     # Flags safe for CI containers and local use
-    common_args = [
+    args = [
         "--disable-extensions",
         "--disable-plugins",
         "--disable-notifications",
@@ -26,66 +115,234 @@ def create_chrome_driver(headless: bool = True):
         "--no-sandbox",
         "--disable-dev-shm-usage",
     ]
+    if headless:
+        # Use new headless for modern Chrome, falls back if unsupported
+        args.insert(0, "--headless=new")
     # Randomize basic fingerprint bits
     accept_lang = os.getenv("BROWSER_ACCEPT_LANGUAGE", random.choice(["en-US,en;q=0.9","en-GB,en;q=0.9","en,en-US;q=0.8"]))
     ua = os.getenv("BROWSER_USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/" + str(random.randint(120, 141)) + ".0.0.0 Safari/537.36")
+    args.append(f"--user-agent={ua}")
+    args.append(f"--accept-language={accept_lang}")
+    return args
+
+
+@dataclass
+class BrowserProcess:
+    """A Chrome started ahead of time with remote debugging, ready to be attached to."""
+
+    process: subprocess.Popen
+    address: str
+    user_data_dir: str
+
+    def wait_ready(self, timeout: float = 15.0) -> bool:
+        host, port = self.address.rsplit(":", 1)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                return False
+            try:
+                with socket.create_connection((host, int(port)), timeout=0.5):
+                    return True
+            except OSError:
+                time.sleep(0.1)
+        return False
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_browser(headless: bool = True) -> BrowserProcess:
+    """Launch Chrome with a remote-debugging port without waiting for it to come up."""
+    binary = find_chrome_binary()
+    if binary is None:
+        raise FileNotFoundError("No Chrome binary found; set CHROME_BINARY")
+    port = _free_port()
+    user_data_dir = tempfile.mkdtemp(prefix="screenshot-chrome-")
+    args = [
+        binary,
+        f"--remote-debugging-port={port}",
+        f"--user-data-dir={user_data_dir}",
+        "--no-first-run",
+        "--no-default-browser-check",
+        *_browser_arguments(headless),
+        "about:blank",
+    ]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return BrowserProcess(process=process, address=f"127.0.0.1:{port}", user_data_dir=user_data_dir)
+
+
+class BrowserPrespawner:
+    """Keep ``count`` Chrome processes starting in the background for drivers to attach to.
+
+    Browsers launch while the batch is still being read from Sheets, so the
+    first rows skip Chrome's startup. Each ``take`` hands out a browser and
+    launches its replacement, which keeps driver recycling warm too. ``close``
+    kills browsers nobody claimed and removes every profile directory.
+    """
+
+    def __init__(self, count: int, headless: bool = True):
+        self.headless = headless
+        self.logger = logging.getLogger("screenshot_app.driver")
+        self._lock = threading.Lock()
+        self._ready: List[BrowserProcess] = []
+        self._profiles: List[str] = []
+        self._closed = False
+        for _ in range(max(0, count)):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        try:
+            browser = spawn_browser(self.headless)
+        except Exception as e:
+            self.logger.warning("Could not pre-spawn Chrome: %s", e)
+            return
+        with self._lock:
+            self._ready.append(browser)
+            self._profiles.append(browser.user_data_dir)
+
+    def take(self, timeout: float = 15.0) -> Optional[BrowserProcess]:
+        with self._lock:
+            if self._closed or not self._ready:
+                return None
+            browser = self._ready.pop(0)
+        self._spawn()
+        if browser.wait_ready(timeout):
+            return browser
+        self.logger.warning("Pre-spawned Chrome at %s did not come up; starting one normally", browser.address)
+        browser.kill()
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            unclaimed, self._ready = self._ready, []
+        for browser in unclaimed:
+            browser.kill()
+        for profile in self._profiles:
+            shutil.rmtree(profile, ignore_errors=True)
+
+
+def _service(path: Optional[str]) -> Service:
+    # Without a path Selenium Manager finds a chromedriver itself
+    return Service(path) if path else Service()
+
+
+def _finish_setup(driver, blocked_urls: Sequence[str]) -> None:
+    try:
+        driver.execute_cdp_cmd(
+            "Page.addScriptToEvaluateOnNewDocument",
+            {"source": "Object.defineProperty(navigator, \"webdriver\", {get: () => undefined})"},
+        )
+    except Exception:
+        pass
+    driver.set_page_load_timeout(30)
+    driver.implicitly_wait(10)
+    apply_request_blocking(driver, blocked_urls)
+
+
+def create_chrome_driver(
+    headless: bool = True,
+    performance_log: bool = False,
+    blocked_urls: Sequence[str] = (),
+    browser: Optional[BrowserProcess] = None,
+):
+    """Create a Chrome driver, preferring undetected-chromedriver.
+
+    ``performance_log`` records CDP Network events in Chrome's performance log,
+    which the network-idle readiness probe reads back. Requests matching
+    ``blocked_urls`` (``Network.setBlockedURLs`` patterns) are never sent. With
+    a pre-spawned ``browser`` (or ``CHROME_DEBUGGER_ADDRESS``) chromedriver
+    attaches to that Chrome instead of launching one. Startup time is logged
+    per phase.
+    """
+    logger = logging.getLogger("screenshot_app.driver")
+    timer = StartupTimer()
 
     # Allow disabling UC via env (more stable in CI)
     disable_uc = os.getenv("DISABLE_UC", "false").lower() in ("1", "true", "yes")
     page_load_strategy = os.getenv("PAGE_LOAD_STRATEGY", "none").lower()
+    debugger_address = browser.address if browser is not None else os.getenv("CHROME_DEBUGGER_ADDRESS", "").strip()
+
+    logging_prefs = {"performance": "ALL"} if performance_log else None
 
-    # Attempt using undetected-chromedriver first (unless disabled)
-    if uc is not None and not disable_uc:
+    # Attempt using undetected-chromedriver first (unless disabled or attaching)
+    if uc is not None and not disable_uc and not debugger_address:
         try:
             uc_options = uc.ChromeOptions()
-            if headless:
-                uc_options.add_argument("--headless=new")
-            for arg in common_args:
+            for arg in _browser_arguments(headless):
                 uc_options.add_argument(arg)
-            uc_options.add_argument(f"--user-agent={ua}")
-            uc_options.add_argument(f"--accept-language={accept_lang}")
+            if logging_prefs:
+                uc_options.set_capability("goog:loggingPrefs", logging_prefs)
             try:
                 # Some UC builds expose the same API as Selenium Options
                 uc_options.page_load_strategy = page_load_strategy
             except Exception:
                 pass
             driver = uc.Chrome(options=uc_options, use_subprocess=True)
+            timer.phase("launch")
             driver.set_page_load_timeout(30)
             driver.implicitly_wait(10)
-            logger.info("Using undetected-chromedriver")
+            apply_request_blocking(driver, blocked_urls)
+            timer.phase("setup")
+            logger.info("Using undetected-chromedriver (%s)", timer.summary())
             return driver
-        except InvalidArgumentException:
-            pass
-        except Exception:
-            pass
+        except Exception as e:
+            timer.phase("uc_failed")
+            logger.warning("undetected-chromedriver failed: %s", e)
 
     # Fallback to vanilla Selenium
     options = Options()
-    if headless:
-        # Use new headless for modern Chrome, falls back if unsupported
-        options.add_argument("--headless=new")
-    for arg in common_args:
-        options.add_argument(arg)
-    options.add_argument(f"--user-agent={ua}")
-    options.add_argument(f"--accept-language={accept_lang}")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
+    if logging_prefs:
+        options.set_capability("goog:loggingPrefs", logging_prefs)
     # Use Selenium capability for non-blocking navigations so we control waits explicitly
     options.page_load_strategy = page_load_strategy
+    if debugger_address:
+        # Launch flags belong to the running browser; chromedriver only attaches
+        options.debugger_address = debugger_address
+    else:
+        for arg in _browser_arguments(headless):
+            options.add_argument(arg)
+        options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        options.add_experimental_option("useAutomationExtension", False)
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    path = resolve_chromedriver_path()
+    timer.phase("resolve")
     try:
-        driver.execute_cdp_cmd(
-            "Page.addScriptToEvaluateOnNewDocument",
-            {"source": "Object.defineProperty(navigator, \"webdriver\", {get: () => undefined})"},
-        )
+        try:
+            driver = webdriver.Chrome(service=_service(path), options=options)
+        except WebDriverException:
+            if path is None:
+                raise
+            # A pinned driver no longer matching the installed Chrome fails here
+            logger.warning("chromedriver at %s failed to start a session; resolving again", path)
+            path = resolve_chromedriver_path(refresh=True)
+            timer.phase("resolve")
+            driver = webdriver.Chrome(service=_service(path), options=options)
     except Exception:
-        pass
-
-    driver.set_page_load_timeout(30)
-    driver.implicitly_wait(10)
-    logger.warning("Falling back to vanilla Selenium driver; UC unavailable or failed")
+        if browser is not None:
+            # Nothing else owns the pre-spawned Chrome once it was taken
+            browser.kill()
+        raise
+    timer.phase("attach" if debugger_address else "launch")
+    if browser is not None:
+        # Lets driver cleanup kill the pre-spawned Chrome, which is not a chromedriver child
+        register_browser(driver, browser.process.pid)
+    _finish_setup(driver, blocked_urls)
+    timer.phase("setup")
+    if debugger_address:
+        logger.info("Attached to Chrome at %s (%s)", debugger_address, timer.summary())
+    elif uc is not None and not disable_uc:
+        logger.warning("Falling back to vanilla Selenium driver; UC failed (%s)", timer.summary())
+    else:
+        logger.info("Using vanilla Selenium driver (%s)", timer.summary())
     return driver
-
-
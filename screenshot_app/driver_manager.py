@@ -0,0 +1,261 @@
+import atexit
+import logging
+import os
+import signal
+import threading
+import weakref
+from typing import Any, Callable, List, Optional, Set
+
+
+# Statuses after which the driver may be wedged and must not serve another row
+WEDGED_STATUSES = ("Timeout", "WebDriver error")
+
+
+def is_wedged(status: str) -> bool:
+    # Timeouts carry the phase that overran, e.g. "Timeout (capture)"
+    return status.split(" (", 1)[0] in WEDGED_STATUSES
+
+
+_live_drivers: Set[Any] = set()
+_live_lock = threading.Lock()
+# Chrome processes a driver attached to rather than launched, so not a chromedriver child
+_browser_pids: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+
+
+def register_browser(driver, pid: int) -> None:
+    """Kill the Chrome ``pid`` along with ``driver`` when it is torn down."""
+    with _live_lock:
+        _browser_pids[driver] = pid
+
+
+def _children_by_parent() -> dict:
+    """Map of pid -> child pids from /proc; empty where /proc is unavailable."""
+    children: dict = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name is parenthesised and may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _process_tree(roots: List[int]) -> List[int]:
+    children = _children_by_parent()
+    seen: List[int] = []
+    stack = list(roots)
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.append(pid)
+        stack.extend(children.get(pid, []))
+    return seen
+
+
+def _root_pids(driver) -> List[int]:
+    roots: List[int] = []
+    try:
+        roots.append(int(driver.service.process.pid))
+    except Exception:
+        pass
+    # undetected-chromedriver launches Chrome itself rather than through chromedriver
+    browser_pid = getattr(driver, "browser_pid", None)
+    if browser_pid:
+        roots.append(int(browser_pid))
+    with _live_lock:
+        attached_pid = _browser_pids.get(driver)
+    if attached_pid:
+        roots.append(attached_pid)
+    return roots
+
+
+def kill_driver(driver) -> None:
+    """Tear down a driver without going through the (possibly blocked) WebDriver protocol.
+
+    Killing the chromedriver process closes its socket, so any call blocked on it
+    in another thread fails immediately instead of hanging. Chrome and its
+    renderers are killed along with it so no orphaned browser outlives the run.
+    A driver with an ``abort`` method (a ``cdp_driver.PageDriver`` sharing its
+    browser with other workers) is aborted instead, leaving the browser running.
+    """
+    abort = getattr(driver, "abort", None)
+    if callable(abort):
+        abort()
+    for pid in _process_tree(_root_pids(driver)):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            pass
+    try:
+        driver.service.process.kill()
+    except Exception:
+        pass
+    _forget(driver)
+
+
+def quit_driver(driver) -> None:
+    pids = _process_tree(_root_pids(driver))
+    try:
+        driver.quit()
+    except Exception:
+        kill_driver(driver)
+        return
+    # quit() can leave renderers behind when Chrome was already unhealthy
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            pass
+    _forget(driver)
+
+
+def renderer_memory_mb(driver) -> Optional[float]:
+    """Resident memory of the driver's Chrome renderer processes, from /proc."""
+    total_kb = 0
+    found = False
+    for pid in _process_tree(_root_pids(driver)):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"--type=renderer" not in f.read():
+                    continue
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        found = True
+                        break
+        except (OSError, ValueError, IndexError):
+            continue
+    return total_kb / 1024.0 if found else None
+
+
+def tree_memory_mb(pid: int) -> Optional[float]:
+    """Resident memory of ``pid`` and all of its descendants, from /proc."""
+    total_kb = 0
+    found = False
+    for child in _process_tree([pid]):
+        try:
+            with open(f"/proc/{child}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        found = True
+                        break
+        except (OSError, ValueError, IndexError):
+            continue
+    return total_kb / 1024.0 if found else None
+
+
+def _track(driver) -> None:
+    with _live_lock:
+        _live_drivers.add(driver)
+
+
+def _forget(driver) -> None:
+    with _live_lock:
+        _live_drivers.discard(driver)
+
+
+@atexit.register
+def _kill_live_drivers() -> None:
+    with _live_lock:
+        drivers = list(_live_drivers)
+    for driver in drivers:
+        kill_driver(driver)
+
+
+def ping(driver, timeout: float = 5.0) -> bool:
+    """Cheap CDP round trip; False when the browser is gone or does not answer in time."""
+    outcome: List[bool] = []
+
+    def _run():
+        try:
+            driver.execute_cdp_cmd("Browser.getVersion", {})
+            outcome.append(True)
+        except Exception:
+            outcome.append(False)
+
+    t = threading.Thread(target=_run, name="driver-ping", daemon=True)
+    t.start()
+    t.join(timeout)
+    return bool(outcome and outcome[0])
+
+
+class DriverManager:
+    """Own one worker's Chrome driver across rows.
+
+    ``acquire`` hands out a healthy driver, starting one on first use and
+    transparently replacing a driver that fails the between-rows CDP ping
+    (crashed or hung browser). ``finished`` is told each row's status and
+    recycles the driver after a wedged status, after ``max_pages`` rows, or once
+    its renderers use more than ``max_renderer_mb``. Every driver the manager
+    starts is killed at interpreter exit if it was not closed.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        max_pages: int = 100,
+        max_renderer_mb: float = 0,
+        ping_timeout: float = 5.0,
+        name: str = "",
+    ):
+        self.factory = factory
+        self.max_pages = max_pages
+        self.max_renderer_mb = max_renderer_mb
+        self.ping_timeout = ping_timeout
+        self.name = name
+        self.logger = logging.getLogger("screenshot_app.driver")
+        self.driver: Optional[Any] = None
+        self.pages = 0
+
+    def acquire(self) -> Any:
+        if self.driver is not None and not ping(self.driver, self.ping_timeout):
+            self.logger.warning("%s: WebDriver failed health check; restarting", self.name)
+            self._discard(kill=True)
+        if self.driver is None:
+            self.driver = self.factory()
+            _track(self.driver)
+            self.pages = 0
+            self.logger.info("%s: WebDriver initialized", self.name)
+        return self.driver
+
+    def finished(self, status: str) -> None:
+        if self.driver is None:
+            return
+        self.pages += 1
+        reason = None
+        if is_wedged(status):
+            reason = status
+        elif self.max_pages and self.pages >= self.max_pages:
+            reason = f"{self.pages} pages"
+        elif self.max_renderer_mb:
+            memory = renderer_memory_mb(self.driver)
+            if memory is not None and memory > self.max_renderer_mb:
+                reason = f"renderer memory {memory:.0f} MB"
+        if reason:
+            self.logger.warning("%s: Recycling driver after %s", self.name, reason)
+            self._discard(kill=is_wedged(status))
+
+    def close(self) -> None:
+        if self.driver is not None:
+            self._discard(kill=False)
+            self.logger.info("%s: WebDriver closed", self.name)
+
+    def _discard(self, kill: bool) -> None:
+        driver, self.driver = self.driver, None
+        if driver is None:
+            return
+        if kill:
+            kill_driver(driver)
+        else:
+            quit_driver(driver)
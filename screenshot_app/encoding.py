@@ -0,0 +1,101 @@
+import io
+import logging
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from PIL import Image
+
+
+# format name -> (Pillow format, mimetype, file extension)
+OUTPUT_FORMATS: Dict[str, Tuple[str, str, str]] = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+# libwebp cannot encode images with a side longer than this
+WEBP_MAX_DIMENSION = 16383
+
+# Budget fitting steps quality down to this floor before it starts downscaling
+MIN_QUALITY = 40
+DOWNSCALE_STEP = 0.8
+MIN_WIDTH = 320
+
+
+def output_format(fmt: str) -> str:
+    fmt = fmt.lower()
+    return "jpeg" if fmt == "jpg" else fmt
+
+
+def output_extension(fmt: str) -> str:
+    """File extension for a configured output format."""
+    return OUTPUT_FORMATS[output_format(fmt)][2]
+
+
+@dataclass
+class EncodedImage:
+    data: bytes
+    mimetype: str
+    extension: str
+
+
+def encode_screenshot(
+    png: bytes,
+    fmt: str = "png",
+    quality: int = 85,
+    max_width: int = 0,
+    byte_budget: int = 0,
+    optimize_png: bool = False,
+) -> EncodedImage:
+    """Re-encode a captured PNG into the configured output format.
+
+    ``max_width`` downscales wide captures proportionally. With a ``byte_budget``
+    lossy formats first step their quality down to ``MIN_QUALITY`` and then every
+    format is downscaled until the output fits or reaches ``MIN_WIDTH``; the last
+    attempt is returned even if it is still over budget. A plain PNG with no
+    resizing, budget or optimization is passed through untouched.
+    """
+    logger = logging.getLogger("screenshot_app.encoding")
+    fmt = output_format(fmt)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported screenshot format: {fmt}")
+    if fmt == "png" and not max_width and not byte_budget and not optimize_png:
+        return EncodedImage(data=png, mimetype="image/png", extension="png")
+
+    with Image.open(io.BytesIO(png)) as source:
+        image = source.convert("RGB") if fmt == "jpeg" else source.copy()
+    if fmt == "webp" and max(image.size) > WEBP_MAX_DIMENSION:
+        logger.info("Image %sx%s is too large for WebP; encoding as JPEG", image.width, image.height)
+        fmt = "jpeg"
+        image = image.convert("RGB")
+    if max_width and image.width > max_width:
+        image = _resize(image, max_width / float(image.width))
+
+    pil_format, mimetype, extension = OUTPUT_FORMATS[fmt]
+    data = _save(image, pil_format, quality, optimize_png)
+    while byte_budget and len(data) > byte_budget:
+        if pil_format != "PNG" and quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 10)
+        elif image.width * DOWNSCALE_STEP >= MIN_WIDTH:
+            image = _resize(image, DOWNSCALE_STEP)
+        else:
+            logger.warning("Could not fit screenshot into %s bytes (got %s)", byte_budget, len(data))
+            break
+        data = _save(image, pil_format, quality, optimize_png)
+    return EncodedImage(data=data, mimetype=mimetype, extension=extension)
+
+
+def _resize(image: Image.Image, factor: float) -> Image.Image:
+    size = (max(1, int(image.width * factor)), max(1, int(image.height * factor)))
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+def _save(image: Image.Image, pil_format: str, quality: int, optimize_png: bool) -> bytes:
+    out = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(out, format="PNG", optimize=optimize_png)
+    elif pil_format == "WEBP":
+        image.save(out, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Tuple
+from typing import Any, Tuple
 import os
 
 import gspread
@@ -10,13 +10,17 @@ from google_auth_httplib2 import AuthorizedHttp
 import httplib2
 
 
-def build_google_clients(credentials: Credentials) -> Tuple[gspread.Client, any]:
-    gc = gspread.authorize(credentials)
+def build_drive_service(credentials: Credentials) -> Any:
     # Ensure Google API calls have a network timeout to avoid hangs
     http_timeout = int(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
     authed_http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=http_timeout))
     # When passing an authorized http client, do not pass credentials again
-    drive_service = build("drive", "v3", cache_discovery=False, http=authed_http)
+    return build("drive", "v3", cache_discovery=False, http=authed_http)
+
+
+def build_google_clients(credentials: Credentials) -> Tuple[gspread.Client, Any]:
+    gc = gspread.authorize(credentials)
+    drive_service = build_drive_service(credentials)
     return gc, drive_service
 
 
@@ -0,0 +1,78 @@
+import logging
+from typing import List, Sequence
+
+
+# Ad, analytics and tag-manager hosts whose requests never change what a screenshot shows
+AD_ANALYTICS_DOMAINS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "criteo.com",
+    "criteo.net",
+    "pubmatic.com",
+    "rubiconproject.com",
+    "openx.net",
+    "casalemedia.com",
+    "taboola.com",
+    "outbrain.com",
+    "moatads.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "chartbeat.com",
+    "chartbeat.net",
+    "hotjar.com",
+    "clarity.ms",
+    "connect.facebook.net",
+    "bat.bing.com",
+    "mc.yandex.ru",
+    "analytics.tiktok.com",
+    "cdn.segment.com",
+    "api.segment.io",
+    "mixpanel.com",
+    "js-agent.newrelic.com",
+    "bam.nr-data.net",
+)
+
+# Video and audio never appear in a still capture beyond their poster frame
+MEDIA_EXTENSIONS = ("mp4", "webm", "m4v", "mov", "avi", "flv", "ogv", "m3u8", "mpd", "mp3", "m4a", "wav", "ogg")
+
+
+def domain_patterns(domain: str) -> List[str]:
+    """``Network.setBlockedURLs`` patterns for a host and all of its subdomains."""
+    return [f"*://{domain}/*", f"*.{domain}/*"]
+
+
+def default_block_patterns(block_ads: bool = True, block_media: bool = True) -> List[str]:
+    patterns: List[str] = []
+    if block_ads:
+        for domain in AD_ANALYTICS_DOMAINS:
+            patterns.extend(domain_patterns(domain))
+    if block_media:
+        for ext in MEDIA_EXTENSIONS:
+            patterns.extend([f"*.{ext}", f"*.{ext}?*"])
+    return patterns
+
+
+def apply_request_blocking(driver, patterns: Sequence[str]) -> bool:
+    """Make Chrome fail requests matching ``patterns`` before they hit the network.
+
+    Blocked requests end in ``Network.loadingFailed`` with ``blockedReason``
+    ``inspector``. The block list lives on the driver's CDP session, so it
+    survives navigations and only needs to be set once per driver. Returns
+    False when the driver does not accept the CDP commands.
+    """
+    if not patterns:
+        return False
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except Exception:
+        logging.getLogger("screenshot_app.driver").warning("Could not enable request blocking", exc_info=True)
+        return False
+    return True
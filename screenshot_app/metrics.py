@@ -0,0 +1,288 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .models import ProcessResult
+
+
+# Phases in the order a row goes through them; reports list them in this order
+PHASES = ("navigate", "readiness", "cloudflare", "bypass", "capture", "encode", "upload", "cleanup")
+
+QUANTILES = (0.5, 0.95)
+
+# Capture figures reported per row next to the phase timings
+CAPTURE_FIELDS = ("page_height", "captured_height", "truncated", "capture_peak_mb", "renderer_mb")
+
+# The readiness engine's verdict per row: stable or not, why, and after how long
+READINESS_FIELDS = ("ready", "ready_reason", "ready_seconds")
+
+# Requests the page made, how many the block list refused and an estimate of the bytes that saved
+NETWORK_FIELDS = ("requests", "blocked", "bytes_received", "bytes_saved")
+
+
+@contextmanager
+def timed(timings: Dict[str, float], phase: str) -> Iterator[None]:
+    """Add the wall time of the ``with`` block to ``timings[phase]``, also when it raises."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.monotonic() - start
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """``q``-quantile of ``values`` with linear interpolation between ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RunReport:
+    """Per-row phase timings for one run, exported once the run is over.
+
+    Timings reach a row in several pieces (capture phases from the browser
+    worker, ``upload`` from the uploader, ``cleanup`` from the pool), so
+    ``add`` merges them; the row keeps the last status other than
+    ``Captured``, and the capture's size and memory figures and the
+    readiness verdict and network counts when it has them. Blocked requests
+    never download anything, so the bytes they saved are estimated at the
+    average size of the requests that did complete. ``write`` saves one line
+    per row as JSONL, or CSV for a ``.csv`` path, and ``write_prometheus`` a
+    textfile-collector dump of the p50/p95 per phase and per domain. Safe to
+    call from worker threads.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("screenshot_app.metrics")
+        self._lock = threading.Lock()
+        self._rows: Dict[int, Dict] = {}
+        # Completed requests per row, which price the blocked ones
+        self._finished: Dict[int, int] = {}
+
+    def add(self, row_idx: int, result: ProcessResult, url: str = "", domain: str = "") -> None:
+        with self._lock:
+            row = self._rows.setdefault(row_idx, {"row": row_idx, "url": url, "domain": domain, "status": ""})
+            if url:
+                row["url"], row["domain"] = url, domain
+            if result.status != "Captured" or not row["status"]:
+                row["status"] = result.status
+            # A row's results add up, e.g. the uploader's and the pool's cleanup
+            for phase, seconds in result.timings.items():
+                row[phase] = round(row.get(phase, 0.0) + seconds, 3)
+            capture = result.capture
+            if capture is not None:
+                row["page_height"] = capture.page_height
+                row["captured_height"] = capture.captured_height
+                row["truncated"] = capture.truncated
+                row["capture_peak_mb"] = round(capture.peak_bytes / (1024 * 1024), 1)
+                if capture.renderer_mb is not None:
+                    row["renderer_mb"] = round(capture.renderer_mb, 1)
+            if result.readiness is not None:
+                row["ready"] = result.readiness.ready
+                row["ready_reason"] = result.readiness.reason
+                row["ready_seconds"] = round(result.readiness.seconds, 3)
+            network = result.network
+            if network is not None:
+                row["requests"] = network.requests
+                row["blocked"] = network.blocked
+                row["bytes_received"] = network.bytes_received
+                row["bytes_saved"] = _bytes_saved(network.blocked, network.bytes_received, network.finished)
+                self._finished[row_idx] = network.finished
+
+    def rows(self) -> List[Dict]:
+        with self._lock:
+            return [dict(self._rows[row_idx]) for row_idx in sorted(self._rows)]
+
+    def network_totals(self) -> Dict[str, int]:
+        """Requests, blocked requests, bytes received and estimated bytes saved over every row."""
+        with self._lock:
+            rows = [row for row in self._rows.values() if "requests" in row]
+            finished = sum(self._finished.values())
+        totals = {field: sum(row[field] for row in rows) for field in ("requests", "blocked", "bytes_received")}
+        # Priced at the run's average request size, which is steadier than adding up per-row guesses
+        totals["bytes_saved"] = _bytes_saved(totals["blocked"], totals["bytes_received"], finished)
+        return totals
+
+    def summary(self, key: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Count, total, p50 and p95 per phase, grouped by ``key`` (e.g. ``domain``) when given."""
+        groups: Dict[str, Dict[str, List[float]]] = {}
+        for row in self.rows():
+            group = groups.setdefault(str(row.get(key, "")) if key else "", {})
+            for phase in PHASES:
+                if phase in row:
+                    group.setdefault(phase, []).append(row[phase])
+        return {
+            name: {
+                phase: {
+                    "count": len(values),
+                    "sum": sum(values),
+                    **{f"p{int(q * 100)}": percentile(values, q) for q in QUANTILES},
+                }
+                for phase, values in phases.items()
+            }
+            for name, phases in groups.items()
+        }
+
+    def readiness_counts(self) -> Dict[Tuple[bool, str], int]:
+        """Rows per readiness verdict, keyed by ``(ready, reason)``."""
+        counts: Dict[Tuple[bool, str], int] = {}
+        for row in self.rows():
+            if "ready" in row:
+                key = (row["ready"], row["ready_reason"])
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def log_summary(self) -> None:
+        readiness = self.readiness_counts()
+        if readiness:
+            not_ready = {reason: n for (ready, reason), n in readiness.items() if not ready}
+            self.logger.info(
+                "Readiness: %s of %s row(s) stable%s",
+                sum(n for (ready, _), n in readiness.items() if ready),
+                sum(readiness.values()),
+                "".join(f"; {n} {reason}" for reason, n in sorted(not_ready.items())),
+            )
+        network = self.network_totals()
+        if network["requests"]:
+            self.logger.info(
+                "Network: %s request(s), %s blocked, %.1f MB received, ~%.1f MB saved by blocking",
+                network["requests"],
+                network["blocked"],
+                network["bytes_received"] / (1024 * 1024),
+                network["bytes_saved"] / (1024 * 1024),
+            )
+        captured = [row for row in self.rows() if "capture_peak_mb" in row]
+        if captured:
+            renderer = [row["renderer_mb"] for row in captured if "renderer_mb" in row]
+            self.logger.info(
+                "Captures: %s row(s), %s truncated, peak %.1f MB held, renderer up to %s",
+                len(captured),
+                sum(1 for row in captured if row["truncated"]),
+                max(row["capture_peak_mb"] for row in captured),
+                f"{max(renderer):.0f} MB" if renderer else "n/a",
+            )
+        for phase, stats in self.summary().get("", {}).items():
+            self.logger.info(
+                "Phase %s: %s row(s), %.1fs total, p50 %.2fs, p95 %.2fs",
+                phase,
+                stats["count"],
+                stats["sum"],
+                stats["p50"],
+                stats["p95"],
+            )
+
+    def write(self, path: str) -> None:
+        rows = self.rows()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                fields = ["row", "url", "domain", "status", *PHASES, *CAPTURE_FIELDS, *READINESS_FIELDS]
+                fields += NETWORK_FIELDS
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+        self.logger.info("Run report with %s row(s) written to %s", len(rows), path)
+
+    def write_prometheus(self, path: str) -> None:
+        """Write OpenMetrics-compatible text for node_exporter's textfile collector."""
+        lines = [
+            "# HELP screenshot_phase_seconds Time rows spent in each phase.",
+            "# TYPE screenshot_phase_seconds summary",
+        ]
+        for phase, stats in self.summary().get("", {}).items():
+            lines.extend(_summary_lines("screenshot_phase_seconds", {"phase": phase}, stats))
+        lines += [
+            "# HELP screenshot_domain_phase_seconds Time rows spent in each phase, by domain.",
+            "# TYPE screenshot_domain_phase_seconds summary",
+        ]
+        for domain, phases in sorted(self.summary("domain").items()):
+            for phase, stats in phases.items():
+                labels = {"domain": domain, "phase": phase}
+                lines.extend(_summary_lines("screenshot_domain_phase_seconds", labels, stats))
+        statuses: Dict[str, int] = {}
+        for row in self.rows():
+            statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+        peaks = [row["capture_peak_mb"] for row in self.rows() if "capture_peak_mb" in row]
+        if peaks:
+            lines += [
+                "# HELP screenshot_capture_peak_megabytes Most memory a capture held in Python, over the run's rows.",
+                "# TYPE screenshot_capture_peak_megabytes summary",
+            ]
+            lines.extend(
+                _summary_lines(
+                    "screenshot_capture_peak_megabytes",
+                    {},
+                    {
+                        "count": len(peaks),
+                        "sum": sum(peaks),
+                        **{f"p{int(q * 100)}": percentile(peaks, q) for q in QUANTILES},
+                    },
+                )
+            )
+        readiness = self.readiness_counts()
+        if readiness:
+            lines += [
+                "# HELP screenshot_readiness_rows Rows by readiness verdict and its reason.",
+                "# TYPE screenshot_readiness_rows gauge",
+            ]
+            lines += [
+                f"screenshot_readiness_rows{_labels({'ready': str(ready).lower(), 'reason': reason})} {n}"
+                for (ready, reason), n in sorted(readiness.items())
+            ]
+        network = self.network_totals()
+        if network["requests"]:
+            lines += [
+                "# HELP screenshot_network_requests Requests pages made during the run, and those blocked.",
+                "# TYPE screenshot_network_requests gauge",
+                f"screenshot_network_requests{_labels({'outcome': 'all'})} {network['requests']}",
+                f"screenshot_network_requests{_labels({'outcome': 'blocked'})} {network['blocked']}",
+                "# HELP screenshot_network_bytes Bytes received, and the estimated bytes blocking saved.",
+                "# TYPE screenshot_network_bytes gauge",
+                f"screenshot_network_bytes{_labels({'kind': 'received'})} {network['bytes_received']}",
+                f"screenshot_network_bytes{_labels({'kind': 'saved'})} {network['bytes_saved']}",
+            ]
+        lines += ["# HELP screenshot_rows Rows by final status.", "# TYPE screenshot_rows gauge"]
+        lines += [f"screenshot_rows{_labels({'status': s})} {n}" for s, n in sorted(statuses.items())]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The collector may read at any moment, so the file is replaced atomically
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+        self.logger.info("Metrics written to %s", path)
+
+
+def _bytes_saved(blocked: int, bytes_received: int, finished: int) -> int:
+    return round(blocked * bytes_received / finished) if finished else 0
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _summary_lines(name: str, labels: Dict[str, str], stats: Dict[str, float]) -> List[str]:
+    lines = [f"{name}{_labels({**labels, 'quantile': str(q)})} {stats[f'p{int(q * 100)}']:.3f}" for q in QUANTILES]
+    lines.append(f"{name}_sum{_labels(labels)} {stats['sum']:.3f}")
+    lines.append(f"{name}_count{_labels(labels)} {stats['count']}")
+    return lines
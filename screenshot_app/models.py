@@ -1,5 +1,19 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class DeviceProfile:
+    name: str
+    # Emulated viewport in CSS pixels
+    width: int
+    height: int
+    # Device pixel ratio; captures come out scale times the CSS size
+    scale: float = 1.0
+    # Mobile viewport semantics and touch events
+    mobile: bool = False
+    # User-Agent reported while the profile is emulated; empty keeps the browser's
+    user_agent: str = ""
 
 
 @dataclass
@@ -8,11 +22,77 @@ class RowRecord:
     platform: str
     folder_id: str
     client: str
+    # One screenshot per profile from a single page load; empty takes a single plain capture
+    profiles: List[DeviceProfile] = field(default_factory=list)
+
+
+@dataclass
+class Readiness:
+    # Whether the page was declared stable before the readiness timeout
+    ready: bool
+    reason: str
+    seconds: float
+
+
+@dataclass
+class NetworkStats:
+    # Requests the page issued, including those that were blocked
+    requests: int = 0
+    # Requests refused by the driver's URL block list
+    blocked: int = 0
+    # Bytes received over the wire for the requests that completed
+    bytes_received: int = 0
+    # Requests that completed, i.e. the ones bytes_received is summed over
+    finished: int = 0
+    # HTTP status and lower-cased headers of the page's main document response
+    document_status: int = 0
+    document_headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Fingerprint:
+    # Hex SHA-256 of the captured PNG bytes
+    sha256: str
+    # Hex perceptual (difference) hash, see capture_cache.fingerprint
+    phash: str
+    width: int
+    height: int
+
+
+@dataclass
+class CaptureStats:
+    # Page height in CSS pixels, and how much of it the capture kept
+    page_height: int = 0
+    captured_height: int = 0
+    # The page was cut at the configured height cap
+    truncated: bool = False
+    # Most bytes the capture held in Python at once (encoded and decoded strip plus output so far)
+    peak_bytes: int = 0
+    # Resident memory of the browser's renderers right after the capture, where it can be measured
+    renderer_mb: Optional[float] = None
 
 
 @dataclass
 class ProcessResult:
     status: str
     error_message: Optional[str] = None
+    readiness: Optional[Readiness] = None
+    network: Optional[NetworkStats] = None
+    # Drive file now holding the row's screenshot, once uploaded or copied
+    file_id: Optional[str] = None
+    # Extension of that file, which differs from the configured format after an encoder fallback
+    file_extension: Optional[str] = None
+    # Hashes of the capture, for the capture cache
+    fingerprint: Optional[Fingerprint] = None
+    # Size and memory figures of the capture
+    capture: Optional[CaptureStats] = None
+    # Seconds spent per phase (metrics.PHASES) producing this result
+    timings: Dict[str, float] = field(default_factory=dict)
 
 
+@dataclass
+class DriveFolder:
+    folder_id: str
+    name: str = ""
+    # Why nothing can be uploaded into the folder; empty when it is usable
+    problem: str = ""
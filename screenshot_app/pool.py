@@ -0,0 +1,104 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .driver_manager import DriverManager
+from .metrics import timed
+from .models import ProcessResult, RowRecord
+
+
+RowHandler = Callable[[Any, int, RowRecord], ProcessResult]
+RowCallback = Callable[[int, RowRecord], None]
+
+
+class BrowserPool:
+    """Drain a batch of rows concurrently, one Chrome driver per worker.
+
+    Rows are pulled from ``rows`` lazily, one at a time under a lock, so a
+    generator can read further rows or stop early while the batch runs. With a
+    single worker the batch is processed on the calling thread. Each worker's driver lives in a
+    ``DriverManager``, which health-checks it between rows and recycles it after
+    a wedged status, ``max_pages`` rows or ``max_renderer_mb`` of renderer memory.
+    ``release`` is called for every row taken, however it ended (the driver
+    failing to start and the handler raising included), before its driver is
+    recycled.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        driver_factory: Callable[[], Any],
+        max_pages: int = 100,
+        max_renderer_mb: float = 0,
+    ):
+        self.workers = max(1, workers)
+        self.driver_factory = driver_factory
+        self.max_pages = max_pages
+        self.max_renderer_mb = max_renderer_mb
+        self.logger = logging.getLogger("screenshot_app.pool")
+
+    def run(
+        self,
+        rows: Iterable[Tuple[int, RowRecord]],
+        handler: RowHandler,
+        release: Optional[RowCallback] = None,
+    ) -> Dict[int, ProcessResult]:
+        work = iter(rows)
+        work_lock = threading.Lock()
+        results: Dict[int, ProcessResult] = {}
+        results_lock = threading.Lock()
+
+        def worker(worker_id: int) -> None:
+            manager = DriverManager(
+                self.driver_factory,
+                max_pages=self.max_pages,
+                max_renderer_mb=self.max_renderer_mb,
+                name=f"Worker {worker_id}",
+            )
+            try:
+                while True:
+                    with work_lock:
+                        item = next(work, None)
+                    if item is None:
+                        return
+                    row_idx, record = item
+                    started = False
+                    try:
+                        driver = manager.acquire()
+                        started = True
+                        result = handler(driver, row_idx, record)
+                    except Exception as e:
+                        if started:
+                            self.logger.exception("Worker %s: Unhandled error on row %s", worker_id, row_idx)
+                        else:
+                            self.logger.exception("Worker %s: Failed to start WebDriver", worker_id)
+                        result = ProcessResult(status="WebDriver error", error_message=str(e))
+                    finally:
+                        if release is not None:
+                            try:
+                                release(row_idx, record)
+                            except Exception:
+                                self.logger.exception("Worker %s: Failed to release row %s", worker_id, row_idx)
+                    with results_lock:
+                        results[row_idx] = result
+                    if not started:
+                        continue
+                    # Recycling a wedged or worn-out driver is billed to the row that triggered it
+                    with timed(result.timings, "cleanup"):
+                        manager.finished(result.status)
+            finally:
+                manager.close()
+
+        if self.workers == 1:
+            worker(0)
+            return results
+
+        threads = [
+            threading.Thread(target=worker, args=(i,), name=f"capture-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
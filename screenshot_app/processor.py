@@ -1,112 +1,577 @@
 import os
-import signal
-import random
 import time
 import logging
-from typing import List, Tuple, Any, Dict
+import threading
+from typing import Callable, List, Optional, Sequence, Set, Tuple, Any, Dict
 
 import gspread
-from googleapiclient.http import MediaFileUpload
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from .cloudflare import (
-    is_cloudflare_verification,
+    MEMORY_HEADER,
+    ChallengeMemory,
+    challenge_markers,
     bypass_cloudflare_verification,
     debug_dump_cloudflare_page,
 )
-from .driver_factory import create_chrome_driver
-from .models import RowRecord
-from .screenshotter import build_screenshot_filename, take_fullpage_screenshot
+from .budget import TimeBudget
+from .capture_cache import CaptureCache, DHash, app_properties, fingerprint, normalize_url
+from .checkpoint import DONE_STATES, FAILED, TRUNCATED_STATUS, UPLOADED_STATUSES, CheckpointStore
+from .config import (
+    BudgetConfig,
+    CaptureCacheConfig,
+    CaptureConfig,
+    CheckpointConfig,
+    CloudflareConfig,
+    EncodeConfig,
+    InterceptionConfig,
+    MetricsConfig,
+    PolitenessConfig,
+    PoolConfig,
+    ReadinessConfig,
+    ShardConfig,
+    SheetsConfig,
+    UploadConfig,
+)
+from .devices import capture_profiles, parse_profiles
+from .drive_folders import DriveFolderCache
+from .driver_factory import BrowserPrespawner, create_chrome_driver
+from .encoding import OUTPUT_FORMATS, encode_screenshot, output_extension, output_format
+from .interception import default_block_patterns
+from .metrics import RunReport, timed
+from .models import CaptureStats, ProcessResult, RowRecord
+from .driver_manager import kill_driver, renderer_memory_mb
+from .pool import BrowserPool
+from .readiness import create_readiness_engine
+from .scheduler import DomainScheduler, domain_of
+from .sharding import ShardCursor, shard_of
+from .sheets import (
+    StatusFlusher,
+    count_data_rows,
+    open_or_add_worksheet,
+    read_config_values,
+    read_database_window,
+    read_header,
+)
+from .screenshotter import build_screenshot_filename, capture_page_png, screenshot_name_prefix
+from .uploader import UploadJob, UploadPool, UploadSessionStore
+from .watchdog import DeadlineExceeded, get_watchdog
 
 
-def safe_navigate(driver, url: str, wait_seconds: int = 20) -> None:
-    """Navigate via JS to avoid rare hangs in driver.get.
+def safe_navigate(driver, url: str, wait_seconds: int = 20, readiness=None) -> None:
+    """Navigate via CDP to avoid rare hangs in driver.get, and wait for a <body>.
 
-    We set location with JS and then explicitly wait for a <body> to appear.
-    This avoids blocking on network idle or long-loading trackers.
+    ``Page.navigate`` returns once the new document is committed rather than on
+    ``load``, so long-loading trackers never block it. A ``readiness`` engine
+    (see ``readiness.create_readiness_engine``) is prepared before navigating;
+    the caller then waits on it to decide when the page can be captured.
     """
+    logger = logging.getLogger("screenshot_app.processor")
     try:
-        # Stop any current load and use CDP to navigate without blocking on driver.get
+        # Stop any current load so the previous page cannot interfere
         try:
             driver.execute_cdp_cmd("Page.stopLoading", {})
         except Exception:
             pass
-        # Use async JS navigate with a hard script timeout enforced by Selenium
+        # Bounds the async scripts used by readiness probes
         try:
             driver.set_script_timeout(wait_seconds)
         except Exception:
             pass
+        if readiness is not None:
+            readiness.prepare(driver)
         try:
-            driver.execute_async_script(
-                """
-                const url = arguments[0];
-                const done = arguments[arguments.length - 1];
-                let finished = false;
-                function finish() { if (!finished) { finished = true; done(); } }
-                try {
-                  window.addEventListener('load', finish, { once: true });
-                } catch (e) {}
-                setTimeout(finish, Math.max(2000, %d * 500));
-                try {
-                  window.location.href = url;
-                } catch (e) { finish(); }
-                """ % wait_seconds,
-                url,
-            )
+            result = driver.execute_cdp_cmd("Page.navigate", {"url": url})
+            if result.get("errorText"):
+                # Chrome shows its own error page, which is still captured as before
+                logger.warning("Navigation to %s failed: %s", url, result["errorText"])
         except Exception:
-            # If async script fails or times out, proceed to explicit wait below
-            pass
+            # Fall back to a plain JS navigation if CDP is unavailable
+            try:
+                driver.execute_script("window.location.href = arguments[0];", url)
+            except Exception:
+                pass
         WebDriverWait(driver, wait_seconds).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
     except TimeoutException:
         # Propagate so caller can mark status and continue
         raise
 
 
-def run_with_timeout(func, seconds: int):
-    """Run callable with a hard timeout using Unix SIGALRM (Linux CI safe).
+def timeout_status(phase: str) -> str:
+    """Sheet status for a row whose ``phase`` ran past its deadline."""
+    return f"Timeout ({phase})"
+
+
+# Hard caps for phases that have no configurable budget of their own
+READINESS_GRACE_SECONDS = 10
+CLOUDFLARE_TIMEOUT_SECONDS = 90
+
+
+# Sites that wedge headless Chrome on long-loading trackers; only skipped when trackers are not blocked
+BLACKLIST_SUBSTRINGS = [
+    "//investing.com/",
+    "//mx.investing.com/",
+    "//www.investing.com/",
+]
+
+
+def start_driver(
+    performance_log: bool = False,
+    blocked_urls: Sequence[str] = (),
+    prespawner: Optional[BrowserPrespawner] = None,
+):
+    browser = prespawner.take() if prespawner is not None else None
+    driver = create_chrome_driver(
+        headless=True,
+        performance_log=performance_log,
+        blocked_urls=blocked_urls,
+        browser=browser,
+    )
+    driver.maximize_window()
+    driver.set_page_load_timeout(30)
+    driver.implicitly_wait(10)
+    return driver
+
 
-    Ensures we escape hangs inside WebDriver/CDP even if their own timeouts fail.
+def process_record(
+    driver,
+    uploader: UploadPool,
+    record: RowRecord,
+    row_idx: int,
+    debug_cloudflare: bool,
+    navigate_timeout_seconds: int = 45,
+    capture: CaptureConfig = CaptureConfig(),
+    encode: EncodeConfig = EncodeConfig(),
+    readiness: ReadinessConfig = ReadinessConfig(),
+    blocking: bool = False,
+    challenges: Optional[ChallengeMemory] = None,
+    cache: Optional[CaptureCache] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> ProcessResult:
+    """Navigate and capture a single row, queueing the screenshot for upload.
+
+    Returns the row's final status on failure, or ``Captured`` once the file has
+    been handed to ``uploader``. Once navigation succeeded the result also
+    carries the readiness verdict and network traffic for the page. With
+    ``blocking`` the driver drops tracker requests, so blacklisted sites are
+    attempted too. ``challenges`` remembers which domains Cloudflare challenged;
+    rows of domains it gave up on are skipped without loading the page. With a
+    ``cache`` a capture that still matches the last upload of the URL is not
+    uploaded again: the row is ``Unchanged`` when its folder already holds that
+    file, and otherwise gets a server-side copy of it. A row with device
+    profiles gets one capture per profile from this single page load, uploaded
+    together and bypassing the cache. Seconds spent in each phase are added to
+    ``timings``, whichever way the row ends.
     """
-    def _handler(signum, frame):
-        raise TimeoutException("Hard timeout exceeded")
+    logger = logging.getLogger("screenshot_app.processor")
+    url = record.link
+    folder_id = record.folder_id
+    t0 = time.time()
+    timings = {} if timings is None else timings
+    logger.info("Row %s: Navigating %s", row_idx, url)
+    # Skip problematic domains that wedge headless Chrome
+    if not blocking and any(s in url for s in BLACKLIST_SUBSTRINGS):
+        logger.warning("Row %s: Skipping blacklisted URL %s", row_idx, url)
+        return ProcessResult(status="Skipped (blacklist)")
+    domain = domain_of(url)
+    if challenges is not None and challenges.policy(domain) == "skip":
+        logger.warning(
+            "Row %s: Skipping %s; recent Cloudflare challenges on %s were not bypassed", row_idx, url, domain
+        )
+        return ProcessResult(status="Skipped (Cloudflare)")
+
+    drive_name = build_screenshot_filename(record.client, url, extension=output_extension(encode.format))
+    # Prefix with the row so concurrent captures of the same URL never share a file
+    screenshot_path = f"row{row_idx}-{drive_name}"
+    resumable = not capture.in_memory and not record.profiles
+    if resumable and uploader.has_pending_session(screenshot_path, drive_name, folder_id):
+        logger.info("Row %s: Reusing capture from an interrupted upload of %s", row_idx, drive_name)
+        uploader.submit(
+            UploadJob(
+                row_idx=row_idx,
+                path=screenshot_path,
+                name=drive_name,
+                folder_id=folder_id,
+                mimetype=OUTPUT_FORMATS[output_format(encode.format)][1],
+            )
+        )
+        return ProcessResult(status="Captured")
+
+    engine = create_readiness_engine(
+        readiness.engine,
+        probes=readiness.probes,
+        quiet_seconds=readiness.quiet_seconds,
+        timeout_seconds=readiness.timeout_seconds,
+        settle_seconds=readiness.settle_seconds,
+    )
+    watchdog = get_watchdog()
+
+    def kill():
+        kill_driver(driver)
 
-    old_handler = signal.signal(signal.SIGALRM, _handler)
     try:
-        signal.alarm(seconds)
-        return func()
+        # Each phase is hard-capped; on expiry the watchdog kills this row's browser
+        with watchdog.deadline("navigate", navigate_timeout_seconds, on_expire=kill), timed(timings, "navigate"):
+            safe_navigate(driver, url, wait_seconds=20, readiness=engine)
+        readiness_seconds = readiness.timeout_seconds + READINESS_GRACE_SECONDS
+        with watchdog.deadline("readiness", readiness_seconds, on_expire=kill), timed(timings, "readiness"):
+            ready = engine.wait(driver)
+    except DeadlineExceeded as e:
+        logger.warning("Row %s: %s on %s", row_idx, e, url)
+        return ProcessResult(status=timeout_status(e.phase), error_message=str(e))
+    except TimeoutException:
+        logger.warning("Row %s: Timeout navigating %s", row_idx, url)
+        return ProcessResult(status=timeout_status("navigate"))
+    except WebDriverException as e:
+        logger.exception("Row %s: WebDriver error on %s", row_idx, url)
+        return ProcessResult(status="WebDriver error", error_message=str(e))
+    logger.info(
+        "Row %s: %s after %.2fs (%s)",
+        row_idx,
+        "Ready" if ready.ready else "Not ready",
+        ready.seconds,
+        ready.reason,
+    )
+    network = engine.network_stats()
+    if network is not None:
+        logger.info(
+            "Row %s: %s request(s), %s blocked, %s bytes received",
+            row_idx,
+            network.requests,
+            network.blocked,
+            network.bytes_received,
+        )
+
+    try:
+        with watchdog.deadline("cloudflare", CLOUDFLARE_TIMEOUT_SECONDS, on_expire=kill):
+            # Clean pages cost one script round trip here
+            with timed(timings, "cloudflare"):
+                markers = challenge_markers(driver, headers=network.document_headers if network is not None else None)
+            if markers:
+                logger.info("Row %s: Cloudflare challenge on %s (%s)", row_idx, url, ", ".join(markers))
+                with timed(timings, "bypass"):
+                    bypassed = bypass_cloudflare_verification(driver)
+                if challenges is not None:
+                    challenges.record(domain, challenged=True, bypassed=bypassed)
+                if not bypassed:
+                    if debug_cloudflare:
+                        debug_dump_cloudflare_page(driver, url)
+                    logger.warning("Row %s: Cloudflare challenge not bypassed for %s", row_idx, url)
+                    return ProcessResult(status="Cloudflare verification detected", readiness=ready, network=network)
+            elif challenges is not None:
+                challenges.record(domain, challenged=False)
+    except DeadlineExceeded as e:
+        logger.warning("Row %s: %s on %s", row_idx, e, url)
+        return ProcessResult(status=timeout_status(e.phase), error_message=str(e), readiness=ready, network=network)
+
+    stats = CaptureStats()
+    # Fed from the strips of a stitched capture, so fingerprinting it needs no full decode
+    hasher = DHash() if cache is not None else None
+    if record.profiles:
+        result = _capture_profiles(driver, uploader, record, row_idx, capture, encode, readiness, timings, kill, stats)
+        result.readiness, result.network = ready, network
+        return result
+
+    try:
+        with watchdog.deadline("capture", capture.timeout_seconds, on_expire=kill), timed(timings, "capture"):
+            png = capture_page_png(
+                driver,
+                engine=capture.engine,
+                max_height=capture.max_height,
+                tile_height=capture.tile_height,
+                stats=stats,
+                hasher=hasher,
+            )
+    except DeadlineExceeded as e:
+        logger.warning("Row %s: %s on %s", row_idx, e, url)
+        return ProcessResult(status=timeout_status(e.phase), error_message=str(e), readiness=ready, network=network)
+    except Exception as e:
+        logger.exception("Row %s: Screenshot error for %s", row_idx, url)
+        return ProcessResult(status="Screenshot error", error_message=str(e), readiness=ready, network=network)
+
+    capture_fingerprint = None
+    if cache is not None:
+        with timed(timings, "encode"):
+            capture_fingerprint = fingerprint(png, hasher, stats)
+    # After fingerprinting, whose decode of unstitched captures counts towards the peak
+    _log_capture(row_idx, driver, stats)
+
+    if cache is not None and capture_fingerprint is not None:
+        cached = cache.match(url, capture_fingerprint)
+        if cached is not None and folder_id in cached.files and not cache.exists(cached.files[folder_id]):
+            logger.info("Row %s: %s is gone from Drive; uploading again", row_idx, cached.files[folder_id])
+            cache.forget(url, folder_id)
+            del cached.files[folder_id]
+        if cached is not None and folder_id in cached.files:
+            logger.info("Row %s: Page unchanged since it was uploaded as %s", row_idx, cached.files[folder_id])
+            return ProcessResult(
+                status="Unchanged",
+                readiness=ready,
+                network=network,
+                file_id=cached.files[folder_id],
+                file_extension=cached.extensions.get(folder_id) or None,
+                fingerprint=capture_fingerprint,
+            )
+        if cached is not None and cached.files:
+            source_folder, source_id = next(iter(cached.files.items()))
+            logger.info("Row %s: Page unchanged; copying %s on Drive instead of uploading", row_idx, source_id)
+            # The copy keeps the source's format, which may not be the configured one
+            extension = cached.extensions.get(source_folder) or output_extension(encode.format)
+            copy_name = build_screenshot_filename(record.client, url, extension=extension)
+            with timed(timings, "upload"):
+                copied = uploader.copy(
+                    row_idx, source_id, copy_name, folder_id, app_properties=app_properties(url, cached.fingerprint)
+                )
+            if copied.status == "True":
+                copied.readiness, copied.network, copied.fingerprint = ready, network, capture_fingerprint
+                copied.capture = stats
+                return copied
+            # The cached file may have been deleted on Drive; upload the capture instead
+            cache.forget(url, source_folder)
+
+    try:
+        with timed(timings, "encode"):
+            encoded = encode_screenshot(
+                png,
+                fmt=encode.format,
+                quality=encode.quality,
+                max_width=encode.max_width,
+                byte_budget=encode.max_bytes,
+                optimize_png=encode.optimize_png,
+            )
+    except Exception as e:
+        logger.exception("Row %s: Encoding error for %s", row_idx, url)
+        return ProcessResult(status="Screenshot error", error_message=str(e), readiness=ready, network=network)
+    logger.info(
+        "Row %s: Encoded %s bytes -> %s bytes (%s)", row_idx, len(png), len(encoded.data), encoded.mimetype
+    )
+    if encoded.extension != output_extension(encode.format):
+        # The encoder fell back to another format, e.g. WebP for an oversized page
+        drive_name = build_screenshot_filename(record.client, url, extension=encoded.extension)
+        screenshot_path = f"row{row_idx}-{drive_name}"
+
+    # Lets a later run recognise the upload on Drive even when its local cache is gone
+    properties = app_properties(url, capture_fingerprint) if capture_fingerprint is not None else {}
+    try:
+        if capture.in_memory:
+            job = UploadJob(
+                row_idx=row_idx,
+                path=None,
+                name=drive_name,
+                folder_id=folder_id,
+                mimetype=encoded.mimetype,
+                data=encoded.data,
+                fingerprint=capture_fingerprint,
+                capture=stats,
+                app_properties=properties,
+            )
+        else:
+            with timed(timings, "encode"), open(screenshot_path, "wb") as f:
+                f.write(encoded.data)
+            job = UploadJob(
+                row_idx=row_idx,
+                path=screenshot_path,
+                name=drive_name,
+                folder_id=folder_id,
+                mimetype=encoded.mimetype,
+                fingerprint=capture_fingerprint,
+                capture=stats,
+                app_properties=properties,
+            )
+    except Exception as e:
+        logger.exception("Row %s: Failed to write %s", row_idx, screenshot_path)
+        return ProcessResult(status="Screenshot error", error_message=str(e), readiness=ready, network=network)
+
+    logger.info("Row %s: Captured in %.2fs", row_idx, time.time() - t0)
+    # Hand the capture to the uploader and move on; its result replaces this status
+    uploader.submit(job)
+    return ProcessResult(status="Captured", readiness=ready, network=network, capture=stats)
+
+
+def _capture_profiles(
+    driver,
+    uploader: UploadPool,
+    record: RowRecord,
+    row_idx: int,
+    capture: CaptureConfig,
+    encode: EncodeConfig,
+    readiness: ReadinessConfig,
+    timings: Dict[str, float],
+    kill: Callable[[], None],
+    stats: CaptureStats,
+) -> ProcessResult:
+    """Capture the loaded page once per device profile and queue the files as one upload.
+
+    The capture deadline scales with the number of profiles. Each capture is
+    encoded and written before the next profile is emulated; on failure the
+    files written so far are removed and nothing is uploaded.
+    """
+    logger = logging.getLogger("screenshot_app.processor")
+    jobs: List[UploadJob] = []
+    captures = capture_profiles(
+        driver,
+        record.profiles,
+        engine=capture.engine,
+        max_height=capture.max_height,
+        tile_height=capture.tile_height,
+        quiet_seconds=readiness.quiet_seconds,
+        stats=stats,
+    )
+    seconds = capture.timeout_seconds * len(record.profiles)
+    try:
+        with get_watchdog().deadline("capture", seconds, on_expire=kill):
+            while True:
+                with timed(timings, "capture"):
+                    item = next(captures, None)
+                if item is None:
+                    break
+                profile, png = item
+                with timed(timings, "encode"):
+                    encoded = encode_screenshot(
+                        png,
+                        fmt=encode.format,
+                        quality=encode.quality,
+                        max_width=encode.max_width,
+                        byte_budget=encode.max_bytes,
+                        optimize_png=encode.optimize_png,
+                    )
+                    name = build_screenshot_filename(
+                        record.client, record.link, extension=encoded.extension, profile=profile.name
+                    )
+                    path = None
+                    if not capture.in_memory:
+                        path = f"row{row_idx}-{name}"
+                        with open(path, "wb") as f:
+                            f.write(encoded.data)
+                jobs.append(
+                    UploadJob(
+                        row_idx=row_idx,
+                        path=path,
+                        name=name,
+                        folder_id=record.folder_id,
+                        mimetype=encoded.mimetype,
+                        data=encoded.data if path is None else None,
+                    )
+                )
+                logger.info("Row %s: Captured %s profile, %s bytes", row_idx, profile.name, len(encoded.data))
+    except Exception as e:
+        for job in jobs:
+            if job.path is not None:
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+        if isinstance(e, DeadlineExceeded):
+            logger.warning("Row %s: %s on %s", row_idx, e, record.link)
+            return ProcessResult(status=timeout_status(e.phase), error_message=str(e))
+        logger.exception("Row %s: Screenshot error for %s", row_idx, record.link)
+        return ProcessResult(status="Screenshot error", error_message=str(e))
     finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old_handler)
-
-def read_config_values(config_sheet: gspread.Worksheet) -> Tuple[int, int]:
-    start_row_value = config_sheet.acell("B2").value
-    if start_row_value is None or start_row_value.strip() == "" or not start_row_value.strip().isdigit():
-        start_row = 0
-        config_sheet.update(range_name="B2", values=[["0"]])
-    else:
-        start_row = int(start_row_value.strip())
-
-    batch_size_value = config_sheet.acell("B1").value
-    if batch_size_value is None or not batch_size_value.strip().isdigit():
-        raise ValueError("Invalid batch size in B1")
-    batch_size = int(batch_size_value.strip())
-    return start_row, batch_size
-
-
-def read_database_records(sheet: gspread.Worksheet) -> List[RowRecord]:
-    records: List[Dict[str, Any]] = sheet.get_all_records()
-    normalized: List[RowRecord] = []
-    for r in records:
-        # Coerce potentially None/Any values to strings for safety
-        link = str(r.get("Link", "") or "")
-        platform = str(r.get("Platform", "") or "")
-        folder_id = str(r.get("Link to folder", "") or "")
-        client = str(r.get("Client", "") or "")
-        normalized.append(RowRecord(link=link, platform=platform, folder_id=folder_id, client=client))
-    return normalized
+        # Runs the generator's own cleanup, which clears the device emulation
+        captures.close()
+    _log_capture(row_idx, driver, stats)
+    jobs[0].capture = stats
+    jobs[0].extra = jobs[1:]
+    uploader.submit(jobs[0])
+    return ProcessResult(status="Captured", capture=stats)
+
+
+def _log_capture(row_idx: int, driver, stats: CaptureStats) -> None:
+    """Record the renderers' memory after a capture and log the row's capture figures."""
+    stats.renderer_mb = renderer_memory_mb(driver)
+    logging.getLogger("screenshot_app.processor").info(
+        "Row %s: Captured %spx of %spx%s; peak %.1f MB held, renderer %s",
+        row_idx,
+        stats.captured_height,
+        stats.page_height,
+        " (truncated)" if stats.truncated else "",
+        stats.peak_bytes / (1024 * 1024),
+        f"{stats.renderer_mb:.0f} MB" if stats.renderer_mb is not None else "n/a",
+    )
+
+
+def _resume_rows(
+    store: CheckpointStore,
+    rows: List[Tuple[int, RowRecord]],
+    flusher: StatusFlusher,
+    max_attempts: int,
+) -> List[Tuple[int, RowRecord]]:
+    """Drop rows an earlier run already finished and re-sync their sheet status.
+
+    Finished rows, and failed rows that used up ``max_attempts``, keep their
+    checkpointed status. Everything else, including rows captured but never
+    uploaded, is processed again.
+    """
+    logger = logging.getLogger("screenshot_app.processor")
+    if not rows:
+        return rows
+    saved = store.load(rows[0][0], rows[-1][0] + 1)
+    remaining: List[Tuple[int, RowRecord]] = []
+    for row_idx, row in rows:
+        entry = saved.get(row_idx)
+        if entry is None or entry.link != row.link:
+            remaining.append((row_idx, row))
+        elif entry.state in DONE_STATES or (entry.state == FAILED and entry.attempts >= max_attempts):
+            # The sheet may have missed this status if the run died before a flush
+            flusher.record(row_idx, entry.status)
+        else:
+            remaining.append((row_idx, row))
+    if len(remaining) < len(rows):
+        logger.info(
+            "Resuming: %s of %s row(s) already settled by an earlier run", len(rows) - len(remaining), len(rows)
+        )
+    return remaining
+
+
+def _export_report(report: RunReport, metrics: MetricsConfig) -> None:
+    logger = logging.getLogger("screenshot_app.processor")
+    report.log_summary()
+    try:
+        if metrics.report_path:
+            report.write(metrics.report_path)
+        if metrics.prometheus_path:
+            report.write_prometheus(metrics.prometheus_path)
+    except OSError:
+        logger.exception("Failed to write the run report")
+
+
+def _existing_upload(folders: DriveFolderCache, record: RowRecord, extension: str) -> Optional[str]:
+    """Drive file holding the row's screenshot from an earlier run today, once every profile's is there."""
+    file_ids = [
+        folders.find_file(
+            record.folder_id,
+            build_screenshot_filename(record.client, record.link, extension=extension, profile=name),
+        )
+        for name in [profile.name for profile in record.profiles] or [""]
+    ]
+    return file_ids[0] if all(file_ids) else None
+
+
+def _split_duplicates(
+    rows: List[Tuple[int, RowRecord]],
+) -> Tuple[List[Tuple[int, RowRecord]], Dict[int, List[int]]]:
+    """Keep the first row of each normalized URL and map it to the later rows repeating it.
+
+    Rows with device profiles upload several files, which followers cannot
+    reuse, so they are always captured themselves.
+    """
+    leaders: Dict[str, int] = {}
+    unique: List[Tuple[int, RowRecord]] = []
+    duplicates: Dict[int, List[int]] = {}
+    for row_idx, record in rows:
+        if record.profiles:
+            unique.append((row_idx, record))
+            continue
+        key = normalize_url(record.link)
+        if key in leaders:
+            duplicates.setdefault(leaders[key], []).append(row_idx)
+        else:
+            leaders[key] = row_idx
+            unique.append((row_idx, record))
+    return unique, duplicates
 
 
 def process_batch(
@@ -116,118 +581,415 @@ def process_batch(
     database_sheet_name: str,
     config_sheet_name: str,
     debug_cloudflare: bool,
+    pool: PoolConfig = PoolConfig(),
+    upload: UploadConfig = UploadConfig(),
+    capture: CaptureConfig = CaptureConfig(),
+    encode: EncodeConfig = EncodeConfig(),
+    sheets: SheetsConfig = SheetsConfig(),
+    drive_service_factory: Optional[Callable[[], Any]] = None,
+    checkpoint: CheckpointConfig = CheckpointConfig(),
+    budget: BudgetConfig = BudgetConfig(),
+    politeness: PolitenessConfig = PolitenessConfig(),
+    readiness: ReadinessConfig = ReadinessConfig(),
+    interception: InterceptionConfig = InterceptionConfig(),
+    cloudflare: CloudflareConfig = CloudflareConfig(),
+    capture_cache: CaptureCacheConfig = CaptureCacheConfig(),
+    shard: ShardConfig = ShardConfig(),
+    metrics: MetricsConfig = MetricsConfig(),
 ) -> bool:
     logger = logging.getLogger("screenshot_app.processor")
-    sheet = gc.open_by_key(spreadsheet_id).worksheet(database_sheet_name)
-    config_sheet = gc.open_by_key(spreadsheet_id).worksheet(config_sheet_name)
+    time_budget = None
+    if budget.minutes > 0:
+        time_budget = TimeBudget(
+            budget.minutes * 60,
+            reserve_seconds=budget.reserve_seconds,
+            initial_estimate=pool.navigate_timeout_seconds,
+        )
+        logger.info("Time budget %.0f min; rows are read in B1-sized windows while it lasts", budget.minutes)
+    spreadsheet = gc.open_by_key(spreadsheet_id)
+    sheet = spreadsheet.worksheet(database_sheet_name)
+    config_sheet = spreadsheet.worksheet(config_sheet_name)
+
+    store = None
+    if checkpoint.path:
+        store = CheckpointStore(
+            checkpoint.path,
+            f"{spreadsheet_id}/{database_sheet_name}",
+            max_age_seconds=checkpoint.max_age_hours * 3600,
+        )
+        store.prune()
+
+    challenges = None
+    if cloudflare.memory_path or cloudflare.memory_sheet:
+        memory_sheet = None
+        if cloudflare.memory_sheet:
+            try:
+                memory_sheet = open_or_add_worksheet(spreadsheet, cloudflare.memory_sheet, len(MEMORY_HEADER))
+            except Exception:
+                logger.exception("No %s sheet; Cloudflare history is only kept locally", cloudflare.memory_sheet)
+        challenges = ChallengeMemory(
+            cloudflare.memory_path,
+            skip_after=cloudflare.skip_after,
+            max_age_days=cloudflare.memory_days,
+            sheet=memory_sheet,
+        )
+
+    # Guards the shared Drive client for the uploaders, the capture cache and the folder checks
+    drive_lock = threading.Lock()
+    cache = None
+    if capture_cache.path:
+        cache = CaptureCache(
+            capture_cache.path,
+            max_entries=capture_cache.max_entries,
+            max_age_days=capture_cache.max_age_days,
+            max_distance=capture_cache.phash_distance,
+            drive_service=drive_service,
+            lock=drive_lock,
+        )
+        cache.prune()
+
+    prespawner = None
+    if pool.prespawn_browsers and pool.backend == "selenium":
+        # Chrome starts up while the batch is read from Sheets
+        prespawner = BrowserPrespawner(pool.workers)
 
     start_row, batch_size = read_config_values(config_sheet)
     logger.info("Batch config: start_row=%s batch_size=%s", start_row, batch_size)
-    all_records = read_database_records(sheet)
-    total_rows = len(all_records)
-    end_row = min(start_row + batch_size, total_rows)
-    logger.info("Total rows=%s; processing [%s, %s)", total_rows, start_row, end_row)
-
+    shard_cursor = None
+    if shard.count > 1:
+        shard_cursor = ShardCursor(config_sheet, shard.index, shard.count, column=shard.cursor_column)
+        start_row = shard_cursor.load(start_row)
+        # A shard keeps about 1/count of each window, so windows grow to keep B1 rows per runner
+        batch_size *= shard.count
+        logger.info("Shard %s of %s: resuming at row %s", shard.index, shard.count, start_row)
+    header = read_header(sheet)
+    default_profiles = parse_profiles(",".join(capture.device_profiles))
+    # Blank rows inside the data end a range read early, so the end comes from the Link column
+    total_rows = count_data_rows(sheet, header)
     if start_row >= total_rows:
-        logger.info("Start row beyond total rows; resetting to 0 and exiting")
-        config_sheet.update(range_name="B2", values=[["0"]])
+        if shard_cursor is not None:
+            logger.info("Start row beyond total rows; shard finished for this cycle")
+            shard_cursor.complete(start_row)
+        else:
+            logger.info("Start row beyond total rows; resetting to 0 and exiting")
+            config_sheet.update(range_name="B2", values=[["0"]])
+        if store is not None:
+            store.clear()
+        if prespawner is not None:
+            prespawner.close()
         return True
 
-    batch_records = all_records[start_row:end_row]
+    end_row = min(start_row + batch_size, total_rows)
+    batch_records = read_database_window(sheet, start_row, end_row, header=header, default_profiles=default_profiles)
+    reached_end = end_row >= total_rows
+    logger.info("Processing [%s, %s)%s", start_row, end_row, "; last batch" if reached_end else "")
+    blocked_urls = default_block_patterns(interception.block_ads, interception.block_media)
+    blocked_urls.extend(interception.extra_patterns)
+    flusher = StatusFlusher(
+        sheet,
+        config_sheet,
+        start_row,
+        flush_rows=sheets.flush_rows,
+        flush_seconds=sheets.flush_seconds,
+        cursor_sink=shard_cursor.save if shard_cursor is not None else None,
+    )
 
-    driver = create_chrome_driver(headless=True)
-    driver.maximize_window()
-    driver.set_page_load_timeout(30)
-    driver.implicitly_wait(10)
-    logger.info("WebDriver initialized")
+    def settle(row_idx: int, status: str) -> None:
+        if store is not None:
+            store.record(row_idx, status)
+        flusher.record(row_idx, status)
 
-    status_results: List[List[str]] = []
+    # Every row queued this run
+    row_records: Dict[int, RowRecord] = {}
+    # Rows sharing a URL with an earlier row of their window wait for that row's result
+    followers: Dict[int, List[int]] = {}
+    followers_lock = threading.Lock()
 
-    blacklist_substrings = [
-        "//investing.com/",
-        "//mx.investing.com/",
-        "//www.investing.com/",
-    ]
+    report = RunReport()
 
-    for index, record in enumerate(batch_records):
-        url = record.link
-        folder_id = record.folder_id
-        status = ""
-        row_idx = start_row + index
-        t0 = time.time()
-        logger.info("Row %s: Navigating %s", row_idx, url)
-        # Skip problematic domains that wedge headless Chrome
-        if any(s in url for s in blacklist_substrings):
-            status = "Skipped (blacklist)"
-            logger.warning("Row %s: Skipping blacklisted URL %s", row_idx, url)
-            status_results.append([status])
-            continue
-        try:
-            # Hard cap navigation at 45s to avoid indefinite hangs
-            run_with_timeout(lambda: safe_navigate(driver, url, wait_seconds=20), seconds=45)
-            time.sleep(random.uniform(2, 5))
-        except TimeoutException:
-            status = "Timeout"
-            logger.warning("Row %s: Timeout navigating %s", row_idx, url)
-            status_results.append([status])
-            continue
-        except WebDriverException:
-            status = "WebDriver error"
-            logger.exception("Row %s: WebDriver error on %s", row_idx, url)
-            status_results.append([status])
-            continue
+    def finish(row_idx: int, result: ProcessResult, from_pool: bool = False) -> None:
+        record = row_records[row_idx]
+        if result.status == "True" and result.capture is not None and result.capture.truncated:
+            result.status = TRUNCATED_STATUS
+        # The pool's results are reported once the batch is done, with the driver cleanup after them
+        if not from_pool:
+            report.add(row_idx, result, url=record.link, domain=domain_of(record.link))
+        uploaded = result.status in UPLOADED_STATUSES
+        if cache is not None and uploaded and result.file_id and result.fingerprint is not None:
+            cache.store(
+                record.link, result.fingerprint, record.folder_id, result.file_id, extension=result.file_extension or ""
+            )
+        settle(row_idx, result.status)
+        with followers_lock:
+            waiting = followers.pop(row_idx, [])
+        for follower_idx in waiting:
+            follower = row_records[follower_idx]
+            if store is not None:
+                store.start(follower_idx, follower.link)
+            if not uploaded and result.status != "Unchanged":
+                settle(follower_idx, result.status)
+            elif not result.file_id:
+                settle(follower_idx, "Not processed")
+            elif follower.folder_id == record.folder_id:
+                logger.info("Row %s: Same page and folder as row %s; nothing to upload", follower_idx, row_idx)
+                settle(follower_idx, "Unchanged")
+            else:
+                # Named after the leader's file, whose format may differ from the configured one
+                extension = result.file_extension or output_extension(encode.format)
+                drive_name = build_screenshot_filename(follower.client, follower.link, extension=extension)
+                properties = app_properties(follower.link, result.fingerprint) if result.fingerprint else None
+                copied = uploader.copy(
+                    follower_idx, result.file_id, drive_name, follower.folder_id, app_properties=properties
+                )
+                copied.fingerprint, copied.capture = result.fingerprint, result.capture
+                finish(follower_idx, copied)
 
-        if is_cloudflare_verification(driver):
-            if not bypass_cloudflare_verification(driver):
-                if debug_cloudflare:
-                    debug_dump_cloudflare_page(driver, url)
-                status = "Cloudflare verification detected"
-                logger.warning("Row %s: Cloudflare challenge not bypassed for %s", row_idx, url)
-                status_results.append([status])
-                continue
+    def on_upload(row_idx: int, result: ProcessResult) -> None:
+        finish(row_idx, result)
 
-        try:
-            screenshot_path = build_screenshot_filename(record.client, url)
-            take_fullpage_screenshot(driver, screenshot_path)
-        except Exception:
-            status = "Screenshot error"
-            logger.exception("Row %s: Screenshot error for %s", row_idx, url)
-            status_results.append([status])
-            continue
+    session_store = None
+    if upload.session_dir:
+        session_store = UploadSessionStore(upload.session_dir)
+        session_store.prune()
+    uploader = UploadPool(
+        drive_service,
+        on_upload,
+        workers=upload.workers,
+        queue_size=upload.queue_size,
+        max_attempts=upload.max_attempts,
+        chunk_size=upload.chunk_size_mb * 1024 * 1024,
+        backoff_base=upload.backoff_base_seconds,
+        backoff_max=upload.backoff_max_seconds,
+        session_store=session_store,
+        drive_service_factory=drive_service_factory,
+        timeout_seconds=upload.timeout_seconds,
+        shared_lock=drive_lock,
+    )
 
+    folders = None
+    if upload.check_folders:
+        folder_service, folder_lock = drive_service, drive_lock
+        if drive_service_factory is not None:
+            try:
+                folder_service, folder_lock = drive_service_factory(), None
+            except Exception:
+                logger.exception("Failed to build a dedicated Drive client for folder checks; using the shared one")
+        folders = DriveFolderCache(
+            folder_service,
+            lock=folder_lock,
+            max_attempts=upload.max_attempts,
+            backoff_base=upload.backoff_base_seconds,
+            backoff_max=upload.backoff_max_seconds,
+        )
+
+    def screen_folders(rows: List[Tuple[int, RowRecord]]) -> List[Tuple[int, RowRecord]]:
+        """Settle rows whose Drive folder cannot take uploads or already holds today's screenshot."""
+        if folders is None or not rows:
+            return rows
+        name_prefix = screenshot_name_prefix() if upload.skip_existing else ""
         try:
-            file_metadata = {"name": screenshot_path, "parents": [folder_id]}
-            media = MediaFileUpload(screenshot_path, mimetype="image/png")
-            logger.info("Row %s: Uploading %s to folder %s", row_idx, screenshot_path, folder_id)
-            drive_service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-            logger.info("Row %s: Upload complete %s", row_idx, screenshot_path)
+            folders.prefetch((record.folder_id for _, record in rows), name_prefix=name_prefix)
         except Exception:
-            status = "Upload failed"
-            logger.exception("Row %s: Upload failed for %s", row_idx, screenshot_path)
-            status_results.append([status])
-            continue
-        finally:
+            logger.exception("Failed to check Drive folders; uploading without checks")
+            return rows
+        kept: List[Tuple[int, RowRecord]] = []
+        for row_idx, record in rows:
+            problem = folders.problem(record.folder_id)
+            existing = None
+            if name_prefix and not problem:
+                existing = _existing_upload(folders, record, output_extension(encode.format))
+            if not problem and existing is None:
+                kept.append((row_idx, record))
+                continue
+            if store is not None:
+                store.start(row_idx, record.link)
+            if problem:
+                logger.warning(
+                    "Row %s: Drive folder %r unusable (%s); not capturing", row_idx, record.folder_id, problem
+                )
+                finish(row_idx, ProcessResult(status=f"Invalid folder ({problem})"))
+            else:
+                logger.info("Row %s: Already uploaded today as %s; not capturing again", row_idx, existing)
+                finish(row_idx, ProcessResult(status="True", file_id=existing))
+        return kept
+
+    def handle(driver, row_idx: int, record: RowRecord) -> ProcessResult:
+        t0 = time.time()
+        if store is not None:
+            attempt = store.start(row_idx, record.link)
+            if attempt > 1:
+                logger.info("Row %s: Attempt %s", row_idx, attempt)
+        timings: Dict[str, float] = {}
+        result = process_record(
+            driver,
+            uploader,
+            record,
+            row_idx,
+            debug_cloudflare,
+            navigate_timeout_seconds=pool.navigate_timeout_seconds,
+            capture=capture,
+            encode=encode,
+            readiness=readiness,
+            blocking=interception.block_ads,
+            challenges=challenges,
+            cache=cache,
+            timings=timings,
+        )
+        result.timings.update(timings)
+        logger.info(
+            "Row %s: %s in %.2fs (%s)",
+            row_idx,
+            result.status,
+            time.time() - t0,
+            ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()) or "no phases",
+        )
+        if time_budget is not None:
+            time_budget.observe(time.time() - t0)
+        # Captured rows get their final status from the uploader
+        if result.status == "Captured":
+            if store is not None:
+                store.record(row_idx, result.status)
+        else:
+            finish(row_idx, result, from_pool=True)
+        handled.add(row_idx)
+        return result
+
+    # Rows handed to the browser pool; anything it never finished is reported
+    dispatched: List[int] = []
+    # Rows whose result went through handle(); the pool's own error results did not
+    handled: Set[int] = set()
+
+    scheduler = DomainScheduler(
+        min_interval=politeness.min_interval_seconds,
+        max_interval=politeness.max_interval_seconds,
+        max_per_domain=politeness.max_per_domain,
+        # Domains with failed Cloudflare bypasses go last, after every clean domain
+        defer=(lambda name: challenges.policy(name) == "defer") if challenges is not None else None,
+    )
+
+    def iter_rows():
+        """Yield rows in politeness order, reading further B1-sized windows while the time budget lasts."""
+        nonlocal reached_end
+        window_start, records = start_row, batch_records
+        while True:
+            rows = [(window_start + index, record) for index, record in enumerate(records)]
+            if shard_cursor is not None:
+                # Other shards' rows count as finished here; only this shard's cursor covers them
+                owned = []
+                for row_idx, record in rows:
+                    if shard_of(record.link, shard.count) == shard.index:
+                        owned.append((row_idx, record))
+                    else:
+                        flusher.skip(row_idx)
+                rows = owned
+            if store is not None:
+                rows = _resume_rows(store, rows, flusher, checkpoint.max_attempts)
+            row_records.update(rows)
+            rows = screen_folders(rows)
+            if capture_cache.dedupe_batch:
+                rows, duplicates = _split_duplicates(rows)
+                if duplicates:
+                    repeated = sum(len(later) for later in duplicates.values())
+                    logger.info("%s row(s) repeat the URL of an earlier row and reuse its capture", repeated)
+                with followers_lock:
+                    followers.update(duplicates)
+            scheduler.add(rows)
+            more = time_budget is not None and not reached_end and bool(records)
+            while scheduler.pending:
+                if time_budget is not None and not time_budget.admit():
+                    return
+                # While every queued domain cools down, read the next window rather than idle
+                block = not (more and scheduler.pending < batch_size)
+                item = scheduler.take(block=block, timeout=politeness.stall_seconds or None)
+                if item is None:
+                    if block and scheduler.pending:
+                        logger.error(
+                            "No domain freed up within %.0fs; leaving %s row(s) for the next run",
+                            politeness.stall_seconds,
+                            scheduler.pending,
+                        )
+                        # Keeps the cursor at the first unfinished row instead of completing the cycle
+                        reached_end = False
+                        return
+                    break
+                dispatched.append(item[0])
+                yield item
+            if not more:
+                return
+            window_start += len(records)
+            window_end = min(window_start + batch_size, total_rows)
             try:
-                os.remove(screenshot_path)
+                records = read_database_window(
+                    sheet, window_start, window_end, header=header, default_profiles=default_profiles
+                )
             except Exception:
-                logger.debug("Row %s: Failed to remove temp file %s", row_idx, screenshot_path)
-
-        status_results.append(["True"])
-        elapsed = time.time() - t0
-        logger.info("Row %s: Done in %.2fs", row_idx, elapsed)
-
-    driver.quit()
-    logger.info("WebDriver closed")
-
-    status_cell_range = f"F{start_row + 2}:F{end_row + 1}"
-    sheet.update(range_name=status_cell_range, values=status_results)
-    logger.info("Statuses written to %s", status_cell_range)
-    config_sheet.update(range_name="B2", values=[[str(end_row)]])
-    logger.info("Next start row set to %s", end_row)
-    if end_row >= total_rows:
-        config_sheet.update(range_name="B2", values=[["0"]])
-        logger.info("All rows processed; start row reset to 0")
-        return True
-    return False
+                logger.exception("Failed to read rows from %s; stopping early", window_start)
+                return
+            reached_end = window_end >= total_rows
+            logger.info(
+                "Budget left %.0fs; processing [%s, %s)%s",
+                time_budget.remaining() if time_budget is not None else float("inf"),
+                window_start,
+                window_start + len(records),
+                "; last batch" if reached_end else "",
+            )
+
+    logger.info(
+        "Processing with %s browser worker(s) and %s uploader(s)", pool.workers, upload.workers
+    )
+    # The network readiness probe reads CDP events from the performance log
+    performance_log = readiness.engine == "adaptive" and "network" in readiness.probes
+    cdp_browser = None
+    if pool.backend == "playwright":
+        # Imported here so the optional backend never affects the default one
+        from .cdp_driver import CdpBrowser
 
+        # Workers get isolated contexts (tabs) of one Chrome instead of a driver each
+        cdp_browser = CdpBrowser(headless=True)
 
+    def driver_factory():
+        if cdp_browser is not None:
+            return cdp_browser.new_driver(performance_log=performance_log, blocked_urls=blocked_urls)
+        return start_driver(performance_log=performance_log, blocked_urls=blocked_urls, prespawner=prespawner)
+
+    browser_pool = BrowserPool(
+        pool.workers,
+        driver_factory,
+        max_pages=pool.max_pages_per_driver,
+        max_renderer_mb=pool.max_renderer_mb,
+    )
+    try:
+        # The pool releases each row's domain, also when the driver failed to start
+        results = browser_pool.run(iter_rows(), handle, release=lambda row_idx, record: scheduler.release(record.link))
+    finally:
+        if prespawner is not None:
+            prespawner.close()
+        if cdp_browser is not None:
+            cdp_browser.close()
+        uploader.close()
+        flusher.flush()
+        if challenges is not None:
+            challenges.flush()
+
+    for row_idx in dispatched:
+        if row_idx not in results:
+            finish(row_idx, ProcessResult(status="Not processed"))
+        elif row_idx not in handled:
+            # The driver failed to start or the handler raised; the row still needs a status
+            finish(row_idx, results[row_idx], from_pool=True)
+    flusher.flush()
+    # Browser-side phases, including driver cleanup after the row, live on the pool's results
+    for row_idx, result in results.items():
+        link = row_records[row_idx].link
+        report.add(row_idx, result, url=link, domain=domain_of(link))
+    _export_report(report, metrics)
+    if reached_end and not (time_budget is not None and time_budget.exhausted):
+        if shard_cursor is not None:
+            shard_cursor.complete(flusher.cursor)
+        else:
+            config_sheet.update(range_name="B2", values=[["0"]])
+            logger.info("All rows processed; start row reset to 0")
+        if store is not None:
+            store.clear()
+        return True
+    return False
@@ -0,0 +1,262 @@
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+from .models import NetworkStats, Readiness
+
+
+READINESS_ENGINES = ("adaptive", "fixed")
+READINESS_PROBES = ("network", "dom", "fonts", "images")
+
+
+class ReadinessProbe:
+    """One signal the page must show before it counts as visually stable.
+
+    ``prepare`` runs before navigation, ``ready`` is polled afterwards. A probe
+    that cannot work on this driver should set ``available`` to False, which
+    makes it count as ready.
+    """
+
+    name = ""
+
+    def __init__(self):
+        self.available = True
+
+    def prepare(self, driver) -> None:
+        pass
+
+    def ready(self, driver, now: float) -> bool:
+        raise NotImplementedError
+
+
+class NetworkIdleProbe(ReadinessProbe):
+    """Network idle, tracked from the CDP Network events in Chrome's performance log.
+
+    Ready once at most ``max_inflight`` requests have been outstanding for
+    ``idle_seconds`` (like Chrome's own ``networkAlmostIdle``), so long-polling
+    and analytics beacons cannot hold the page open forever. Request counts,
+    blocked requests, bytes received and the main document's status and
+    headers are recorded in ``stats`` along the way.
+    Needs a driver created with the performance log enabled.
+    """
+
+    name = "network"
+
+    def __init__(self, idle_seconds: float = 0.5, max_inflight: int = 2):
+        super().__init__()
+        self.idle_seconds = idle_seconds
+        self.max_inflight = max_inflight
+        self._inflight: Set[str] = set()
+        self._idle_since: Optional[float] = None
+        self.stats = NetworkStats()
+
+    def prepare(self, driver) -> None:
+        # Discard events left over from the previous page
+        self._drain(driver)
+        self._inflight.clear()
+        self._idle_since = None
+        self.stats = NetworkStats()
+
+    def _drain(self, driver) -> List[Dict]:
+        try:
+            return driver.get_log("performance")
+        except Exception:
+            self.available = False
+            return []
+
+    def ready(self, driver, now: float) -> bool:
+        for entry in self._drain(driver):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            method = message.get("method", "")
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+            if not request_id:
+                continue
+            if method == "Network.requestWillBeSent":
+                if request_id not in self._inflight:
+                    self.stats.requests += 1
+                self._inflight.add(request_id)
+            elif method == "Network.responseReceived" and params.get("type") == "Document":
+                if self.stats.document_status:
+                    continue
+                # The first document response after redirects is the page itself
+                response = params.get("response", {})
+                self.stats.document_status = int(response.get("status") or 0)
+                self.stats.document_headers = {
+                    str(k).lower(): str(v) for k, v in (response.get("headers") or {}).items()
+                }
+            elif method == "Network.loadingFinished":
+                self._inflight.discard(request_id)
+                self.stats.bytes_received += int(params.get("encodedDataLength") or 0)
+                self.stats.finished += 1
+            elif method == "Network.loadingFailed":
+                self._inflight.discard(request_id)
+                if params.get("blockedReason") == "inspector":
+                    self.stats.blocked += 1
+        if len(self._inflight) > self.max_inflight:
+            self._idle_since = None
+            return False
+        if self._idle_since is None:
+            self._idle_since = now
+        return now - self._idle_since >= self.idle_seconds
+
+
+class DomQuiescenceProbe(ReadinessProbe):
+    """No DOM mutations for ``quiet_seconds``, observed with a MutationObserver."""
+
+    name = "dom"
+
+    SCRIPT = """
+        if (window.__screenshotLastMutation === undefined) {
+          window.__screenshotLastMutation = performance.now();
+          new MutationObserver(function () { window.__screenshotLastMutation = performance.now(); })
+            .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        }
+        return performance.now() - window.__screenshotLastMutation;
+    """
+
+    def __init__(self, quiet_seconds: float = 0.5):
+        super().__init__()
+        self.quiet_seconds = quiet_seconds
+
+    def ready(self, driver, now: float) -> bool:
+        quiet_ms = driver.execute_script(self.SCRIPT)
+        return (quiet_ms or 0) >= self.quiet_seconds * 1000
+
+
+class FontsProbe(ReadinessProbe):
+    """Web fonts finished loading (``document.fonts.ready`` has resolved)."""
+
+    name = "fonts"
+
+    def ready(self, driver, now: float) -> bool:
+        return bool(driver.execute_script("return !document.fonts || document.fonts.status === 'loaded';"))
+
+
+class ImagesProbe(ReadinessProbe):
+    """Eager images are fetched and decoded.
+
+    Lazy images outside the viewport never start loading, so they are not
+    waited for.
+    """
+
+    name = "images"
+
+    SCRIPT = """
+        const done = arguments[arguments.length - 1];
+        const images = Array.from(document.images).filter(function (i) { return i.loading !== 'lazy'; });
+        if (images.some(function (i) { return !i.complete; })) { done(false); return; }
+        const decoded = images.filter(function (i) { return i.naturalWidth > 0; })
+          .map(function (i) { return i.decode().catch(function () {}); });
+        Promise.race([
+          Promise.all(decoded).then(function () { return true; }),
+          new Promise(function (resolve) { setTimeout(function () { resolve(false); }, 1000); }),
+        ]).then(done);
+    """
+
+    def ready(self, driver, now: float) -> bool:
+        return bool(driver.execute_async_script(self.SCRIPT))
+
+
+PROBE_TYPES = {
+    "network": NetworkIdleProbe,
+    "dom": DomQuiescenceProbe,
+    "fonts": FontsProbe,
+    "images": ImagesProbe,
+}
+
+
+class ReadinessEngine:
+    """Poll a set of probes after navigation and stop as soon as all of them agree.
+
+    Returns a ``Readiness`` recording whether the page became stable, which
+    probes were still pending on a timeout, and how long it took. A probe that
+    raises (typically because the document was replaced mid-call) counts as not
+    ready for that poll.
+    """
+
+    def __init__(
+        self,
+        probes: Sequence[ReadinessProbe],
+        timeout_seconds: float = 15.0,
+        poll_seconds: float = 0.2,
+    ):
+        self.probes = list(probes)
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.logger = logging.getLogger("screenshot_app.readiness")
+
+    def prepare(self, driver) -> None:
+        for probe in self.probes:
+            probe.prepare(driver)
+
+    def network_stats(self) -> Optional[NetworkStats]:
+        """Traffic seen by the network probe, if it ran on this driver."""
+        for probe in self.probes:
+            if isinstance(probe, NetworkIdleProbe) and probe.available:
+                return probe.stats
+        return None
+
+    def wait(self, driver) -> Readiness:
+        start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            pending = [probe.name for probe in self.probes if not self._probe_ready(probe, driver, now)]
+            elapsed = now - start
+            if not pending:
+                used = [probe.name for probe in self.probes if probe.available]
+                return Readiness(ready=True, reason="stable: " + (",".join(used) or "no probes"), seconds=elapsed)
+            if elapsed >= self.timeout_seconds:
+                return Readiness(ready=False, reason="timeout waiting for " + ",".join(pending), seconds=elapsed)
+            time.sleep(self.poll_seconds)
+
+    def _probe_ready(self, probe: ReadinessProbe, driver, now: float) -> bool:
+        if not probe.available:
+            return True
+        try:
+            return probe.ready(driver, now)
+        except Exception as e:
+            self.logger.debug("Readiness probe %s failed: %s", probe.name, e)
+            return False
+
+
+class FixedWait:
+    """Legacy readiness: sleep a fixed time after the page has a body."""
+
+    def __init__(self, seconds: float = 2.0):
+        self.seconds = seconds
+
+    def prepare(self, driver) -> None:
+        pass
+
+    def network_stats(self) -> Optional[NetworkStats]:
+        return None
+
+    def wait(self, driver) -> Readiness:
+        time.sleep(self.seconds)
+        return Readiness(ready=True, reason="fixed wait", seconds=self.seconds)
+
+
+def create_readiness_engine(
+    engine: str = "adaptive",
+    probes: Sequence[str] = READINESS_PROBES,
+    quiet_seconds: float = 0.5,
+    timeout_seconds: float = 15.0,
+    settle_seconds: float = 2.0,
+):
+    """Build a fresh engine for one navigation; probes keep per-page state."""
+    if engine == "fixed":
+        return FixedWait(settle_seconds)
+    instances: List[ReadinessProbe] = []
+    for name in probes:
+        if name == "network":
+            instances.append(NetworkIdleProbe(idle_seconds=quiet_seconds))
+        elif name == "dom":
+            instances.append(DomQuiescenceProbe(quiet_seconds=quiet_seconds))
+        else:
+            instances.append(PROBE_TYPES[name]())
+    return ReadinessEngine(instances, timeout_seconds=timeout_seconds)
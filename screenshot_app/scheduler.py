@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .models import RowRecord
+
+
+Row = Tuple[int, RowRecord]
+
+
+def domain_of(url: str) -> str:
+    """Host a URL is throttled under; ``www.`` is folded into the bare domain."""
+    try:
+        host = (urlsplit(url.strip()).hostname or "").lower()
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+class _Domain:
+    __slots__ = ("rows", "in_flight", "ready_at")
+
+    def __init__(self):
+        self.rows: Deque[Row] = deque()
+        self.in_flight = 0
+        self.ready_at = 0.0
+
+
+class DomainScheduler:
+    """Hand out rows so that no domain is hit faster than its politeness limits.
+
+    Rows are grouped by domain. A domain may have at most ``max_per_domain``
+    rows in flight, and each of its rows starts no sooner than a random
+    ``[min_interval, max_interval]`` seconds after the previous one of that
+    domain started or finished. ``take`` returns the next row of the eligible
+    domain with the most rows left, so other domains fill a domain's cool-down
+    and the largest domain does not become the long tail. Domains for which
+    ``defer`` returns True are only taken when no other domain is eligible.
+    Callers must ``release`` each row they took once it is done. Safe to call
+    from worker threads.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 2.0,
+        max_interval: float = 5.0,
+        max_per_domain: int = 1,
+        defer: Optional[Callable[[str], bool]] = None,
+    ):
+        self.min_interval = max(0.0, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.max_per_domain = max(1, max_per_domain)
+        self.defer = defer
+        self.logger = logging.getLogger("screenshot_app.scheduler")
+        self._cond = threading.Condition()
+        self._domains: "OrderedDict[str, _Domain]" = OrderedDict()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def add(self, rows: Iterable[Row]) -> None:
+        with self._cond:
+            for row in rows:
+                domain = self._domains.setdefault(domain_of(row[1].link), _Domain())
+                domain.rows.append(row)
+                self._pending += 1
+            self._cond.notify_all()
+
+    def take(self, block: bool = True, timeout: Optional[float] = None) -> Optional[Row]:
+        """Next row that may start now.
+
+        Without ``block`` this returns None as soon as no row is eligible;
+        otherwise it waits for a domain to cool down or be released, and only
+        returns None once every row has been handed out, or once ``timeout``
+        seconds passed without a row becoming eligible.
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                now = time.monotonic()
+                best: Optional[str] = None
+                best_key: Tuple[bool, int] = (False, 0)
+                wake_at: Optional[float] = None
+                for name, domain in self._domains.items():
+                    if not domain.rows or domain.in_flight >= self.max_per_domain:
+                        continue
+                    if domain.ready_at > now:
+                        wake_at = domain.ready_at if wake_at is None else min(wake_at, domain.ready_at)
+                        continue
+                    key = (self.defer is None or not self.defer(name), len(domain.rows))
+                    if best is None or key > best_key:
+                        best, best_key = name, key
+                if best is not None:
+                    domain = self._domains[best]
+                    domain.in_flight += 1
+                    domain.ready_at = now + self._interval()
+                    self._pending -= 1
+                    return domain.rows.popleft()
+                if not block:
+                    return None
+                if give_up_at is not None:
+                    if now >= give_up_at:
+                        return None
+                    wake_at = give_up_at if wake_at is None else min(wake_at, give_up_at)
+                # Woken early by release(); otherwise sleep until the next domain cools down
+                self._cond.wait(None if wake_at is None else max(0.0, wake_at - now))
+            return None
+
+    def release(self, url: str) -> None:
+        with self._cond:
+            domain = self._domains.get(domain_of(url))
+            if domain is None:
+                return
+            domain.in_flight = max(0, domain.in_flight - 1)
+            domain.ready_at = max(domain.ready_at, time.monotonic() + self._interval())
+            self._cond.notify_all()
+
+    def _interval(self) -> float:
+        return random.uniform(self.min_interval, self.max_interval)
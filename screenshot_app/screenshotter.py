@@ -1,25 +1,262 @@
 from datetime import datetime
+import base64
+import io
+import logging
 import os
-from typing import Tuple
+import struct
+import zlib
+from typing import BinaryIO, Optional, Tuple
 
+from PIL import Image
 
-def build_screenshot_filename(client: str, url: str) -> str:
+from .capture_cache import DHash
+from .models import CaptureStats
+
+
+# Chrome cannot rasterize a single surface taller than its max texture size
+CHROME_MAX_TEXTURE_HEIGHT = 16384
+
+CAPTURE_ENGINES = ("window", "cdp", "tiled")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Compressed bytes buffered before an IDAT chunk is written
+IDAT_CHUNK_BYTES = 256 * 1024
+
+
+def screenshot_name_prefix() -> str:
+    """Start shared by every screenshot name built today."""
+    return datetime.now().strftime("%Y-%m-%d") + "-"
+
+
+def build_screenshot_filename(client: str, url: str, extension: str = "png", profile: str = "") -> str:
     from .cloudflare import sanitize_filename  # reuse utility
 
-    current_date = datetime.now().strftime("%Y-%m-%d")
     safe_url = sanitize_filename(url)
     safe_client = sanitize_filename(client)
-    return f"{current_date}-{safe_client}-{safe_url}.png"
+    suffix = f"-{sanitize_filename(profile)}" if profile else ""
+    return f"{screenshot_name_prefix()}{safe_client}-{safe_url}{suffix}.{extension}"
 
 
-def take_fullpage_screenshot(driver, out_path: str) -> None:
+def capture_fullpage_png(driver, max_height: int = 0, stats: Optional[CaptureStats] = None) -> bytes:
+    """Resize the window to the full page and return the screenshot as PNG bytes."""
     page_width = driver.execute_script("return document.body.scrollWidth")
     page_height = driver.execute_script("return document.body.scrollHeight")
     if not page_width or page_width <= 0:
         page_width = 800
     if not page_height or page_height <= 0:
         page_height = 600
-    driver.set_window_size(page_width, page_height)
-    driver.save_screenshot(out_path)
+    driver.set_window_size(page_width, _cap_height(page_height, max_height, stats))
+    png = driver.get_screenshot_as_png()
+    _note_peak(stats, len(png))
+    return png
+
+
+def get_layout_size(driver) -> Tuple[int, int]:
+    """Full content size in CSS pixels, as reported by ``Page.getLayoutMetrics``."""
+    metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+    # cssContentSize is in CSS pixels; older Chrome only reports contentSize
+    size = metrics.get("cssContentSize") or metrics.get("contentSize") or {}
+    width = int(size.get("width") or 0) or 800
+    height = int(size.get("height") or 0) or 600
+    return width, height
+
+
+def _capture_clip(driver, y: int, width: int, height: int) -> bytes:
+    result = driver.execute_cdp_cmd(
+        "Page.captureScreenshot",
+        {
+            "format": "png",
+            "captureBeyondViewport": True,
+            "fromSurface": True,
+            "clip": {"x": 0, "y": y, "width": width, "height": height, "scale": 1},
+        },
+    )
+    return base64.b64decode(result["data"])
+
+
+def capture_cdp_png(
+    driver,
+    max_height: int,
+    tile_height: int = CHROME_MAX_TEXTURE_HEIGHT,
+    stats: Optional[CaptureStats] = None,
+    hasher: Optional[DHash] = None,
+) -> bytes:
+    """Capture the full page in one ``Page.captureScreenshot`` without resizing the window.
+
+    Pages taller than ``tile_height`` fall back to tiled capture, since Chrome
+    cannot rasterize them in a single surface.
+    """
+    width, height = get_layout_size(driver)
+    height = _cap_height(height, max_height, stats)
+    if height > tile_height:
+        return _stitch_strips(driver, width, height, tile_height, stats, hasher)
+    png = _capture_clip(driver, 0, width, height)
+    _note_peak(stats, len(png))
+    return png
+
+
+def capture_tiled_png(
+    driver,
+    max_height: int,
+    tile_height: int,
+    stats: Optional[CaptureStats] = None,
+    hasher: Optional[DHash] = None,
+) -> bytes:
+    """Capture the page as strips of ``tile_height`` and stream them into one PNG.
+
+    Neither Chrome nor Python ever holds the whole bitmap: Chrome rasterizes
+    one strip at a time, and each strip is decoded, appended to the compressed
+    output and dropped before the next is captured.
+    """
+    width, height = get_layout_size(driver)
+    return _stitch_strips(driver, width, _cap_height(height, max_height, stats), tile_height, stats, hasher)
+
+
+class PngStreamWriter:
+    """Write an RGB PNG of known size row by row, compressing as it goes.
+
+    Rows are stored unfiltered, which compresses somewhat worse than Pillow's
+    adaptive filters but needs no previous row and no image in memory.
+    """
+
+    def __init__(self, out: BinaryIO, width: int, height: int, level: int = 6):
+        self.out = out
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(level)
+        self._pending = bytearray()
+        out.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.out.write(struct.pack(">I", len(data)))
+        self.out.write(kind + data)
+        self.out.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def _compress(self, data: bytes) -> None:
+        self._pending += self._compressor.compress(data)
+        if len(self._pending) >= IDAT_CHUNK_BYTES:
+            self._chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+
+    def write_rows(self, raw: bytes, source_width: int, rows: int) -> None:
+        """Append ``rows`` rows from RGB pixels ``source_width`` wide.
+
+        Rows are cropped or padded with white to the image width; rows past
+        the end of ``raw`` are white, and rows past the image height dropped.
+        """
+        stride = self.width * 3
+        source_stride = source_width * 3
+        # A narrower source row is padded, never filled up from the row after it
+        kept = min(stride, source_stride)
+        available = len(raw) // source_stride if source_stride else 0
+        rows = min(rows, self.height - self.rows_written)
+        for first in range(0, rows, 256):
+            block = bytearray()
+            for row in range(first, min(rows, first + 256)):
+                line = raw[row * source_stride:row * source_stride + kept] if row < available else b""
+                block += b"\x00" + line + b"\xff" * (stride - len(line))
+            self._compress(bytes(block))
+        self.rows_written += rows
+
+    def close(self) -> None:
+        if self.rows_written < self.height:
+            self.write_rows(b"", self.width, self.height - self.rows_written)
+        self._pending += self._compressor.flush()
+        if self._pending:
+            self._chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+        self._chunk(b"IEND", b"")
+
+
+def _stitch_strips(
+    driver,
+    width: int,
+    height: int,
+    tile_height: int,
+    stats: Optional[CaptureStats] = None,
+    hasher: Optional[DHash] = None,
+) -> bytes:
+    out = io.BytesIO()
+    writer = None
+    scale = 1.0
+    for top in range(0, height, tile_height):
+        strip_height = min(tile_height, height - top)
+        data = _capture_clip(driver, top, width, strip_height)
+        with Image.open(io.BytesIO(data)) as strip:
+            if writer is None:
+                # Strips come back in device pixels, so size the image from the first one
+                scale = strip.width / float(width)
+                writer = PngStreamWriter(out, strip.width, int(round(height * scale)))
+                if hasher is not None:
+                    hasher.begin(writer.height)
+            raw = strip.convert("RGB").tobytes()
+            source_width = strip.width
+            # Hashing holds a grayscale copy of the strip next to its RGB pixels
+            hashed = strip.width * strip.height if hasher is not None else 0
+            # Rounded device-pixel bounds keep fractional scales from drifting across strips
+            rows = min(int(round((top + strip_height) * scale)), writer.height) - writer.rows_written
+            if hasher is not None:
+                hasher.add_image(strip, rows)
+        writer.write_rows(raw, source_width, rows)
+        _note_peak(stats, len(data) + len(raw) + hashed + out.tell())
+        del data, raw
+    if writer is None:
+        raise ValueError("Page has no height to capture")
+    writer.close()
+    return out.getvalue()
+
+
+def _cap_height(height: int, max_height: int, stats: Optional[CaptureStats] = None) -> int:
+    if stats is not None:
+        stats.page_height = max(stats.page_height, height)
+    if max_height > 0 and height > max_height:
+        logging.getLogger("screenshot_app.screenshotter").warning(
+            "Page height %spx exceeds cap %spx; capture truncated", height, max_height
+        )
+        height = max_height
+        if stats is not None:
+            stats.truncated = True
+    if stats is not None:
+        stats.captured_height = max(stats.captured_height, height)
+    return height
+
+
+def _note_peak(stats: Optional[CaptureStats], held: int) -> None:
+    if stats is not None:
+        stats.peak_bytes = max(stats.peak_bytes, held)
+
+
+def capture_page_png(
+    driver,
+    engine: str = "cdp",
+    max_height: int = 20000,
+    tile_height: int = 4096,
+    texture_height: int = CHROME_MAX_TEXTURE_HEIGHT,
+    stats: Optional[CaptureStats] = None,
+    hasher: Optional[DHash] = None,
+) -> bytes:
+    """Capture the full page as PNG bytes with the selected engine.
+
+    ``window`` resizes the browser to the page (legacy behaviour); ``cdp`` uses a
+    single beyond-viewport capture, split into strips above ``texture_height``
+    CSS pixels; ``tiled`` always captures in strips. Every engine cuts the page
+    at ``max_height`` CSS pixels. ``stats``, when given, records the page and
+    captured heights, whether the page was truncated and the most bytes the
+    capture held at once; repeated captures accumulate into it. A ``hasher`` is
+    fed every row of a capture stitched from strips, so its perceptual hash
+    needs no second decode (see ``capture_cache.fingerprint``).
+    """
+    if engine == "window":
+        return capture_fullpage_png(driver, max_height, stats)
+    if engine == "tiled":
+        return capture_tiled_png(driver, max_height, tile_height, stats, hasher)
+    return capture_cdp_png(driver, max_height, texture_height, stats, hasher)
 
 
+def take_fullpage_screenshot(driver, out_path: str, engine: str = "window", **kwargs) -> None:
+    png = capture_page_png(driver, engine=engine, **kwargs)
+    with open(out_path, "wb") as f:
+        f.write(png)
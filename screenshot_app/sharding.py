@@ -0,0 +1,89 @@
+import logging
+import zlib
+from typing import List, Optional
+
+import gspread
+
+from .scheduler import domain_of
+
+
+def shard_of(url: str, count: int) -> int:
+    """Shard that owns a URL.
+
+    Rows are partitioned by domain with a stable hash, so each domain is only
+    ever visited by one runner (politeness limits hold across shards) and
+    repeated URLs land on the same shard (batch deduplication still applies).
+    """
+    if count <= 1:
+        return 0
+    return zlib.crc32(domain_of(url).encode("utf-8")) % count
+
+
+class ShardCursor:
+    """One shard's progress through the Database sheet, kept in the Configurations sheet.
+
+    Shard ``index`` of ``count`` stores ``"<cursor>/<count>"`` in cell
+    ``<column><index + 1>``: every row of its own below ``cursor`` is finished
+    for the current cycle. ``B2`` is kept at the lowest shard cursor, so it
+    still marks a row before which everything is finished. A cell written for a
+    different shard count is ignored and the shard restarts from ``B2``.
+    Shards only ever write their own cell, plus ``B2`` and the reset at the end
+    of a cycle, so runners never overwrite each other's progress.
+    """
+
+    def __init__(self, config_sheet: gspread.Worksheet, index: int, count: int, column: str = "D"):
+        self.config_sheet = config_sheet
+        self.index = index
+        self.count = count
+        self.column = column
+        # B2 when the run started; stands in for shards that have no cursor yet
+        self.base = 0
+        self.logger = logging.getLogger("screenshot_app.sharding")
+
+    def _cell(self, index: int) -> str:
+        return f"{self.column}{index + 1}"
+
+    def _parse(self, value: Optional[str]) -> Optional[int]:
+        cursor, _, count = (value or "").strip().partition("/")
+        if not cursor.isdigit() or count != str(self.count):
+            return None
+        return int(cursor)
+
+    def read_all(self) -> List[Optional[int]]:
+        """Every shard's cursor; None for a shard that has not written one for this shard count."""
+        values = self.config_sheet.get(f"{self._cell(0)}:{self._cell(self.count - 1)}")
+        cursors: List[Optional[int]] = []
+        for index in range(self.count):
+            row = values[index] if index < len(values) else []
+            cursors.append(self._parse(str(row[0]) if row else None))
+        return cursors
+
+    def load(self, start_row: int) -> int:
+        """Row this shard resumes from; ``start_row`` (B2) when it has no cursor yet."""
+        self.base = start_row
+        own = self.read_all()[self.index]
+        return start_row if own is None else max(own, start_row)
+
+    def save(self, cursor: int) -> None:
+        """Record this shard's cursor and move ``B2`` to the lowest cursor of all shards."""
+        self.config_sheet.update(range_name=self._cell(self.index), values=[[f"{cursor}/{self.count}"]])
+        lowest = min(self.base if c is None else c for c in self.read_all())
+        self.config_sheet.update(range_name="B2", values=[[str(lowest)]])
+        self.logger.info("Shard %s/%s at row %s; start row set to %s", self.index, self.count, cursor, lowest)
+
+    def complete(self, end_row: int) -> bool:
+        """Mark this shard's pass as finished; True once every shard has finished.
+
+        The last shard to finish starts the next cycle by resetting every
+        shard cursor and ``B2`` to 0.
+        """
+        self.save(end_row)
+        if any(c is None or c < end_row for c in self.read_all()):
+            self.logger.info("Shard %s/%s finished; waiting for the other shards", self.index, self.count)
+            return False
+        self.config_sheet.batch_update(
+            [{"range": self._cell(i), "values": [[f"0/{self.count}"]]} for i in range(self.count)]
+            + [{"range": "B2", "values": [["0"]]}]
+        )
+        self.logger.info("All %s shards finished; start row reset to 0", self.count)
+        return True
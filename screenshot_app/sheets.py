@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from .devices import parse_profiles
+from .models import DeviceProfile, RowRecord
+
+
+STATUS_COLUMN = "F"
+
+# Header names mapped onto RowRecord fields; Devices is optional
+DATABASE_COLUMNS = ("Link", "Platform", "Link to folder", "Client", "Devices")
+
+
+def _cell_text(value_range: List[List[Any]]) -> Optional[str]:
+    # batch_get omits trailing empty cells, so an empty cell comes back as []
+    if not value_range or not value_range[0]:
+        return None
+    return str(value_range[0][0])
+
+
+def read_config_values(config_sheet: gspread.Worksheet) -> Tuple[int, int]:
+    batch_size_value, start_row_value = (_cell_text(r) for r in config_sheet.batch_get(["B1", "B2"]))
+    if start_row_value is None or start_row_value.strip() == "" or not start_row_value.strip().isdigit():
+        start_row = 0
+        config_sheet.update(range_name="B2", values=[["0"]])
+    else:
+        start_row = int(start_row_value.strip())
+
+    if batch_size_value is None or not batch_size_value.strip().isdigit():
+        raise ValueError("Invalid batch size in B1")
+    batch_size = int(batch_size_value.strip())
+    return start_row, batch_size
+
+
+def open_or_add_worksheet(spreadsheet: gspread.Spreadsheet, title: str, cols: int) -> gspread.Worksheet:
+    """The worksheet named ``title``, added to the spreadsheet when it has none."""
+    try:
+        return spreadsheet.worksheet(title)
+    except gspread.WorksheetNotFound:
+        logging.getLogger("screenshot_app.sheets").info("Adding a %s sheet", title)
+        return spreadsheet.add_worksheet(title, rows=100, cols=cols)
+
+
+def read_header(sheet: gspread.Worksheet) -> List[str]:
+    return [str(h).strip() for h in sheet.row_values(1)]
+
+
+def count_data_rows(sheet: gspread.Worksheet, header: Optional[List[str]] = None) -> int:
+    """Number of data rows, up to the last row with a link.
+
+    Sheets omits trailing empty rows from a range read, so a short window can
+    end at a blank row in the middle of the data; the Link column's extent is
+    the sheet's real end.
+    """
+    if header is None:
+        header = read_header(sheet)
+    if "Link" not in header:
+        raise ValueError("Database sheet header has no 'Link' column")
+    return max(0, len(sheet.col_values(header.index("Link") + 1)) - 1)
+
+
+def read_database_window(
+    sheet: gspread.Worksheet,
+    start_row: int,
+    end_row: int,
+    header: Optional[List[str]] = None,
+    default_profiles: Sequence[DeviceProfile] = (),
+) -> List[RowRecord]:
+    """Read data rows ``[start_row, end_row)`` without downloading the whole sheet.
+
+    Only the columns up to the last one ``RowRecord`` needs are fetched. Data row
+    ``i`` lives on sheet row ``i + 2`` (row 1 is the header). Blank rows Sheets
+    leaves off the end of the range come back as empty records, so callers
+    clamp ``end_row`` to ``count_data_rows``. A row's device
+    profiles come from its ``Devices`` cell (e.g. ``desktop,mobile``) when the
+    sheet has one, and are ``default_profiles`` otherwise.
+    """
+    if end_row <= start_row:
+        return []
+    if header is None:
+        header = read_header(sheet)
+    positions = {name: header.index(name) for name in DATABASE_COLUMNS if name in header}
+    if "Link" not in positions:
+        raise ValueError("Database sheet header has no 'Link' column")
+    last_col = max(positions.values()) + 1
+    first_cell = rowcol_to_a1(start_row + 2, 1)
+    last_cell = rowcol_to_a1(end_row + 1, last_col)
+    values = sheet.get(f"{first_cell}:{last_cell}")
+
+    def cell(row: List[Any], name: str) -> str:
+        pos = positions.get(name)
+        if pos is None or pos >= len(row):
+            return ""
+        # Coerce potentially None/Any values to strings for safety
+        return str(row[pos] or "")
+
+    def profiles(row: List[Any]) -> List[DeviceProfile]:
+        value = cell(row, "Devices")
+        if not value.strip():
+            return list(default_profiles)
+        try:
+            return parse_profiles(value)
+        except ValueError as e:
+            logging.getLogger("screenshot_app.sheets").warning("%s; using the default profiles", e)
+            return list(default_profiles)
+
+    return [
+        RowRecord(
+            link=cell(row, "Link"),
+            platform=cell(row, "Platform"),
+            folder_id=cell(row, "Link to folder"),
+            client=cell(row, "Client"),
+            profiles=profiles(row),
+        )
+        for row in values + [[]] * (end_row - start_row - len(values))
+    ]
+
+
+def status_ranges(statuses: Dict[int, str]) -> List[Dict[str, Any]]:
+    """Group row statuses into contiguous status-column ranges for ``batch_update``."""
+    data: List[Dict[str, Any]] = []
+    run_start: Optional[int] = None
+    values: List[List[str]] = []
+    previous: Optional[int] = None
+    for row_idx in sorted(statuses):
+        if previous is None or row_idx != previous + 1:
+            if run_start is not None:
+                data.append(_status_range(run_start, values))
+            run_start, values = row_idx, []
+        values.append([statuses[row_idx]])
+        previous = row_idx
+    if run_start is not None:
+        data.append(_status_range(run_start, values))
+    return data
+
+
+def _status_range(first_row_idx: int, values: List[List[str]]) -> Dict[str, Any]:
+    # Row indices are 0-based data rows; sheet row 1 holds the header
+    first = first_row_idx + 2
+    last = first + len(values) - 1
+    return {"range": f"{STATUS_COLUMN}{first}:{STATUS_COLUMN}{last}", "values": values}
+
+
+class StatusFlusher:
+    """Buffer per-row statuses and write them back in periodic batches.
+
+    Statuses are flushed with one ``batch_update`` once ``flush_rows`` are pending
+    or ``flush_seconds`` have passed, and the ``B2`` cursor is advanced past the
+    longest run of finished rows from the batch start. A crash therefore loses
+    at most one flush window of progress. With ``cursor_sink`` the cursor is
+    handed to it instead of written to ``B2``. Safe to call from worker threads.
+    """
+
+    def __init__(
+        self,
+        sheet: gspread.Worksheet,
+        config_sheet: gspread.Worksheet,
+        start_row: int,
+        flush_rows: int = 10,
+        flush_seconds: float = 60.0,
+        cursor_sink: Optional[Callable[[int], None]] = None,
+    ):
+        self.sheet = sheet
+        self.config_sheet = config_sheet
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self.cursor_sink = cursor_sink
+        self.logger = logging.getLogger("screenshot_app.sheets")
+        self._lock = threading.Lock()
+        self._pending: Dict[int, str] = {}
+        self._finished: set = set()
+        self._cursor = start_row
+        self._written_cursor = start_row
+        self._last_flush = time.time()
+
+    @property
+    def cursor(self) -> int:
+        return self._cursor
+
+    def record(self, row_idx: int, status: str) -> None:
+        with self._lock:
+            self._pending[row_idx] = status
+            self._finished.add(row_idx)
+            while self._cursor in self._finished:
+                self._cursor += 1
+            due = len(self._pending) >= self.flush_rows or time.time() - self._last_flush >= self.flush_seconds
+            if due:
+                self._flush_locked()
+
+    def skip(self, row_idx: int) -> None:
+        """Count a row as finished without writing a status, e.g. one owned by another shard."""
+        with self._lock:
+            self._finished.add(row_idx)
+            while self._cursor in self._finished:
+                self._cursor += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.time()
+        if self._pending:
+            data = status_ranges(self._pending)
+            try:
+                self.sheet.batch_update(data)
+            except Exception:
+                # Keep the statuses buffered; the next flush retries them
+                self.logger.exception("Failed to flush %s status(es)", len(self._pending))
+                return
+            self.logger.info("Statuses written to %s", ", ".join(d["range"] for d in data))
+            self._pending = {}
+        if self._cursor != self._written_cursor:
+            try:
+                if self.cursor_sink is not None:
+                    self.cursor_sink(self._cursor)
+                else:
+                    self.config_sheet.update(range_name="B2", values=[[str(self._cursor)]])
+            except Exception:
+                self.logger.exception("Failed to advance start row to %s", self._cursor)
+                return
+            self._written_cursor = self._cursor
+            self.logger.info("Next start row set to %s", self._cursor)
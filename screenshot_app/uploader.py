@@ -0,0 +1,468 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+from .metrics import timed
+from .models import CaptureStats, Fingerprint, ProcessResult
+from .watchdog import Deadline, DeadlineExceeded, get_watchdog
+
+
+# Drive requires chunk sizes in multiples of 256 KiB
+CHUNK_GRANULARITY = 256 * 1024
+
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# Drive also signals rate limiting as 403 with one of these reasons
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+@dataclass
+class UploadJob:
+    row_idx: int
+    # Local file to upload, or None when the capture is held in ``data``
+    path: Optional[str]
+    name: str
+    folder_id: str
+    mimetype: str = "image/png"
+    data: Optional[bytes] = None
+    # Hashes of the capture, passed through to the result for the capture cache
+    fingerprint: Optional[Fingerprint] = None
+    # Capture size and memory figures, passed through to the result
+    capture: Optional[CaptureStats] = None
+    # Further files of the same row (one per extra device profile), uploaded right after this one
+    extra: List["UploadJob"] = field(default_factory=list)
+    # Drive appProperties of the new file, e.g. capture_cache.app_properties
+    app_properties: Dict[str, str] = field(default_factory=dict)
+
+
+ResultCallback = Callable[[int, ProcessResult], None]
+
+
+def http_error_reason(error: Exception) -> str:
+    """The first reason Google gave for ``error``, e.g. ``rateLimitExceeded``; empty when there is none."""
+    details = error.error_details if isinstance(error, HttpError) else None
+    if isinstance(details, list):
+        for detail in details:
+            if isinstance(detail, dict) and detail.get("reason"):
+                return str(detail["reason"])
+    return ""
+
+
+def is_retryable_upload_error(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        if error.resp.status == 403:
+            return http_error_reason(error) in RATE_LIMIT_REASONS
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (socket.timeout, ConnectionError, httplib2.HttpLib2Error, TimeoutError))
+
+
+class UploadSessionStore:
+    """Persist resumable upload session URIs next to the files they belong to.
+
+    Sessions are keyed by local path and only reused while the file's size and
+    mtime are unchanged, so a later run never appends different bytes to an old
+    session. Drive expires sessions after about a week; older entries are pruned.
+    """
+
+    def __init__(self, directory: str, max_age_seconds: float = 6 * 24 * 3600):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    @staticmethod
+    def _fingerprint(path: str) -> Dict[str, Any]:
+        st = os.stat(path)
+        return {"size": st.st_size, "mtime": st.st_mtime}
+
+    def load(self, path: str, name: str, folder_id: str) -> Optional[str]:
+        entry_path = self._entry_path(path)
+        with self._lock:
+            try:
+                with open(entry_path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                fingerprint = self._fingerprint(path)
+            except (OSError, ValueError):
+                return None
+        if (
+            entry.get("name") != name
+            or entry.get("folder_id") != folder_id
+            or entry.get("size") != fingerprint["size"]
+            or entry.get("mtime") != fingerprint["mtime"]
+            or time.time() - entry.get("created", 0) > self.max_age_seconds
+        ):
+            return None
+        return entry.get("uri")
+
+    def save(self, path: str, name: str, folder_id: str, uri: str) -> None:
+        entry = {"path": path, "name": name, "folder_id": folder_id, "uri": uri, "created": time.time()}
+        entry.update(self._fingerprint(path))
+        with self._lock:
+            with open(self._entry_path(path), "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+
+    def clear(self, path: str) -> None:
+        with self._lock:
+            try:
+                os.remove(self._entry_path(path))
+            except OSError:
+                pass
+
+    def has_session(self, path: str, name: str, folder_id: str) -> bool:
+        return self.load(path, name, folder_id) is not None
+
+    def prune(self) -> None:
+        """Drop expired sessions along with the local files kept for them."""
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            entry_path = os.path.join(self.directory, filename)
+            try:
+                with open(entry_path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - entry.get("created", 0) <= self.max_age_seconds:
+                continue
+            for stale in (entry.get("path"), entry_path):
+                try:
+                    if stale:
+                        os.remove(stale)
+                except OSError:
+                    pass
+
+
+def query_upload_progress(request: Any) -> Optional[Dict[str, Any]]:
+    """Ask Drive how much of ``request``'s resumable session it already holds.
+
+    Moves ``request.resumable_progress`` to the first byte Drive is missing and
+    returns None, or returns the created file when Drive already has every byte.
+    """
+    size = request.resumable.size()
+    headers = {"Content-Range": f"bytes */{size if size is not None else '*'}", "Content-Length": "0"}
+    resp, content = request.http.request(request.resumable_uri, "PUT", headers=headers)
+    if resp.status in (200, 201):
+        return request.postproc(resp, content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=request.resumable_uri)
+    # Range is e.g. "bytes=0-1048575"; without one Drive has nothing yet
+    received = resp.get("range")
+    request.resumable_progress = int(received.rsplit("-", 1)[1]) + 1 if received else 0
+    return None
+
+
+def resumable_upload(
+    service: Any,
+    path: Optional[str],
+    name: str,
+    folder_id: str,
+    mimetype: str = "image/png",
+    chunk_size: int = 8 * 1024 * 1024,
+    max_retries: int = 5,
+    backoff_base: float = 1.0,
+    backoff_max: float = 60.0,
+    session_store: Optional[UploadSessionStore] = None,
+    log_prefix: str = "",
+    data: Optional[bytes] = None,
+    deadline: Optional[Deadline] = None,
+    app_properties: Optional[Dict[str, str]] = None,
+) -> str:
+    """Upload ``path`` (or in-memory ``data``) to Drive in resumable chunks and return the new file id.
+
+    Retryable failures (timeouts, connection resets, 408/429/5xx) back off
+    exponentially with jitter and continue from the last byte Drive acknowledged.
+    With a ``session_store`` the session URI of a file upload is persisted after
+    the first chunk, so a later call for the same unchanged file resumes rather
+    than restarts. In-memory uploads have nothing to resume from and skip the store.
+    An expired ``deadline`` stops the upload between chunks and retries. The
+    new file carries ``app_properties`` when given.
+    """
+    logger = logging.getLogger("screenshot_app.uploader")
+    chunk_size = max(CHUNK_GRANULARITY, chunk_size - chunk_size % CHUNK_GRANULARITY)
+    file_metadata: Dict[str, Any] = {"name": name, "parents": [folder_id]}
+    if app_properties:
+        file_metadata["appProperties"] = app_properties
+
+    if path is None:
+        session_store = None
+    # Sessions are only ever stored for file uploads, so this is the file's path whenever it is used
+    session_path = path or ""
+
+    def new_request():
+        if data is not None:
+            media = MediaIoBaseUpload(io.BytesIO(data), mimetype=mimetype, chunksize=chunk_size, resumable=True)
+        else:
+            media = MediaFileUpload(path, mimetype=mimetype, chunksize=chunk_size, resumable=True)
+        return service.files().create(body=file_metadata, media_body=media, fields="id")
+
+    request = new_request()
+    saved_uri = session_store.load(session_path, name, folder_id) if session_store is not None else None
+    if saved_uri:
+        logger.info("%sResuming interrupted upload of %s", log_prefix, name)
+        request.resumable_uri = saved_uri
+    persisted = bool(saved_uri)
+    # A restored session must ask Drive how many bytes it has; later failures are resynced by next_chunk
+    resync = bool(saved_uri)
+
+    failures = 0
+    response = None
+    while response is None:
+        if deadline is not None:
+            deadline.check()
+        try:
+            if resync:
+                response = query_upload_progress(request)
+                resync = False
+                continue
+            status, response = request.next_chunk()
+            failures = 0
+            if session_store is not None and not persisted and request.resumable_uri:
+                session_store.save(session_path, name, folder_id, request.resumable_uri)
+                persisted = True
+            if status is not None:
+                logger.debug("%sUploaded %d%% of %s", log_prefix, int(status.progress() * 100), name)
+        except HttpError as e:
+            if e.resp.status in (404, 410) and request.resumable_uri:
+                # The session expired or was never valid; start a fresh one
+                logger.warning("%sUpload session for %s expired; restarting", log_prefix, name)
+                if session_store is not None:
+                    session_store.clear(session_path)
+                request = new_request()
+                persisted = False
+                resync = False
+                continue
+            failures += 1
+            if not is_retryable_upload_error(e) or failures > max_retries:
+                raise
+            _backoff(logger, log_prefix, name, failures, max_retries, backoff_base, backoff_max, e)
+        except Exception as e:
+            failures += 1
+            if not is_retryable_upload_error(e) or failures > max_retries:
+                raise
+            # The next chunk asks Drive for its progress first, as after any failed chunk
+            _backoff(logger, log_prefix, name, failures, max_retries, backoff_base, backoff_max, e)
+
+    if session_store is not None:
+        session_store.clear(session_path)
+    return response.get("id", "")
+
+
+def _backoff(logger, log_prefix, name, failures, max_retries, base, cap, error) -> None:
+    delay = min(cap, base * (2 ** (failures - 1))) * random.uniform(0.5, 1.0)
+    logger.warning(
+        "%sUpload of %s failed (%s/%s): %s; retrying in %.1fs",
+        log_prefix,
+        name,
+        failures,
+        max_retries,
+        error,
+        delay,
+    )
+    time.sleep(delay)
+
+
+class UploadPool:
+    """Background Drive uploaders fed by the capture workers.
+
+    ``submit`` blocks while the queue is full, so captures can only run a bounded
+    number of files ahead of the uploads. Each uploader thread gets its own Drive
+    client from ``drive_service_factory`` when one is given; otherwise the shared
+    client is used under a lock because googleapiclient services are not thread-safe.
+    """
+
+    _STOP = None
+
+    def __init__(
+        self,
+        drive_service: Any,
+        on_result: ResultCallback,
+        workers: int = 2,
+        queue_size: int = 4,
+        max_attempts: int = 5,
+        chunk_size: int = 8 * 1024 * 1024,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        session_store: Optional[UploadSessionStore] = None,
+        drive_service_factory: Optional[Callable[[], Any]] = None,
+        timeout_seconds: float = 900,
+        shared_lock: Optional[threading.Lock] = None,
+    ):
+        self.drive_service = drive_service
+        self.drive_service_factory = drive_service_factory
+        self.on_result = on_result
+        self.max_attempts = max(1, max_attempts)
+        self.chunk_size = chunk_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session_store = session_store
+        self.timeout_seconds = timeout_seconds
+        self.logger = logging.getLogger("screenshot_app.uploader")
+        self._queue: "queue.Queue[Optional[UploadJob]]" = queue.Queue(maxsize=max(1, queue_size))
+        # Given when other code uses the shared client too
+        self._shared_lock = shared_lock or threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"upload-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, job: UploadJob) -> None:
+        self._queue.put(job)
+
+    def has_pending_session(self, path: str, name: str, folder_id: str) -> bool:
+        """True when an earlier run left ``path`` behind with a resumable session."""
+        if self.session_store is None or not os.path.exists(path):
+            return False
+        return self.session_store.has_session(path, name, folder_id)
+
+    def close(self) -> None:
+        """Wait for every queued upload to finish and stop the uploader threads."""
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for t in self._threads:
+            t.join()
+
+    def _worker(self) -> None:
+        service = None
+        if self.drive_service_factory is not None:
+            try:
+                service = self.drive_service_factory()
+            except Exception:
+                self.logger.exception("Failed to build a dedicated Drive client; using the shared one")
+        while True:
+            job = self._queue.get()
+            # ``is None`` rather than ``is self._STOP`` lets type checkers narrow the job
+            if job is None:
+                return
+            parts = [job, *job.extra]
+            kept: List[str] = []
+            timings: Dict[str, float] = {}
+            result = ProcessResult(status="Upload failed")
+            try:
+                with timed(timings, "upload"):
+                    # A row's files go up together; the first failure settles the row
+                    for index, part in enumerate(parts):
+                        part_result = self._upload(service, part)
+                        if index == 0 or part_result.status != "True":
+                            result = part_result
+                        if part_result.status != "True":
+                            # Keep the capture on disk while a session can still resume it
+                            if part.path is not None and self.has_pending_session(part.path, part.name, part.folder_id):
+                                kept.append(part.path)
+                            break
+            except Exception as e:
+                self.logger.exception("Row %s: Unexpected uploader error", job.row_idx)
+                result = ProcessResult(status="Upload failed", error_message=str(e))
+            finally:
+                for part in parts:
+                    if part.path is not None and part.path not in kept:
+                        with timed(timings, "cleanup"):
+                            try:
+                                os.remove(part.path)
+                            except Exception:
+                                self.logger.debug("Row %s: Failed to remove temp file %s", part.row_idx, part.path)
+            result.fingerprint = job.fingerprint
+            result.capture = job.capture
+            result.timings.update(timings)
+            try:
+                self.on_result(job.row_idx, result)
+            except Exception:
+                # A dead uploader would leave submit() blocked on a full queue once every thread is gone
+                self.logger.exception("Row %s: Failed to handle the upload result", job.row_idx)
+
+    def _upload(self, service: Any, job: UploadJob) -> ProcessResult:
+        t0 = time.time()
+        self.logger.info("Row %s: Uploading %s to folder %s", job.row_idx, job.name, job.folder_id)
+        try:
+            # Enforced cooperatively between chunks; socket timeouts bound each request
+            with get_watchdog().deadline("upload", self.timeout_seconds) as deadline:
+                if service is not None:
+                    file_id = self._resumable_upload(service, job, deadline)
+                else:
+                    with self._shared_lock:
+                        file_id = self._resumable_upload(self.drive_service, job, deadline)
+        except DeadlineExceeded as e:
+            self.logger.warning("Row %s: %s for %s", job.row_idx, e, job.name)
+            return ProcessResult(status=f"Timeout ({e.phase})", error_message=str(e))
+        except Exception as e:
+            self.logger.exception("Row %s: Upload failed for %s", job.row_idx, job.name)
+            return ProcessResult(status="Upload failed", error_message=str(e))
+        self.logger.info("Row %s: Upload complete %s in %.2fs", job.row_idx, job.name, time.time() - t0)
+        return ProcessResult(status="True", file_id=file_id, file_extension=os.path.splitext(job.name)[1][1:])
+
+    def copy(
+        self,
+        row_idx: int,
+        file_id: str,
+        name: str,
+        folder_id: str,
+        app_properties: Optional[Dict[str, str]] = None,
+    ) -> ProcessResult:
+        """Copy an uploaded screenshot into another folder on Drive, on the calling thread.
+
+        The copy happens server-side, so nothing is re-uploaded. It does not go
+        through the queue, which makes it safe to call from ``on_result``.
+        """
+        body: Dict[str, Any] = {"name": name, "parents": [folder_id]}
+        if app_properties:
+            body["appProperties"] = app_properties
+        failures = 0
+        while True:
+            try:
+                with self._shared_lock:
+                    response = self.drive_service.files().copy(fileId=file_id, body=body, fields="id").execute()
+                break
+            except Exception as e:
+                failures += 1
+                if not is_retryable_upload_error(e) or failures > self.max_attempts:
+                    self.logger.exception("Row %s: Drive copy of %s failed", row_idx, file_id)
+                    return ProcessResult(status="Upload failed", error_message=str(e))
+                _backoff(
+                    self.logger,
+                    f"Row {row_idx}: ",
+                    name,
+                    failures,
+                    self.max_attempts,
+                    self.backoff_base,
+                    self.backoff_max,
+                    e,
+                )
+        self.logger.info("Row %s: Copied %s into folder %s", row_idx, name, folder_id)
+        return ProcessResult(
+            status="True", file_id=response.get("id", ""), file_extension=os.path.splitext(name)[1][1:]
+        )
+
+    def _resumable_upload(self, service: Any, job: UploadJob, deadline: Optional[Deadline] = None) -> str:
+        return resumable_upload(
+            service,
+            job.path,
+            job.name,
+            job.folder_id,
+            mimetype=job.mimetype,
+            chunk_size=self.chunk_size,
+            max_retries=self.max_attempts,
+            backoff_base=self.backoff_base,
+            backoff_max=self.backoff_max,
+            session_store=self.session_store,
+            log_prefix=f"Row {job.row_idx}: ",
+            data=job.data,
+            deadline=deadline,
+            app_properties=job.app_properties,
+        )
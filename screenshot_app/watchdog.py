@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class DeadlineExceeded(Exception):
+    """A guarded phase ran past its budget."""
+
+    def __init__(self, phase: str, seconds: float):
+        super().__init__(f"{phase} exceeded {seconds:.0f}s")
+        self.phase = phase
+        self.seconds = seconds
+
+
+class Deadline:
+    """Budget for one phase of one row; use through ``Watchdog.deadline``.
+
+    When the budget runs out the watchdog thread calls ``on_expire``, which
+    should break whatever the phase is blocked on, e.g. by killing that row's
+    browser. Leaving the ``with`` block of an expired deadline raises
+    ``DeadlineExceeded`` in place of the error the kill provoked. Long-running
+    loops can also call ``check`` to stop cooperatively, and calls that take
+    their own timeout can bound it by ``remaining`` of ``current_deadline()``.
+    """
+
+    def __init__(self, watchdog: "Watchdog", phase: str, seconds: float, on_expire: Optional[Callable[[], None]]):
+        self.watchdog = watchdog
+        self.phase = phase
+        self.seconds = seconds
+        self.on_expire = on_expire
+        self.expires_at = 0.0
+        self.cancelled = False
+        self._fired = threading.Event()
+
+    @property
+    def expired(self) -> bool:
+        return self._fired.is_set()
+
+    def check(self) -> None:
+        if self.expired:
+            raise DeadlineExceeded(self.phase, self.seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def __enter__(self) -> "Deadline":
+        self.expires_at = time.monotonic() + self.seconds
+        self.watchdog._arm(self)
+        _active().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _active().remove(self)
+        # Under the watchdog's lock, so a deadline is either cancelled here or fired there, never both
+        with self.watchdog._cond:
+            if not self.expired:
+                self.cancelled = True
+        if self.expired and not isinstance(exc, DeadlineExceeded):
+            raise DeadlineExceeded(self.phase, self.seconds) from exc
+        return False
+
+
+class Watchdog:
+    """One background thread enforcing any number of concurrent deadlines.
+
+    Unlike ``SIGALRM`` it works from worker threads and asyncio tasks alike
+    (pass ``cancel_task(task)`` as ``on_expire`` for the latter), supports one
+    deadline per row in flight, and never interrupts the Python stack: the
+    expiry callback acts on the resource the phase is blocked on instead.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("screenshot_app.watchdog")
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, Deadline]] = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def deadline(self, phase: str, seconds: float, on_expire: Optional[Callable[[], None]] = None) -> Deadline:
+        return Deadline(self, phase, seconds, on_expire)
+
+    def _arm(self, deadline: Deadline) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (deadline.expires_at, next(self._seq), deadline))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, deadline = heapq.heappop(self._heap)
+                if deadline.cancelled:
+                    continue
+                deadline._fired.set()
+            self.logger.warning("Deadline exceeded: %s after %.0fs", deadline.phase, deadline.seconds)
+            if deadline.on_expire is not None:
+                try:
+                    deadline.on_expire()
+                except Exception:
+                    self.logger.exception("Expiry callback for %s failed", deadline.phase)
+
+
+_local = threading.local()
+
+
+def _active() -> List[Deadline]:
+    if not hasattr(_local, "deadlines"):
+        _local.deadlines = []
+    return _local.deadlines
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The innermost deadline the calling thread is inside, if any."""
+    deadlines = _active()
+    return deadlines[-1] if deadlines else None
+
+
+def cancel_task(task: Any) -> Callable[[], None]:
+    """``on_expire`` callback cancelling an asyncio task from the watchdog thread."""
+    loop = task.get_loop()
+    return lambda: loop.call_soon_threadsafe(task.cancel)
+
+
+_default: Optional[Watchdog] = None
+_default_lock = threading.Lock()
+
+
+def get_watchdog() -> Watchdog:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Watchdog()
+        return _default
@@ -0,0 +1,328 @@
+"""In-memory stand-ins for the gspread and Drive v3 calls the app makes."""
+
+import base64
+import io
+import itertools
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import gspread
+import httplib2
+from googleapiclient.errors import HttpError
+from gspread.utils import a1_to_rowcol
+from PIL import Image
+
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+
+DATABASE_HEADER = ["Link", "Platform", "Link to folder", "Client", "Notes", "Status"]
+
+
+def http_error(status: int, reason: str = "") -> HttpError:
+    """An ``HttpError`` shaped like Drive's, with ``reason`` as its first error reason."""
+    errors = [{"reason": reason, "message": reason}] if reason else []
+    content = json.dumps({"error": {"code": status, "message": reason, "errors": errors}}).encode("utf-8")
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+class FakeWorksheet:
+    """Worksheet held in a dict of cells; reads trim trailing empty cells and rows like Sheets does."""
+
+    def __init__(self, rows: List[List[str]], title: str = ""):
+        self.title = title
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[int, int], str] = {}
+        for r, row in enumerate(rows, start=1):
+            for c, value in enumerate(row, start=1):
+                self._cells[(r, c)] = value
+
+    @staticmethod
+    def _bounds(a1: str) -> Tuple[int, int, int, int]:
+        first, _, last = a1.partition(":")
+        r1, c1 = a1_to_rowcol(first)
+        r2, c2 = a1_to_rowcol(last) if last else (r1, c1)
+        return r1, c1, r2, c2
+
+    def _extent(self) -> Tuple[int, int]:
+        filled = [cell for cell, value in self._cells.items() if value != ""]
+        return max((r for r, _ in filled), default=0), max((c for _, c in filled), default=0)
+
+    def _get(self, r1: int, c1: int, r2: int, c2: int) -> List[List[str]]:
+        values = []
+        for r in range(r1, r2 + 1):
+            row = [self._cells.get((r, c), "") for c in range(c1, c2 + 1)]
+            while row and row[-1] == "":
+                row.pop()
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _update(self, range_name: str, values: List[List[Any]]) -> None:
+        r1, c1, _, _ = self._bounds(range_name)
+        for dr, row in enumerate(values):
+            for dc, value in enumerate(row):
+                self._cells[(r1 + dr, c1 + dc)] = str(value)
+
+    def get(self, a1: str) -> List[List[str]]:
+        with self._lock:
+            self.calls += 1
+            return self._get(*self._bounds(a1))
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        with self._lock:
+            self.calls += 1
+            return [self._get(*self._bounds(a1)) for a1 in ranges]
+
+    def get_all_values(self) -> List[List[str]]:
+        with self._lock:
+            self.calls += 1
+            rows, cols = self._extent()
+            return [row + [""] * (cols - len(row)) for row in self._get(1, 1, rows, cols)]
+
+    def row_values(self, row: int) -> List[str]:
+        with self._lock:
+            self.calls += 1
+            values = self._get(row, 1, row, max(1, self._extent()[1]))
+            return values[0] if values else []
+
+    def col_values(self, col: int) -> List[str]:
+        with self._lock:
+            self.calls += 1
+            return [row[0] if row else "" for row in self._get(1, col, self._extent()[0], col)]
+
+    def update(self, range_name: str, values: List[List[Any]]) -> None:
+        with self._lock:
+            self.calls += 1
+            self._update(range_name, values)
+
+    def batch_update(self, data: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.calls += 1
+            for item in data:
+                self._update(item["range"], item["values"])
+
+    def column(self, col: int, first_row: int, last_row: int) -> List[str]:
+        """Cells of ``col`` in rows ``first_row..last_row``, for assertions; not an API call."""
+        with self._lock:
+            return [self._cells.get((r, col), "") for r in range(first_row, last_row + 1)]
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets: Dict[str, FakeWorksheet]):
+        self.worksheets = worksheets
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        if name not in self.worksheets:
+            raise gspread.WorksheetNotFound(name)
+        return self.worksheets[name]
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 26) -> FakeWorksheet:
+        self.worksheets[title] = FakeWorksheet([], title=title)
+        return self.worksheets[title]
+
+
+class FakeSheetsClient:
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.spreadsheet
+
+
+def database(urls: List[str], batch_size: int, start_row: int = 0) -> Tuple[FakeSpreadsheet, Any, Any]:
+    """A spreadsheet with a Database sheet of ``urls`` (empty strings leave a blank row) and its Configurations."""
+    rows = [[url, "Web", "folder", "Client"] if url else [] for url in urls]
+    sheet = FakeWorksheet([DATABASE_HEADER] + rows, title="Database")
+    config = FakeWorksheet([["Batch size", str(batch_size)], ["Start row", str(start_row)]], title="Configurations")
+    return FakeSpreadsheet({"Database": sheet, "Configurations": config}), sheet, config
+
+
+class FakeCall:
+    """A pending Drive call; ``execute`` runs it, and so does a batch it is added to."""
+
+    def __init__(self, drive: "FakeDrive", run: Callable[[], Any]):
+        self.drive = drive
+        self.run = run
+
+    def execute(self) -> Any:
+        self.drive.requests += 1
+        return self.run()
+
+
+class FakeUpload(FakeCall):
+    """A resumable ``files.create`` that completes in one chunk."""
+
+    def __init__(self, drive: "FakeDrive", run: Callable[[], Any]):
+        super().__init__(drive, run)
+        self.resumable_uri = None
+
+    def next_chunk(self):
+        return None, self.execute()
+
+
+class FakeBatch:
+    def __init__(self, drive: "FakeDrive", callback: Callable[[str, Any, Any], None]):
+        self.drive = drive
+        self.callback = callback
+        self.calls: List[Tuple[str, FakeCall]] = []
+
+    def add(self, call: FakeCall, request_id: str) -> None:
+        self.calls.append((request_id, call))
+
+    def execute(self) -> None:
+        self.drive.requests += 1
+        self.drive.batch_sizes.append(len(self.calls))
+        for request_id, call in self.calls:
+            try:
+                response, error = call.run(), None
+            except HttpError as e:
+                response, error = None, e
+            self.callback(request_id, response, error)
+
+
+class FakeDriveFiles:
+    def __init__(self, drive: "FakeDrive"):
+        self.drive = drive
+
+    def get(self, fileId: str, fields: str = "", supportsAllDrives: bool = False) -> FakeCall:
+        return FakeCall(self.drive, lambda: self.drive.get(fileId))
+
+    def list(self, q: str = "", orderBy: str = "", **kwargs: Any) -> FakeCall:
+        # Files are kept in upload order, which stands in for modifiedTime
+        newest_first = orderBy.endswith(" desc")
+        return FakeCall(self.drive, lambda: {"files": self.drive.find(q)[:: -1 if newest_first else 1]})
+
+    def create(self, body: Dict[str, Any], media_body: Any = None, fields: str = "") -> FakeUpload:
+        return FakeUpload(self.drive, lambda: {"id": self.drive.add_file(dict(body))})
+
+    def copy(self, fileId: str, body: Dict[str, Any], fields: str = "") -> FakeCall:
+        def run() -> Dict[str, str]:
+            source = self.drive.get(fileId)
+            return {"id": self.drive.add_file({**source, **body})}
+
+        return FakeCall(self.drive, run)
+
+
+class FakeDrive:
+    """Drive v3 stand-in keeping file metadata in memory.
+
+    ``errors`` maps a file id to the errors its next lookups raise, one per
+    call; ``batch_errors`` are raised by whole batch requests in turn.
+    """
+
+    def __init__(self):
+        self.files_by_id: Dict[str, Dict[str, Any]] = {}
+        self.errors: Dict[str, List[HttpError]] = {}
+        self.batch_errors: List[Exception] = []
+        self.batch_sizes: List[int] = []
+        self.requests = 0
+        self.lookups: Set[str] = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def files(self) -> FakeDriveFiles:
+        return FakeDriveFiles(self)
+
+    def new_batch_http_request(self, callback: Callable[[str, Any, Any], None]) -> Any:
+        if self.batch_errors:
+            error = self.batch_errors.pop(0)
+
+            class FailingBatch(FakeBatch):
+                def execute(self) -> None:
+                    raise error
+
+            return FailingBatch(self, callback)
+        return FakeBatch(self, callback)
+
+    def add_folder(self, folder_id: str, **metadata: Any) -> str:
+        self.files_by_id[folder_id] = {
+            "id": folder_id,
+            "name": folder_id,
+            "mimeType": FOLDER_MIMETYPE,
+            "trashed": False,
+            "capabilities": {"canAddChildren": True},
+            **metadata,
+        }
+        return folder_id
+
+    def add_file(self, metadata: Dict[str, Any]) -> str:
+        with self._lock:
+            file_id = f"file-{next(self._ids)}"
+        name = metadata.get("name", "")
+        self.files_by_id[file_id] = {
+            "mimeType": "image/png",
+            "trashed": False,
+            "fileExtension": name.rsplit(".", 1)[1] if "." in name else "",
+            **metadata,
+            "id": file_id,
+        }
+        return file_id
+
+    def get(self, file_id: str) -> Dict[str, Any]:
+        self.lookups.add(file_id)
+        pending = self.errors.get(file_id)
+        if pending:
+            raise pending.pop(0)
+        if file_id not in self.files_by_id:
+            raise http_error(404, "notFound")
+        return dict(self.files_by_id[file_id])
+
+    def find(self, q: str) -> List[Dict[str, Any]]:
+        """Files matching the parts of a ``files.list`` query the app uses."""
+        parent = re.search(r"'([^']*)' in parents", q)
+        prefix = re.search(r"name contains '([^']*)'", q)
+        prop = re.search(r"appProperties has \{ key='([^']*)' and value='([^']*)' \}", q)
+        found = []
+        for item in self.files_by_id.values():
+            if item.get("trashed") or item.get("mimeType") == FOLDER_MIMETYPE:
+                continue
+            if parent and parent.group(1) not in item.get("parents", []):
+                continue
+            if prefix and prefix.group(1) not in item.get("name", ""):
+                continue
+            if prop and item.get("appProperties", {}).get(prop.group(1)) != prop.group(2):
+                continue
+            found.append(dict(item))
+        return found
+
+
+class FakePageDriver:
+    """Selenium driver stand-in whose every page renders as ``image``.
+
+    Answers the CDP calls navigation and capture make (layout metrics and
+    clipped ``Page.captureScreenshot``), and ``execute_script`` with
+    ``script_result``, e.g. the challenge probe's markers.
+    """
+
+    def __init__(self, image: Image.Image, script_result: Any = None):
+        self.image = image.convert("RGB")
+        self.script_result = [] if script_result is None else script_result
+        self.commands: List[str] = []
+        self.quit_calls = 0
+
+    def execute_cdp_cmd(self, cmd: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.commands.append(cmd)
+        if cmd == "Page.getLayoutMetrics":
+            return {"cssContentSize": {"width": self.image.width, "height": self.image.height}}
+        if cmd == "Page.captureScreenshot":
+            clip = params["clip"]
+            box = (clip["x"], clip["y"], clip["x"] + clip["width"], clip["y"] + clip["height"])
+            out = io.BytesIO()
+            self.image.crop(box).save(out, format="PNG")
+            return {"data": base64.b64encode(out.getvalue()).decode("ascii")}
+        return {}
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        return self.script_result
+
+    def set_script_timeout(self, seconds: float) -> None:
+        pass
+
+    def find_element(self, by: str, value: str) -> object:
+        return object()
+
+    def quit(self) -> None:
+        self.quit_calls += 1
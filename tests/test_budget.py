@@ -0,0 +1,52 @@
+import logging
+
+import pytest
+
+from screenshot_app import budget
+from screenshot_app.budget import TimeBudget
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(budget.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_first_row_time_replaces_the_seed_then_smooths(clock):
+    time_budget = TimeBudget(600, initial_estimate=30, smoothing=0.5)
+    time_budget.observe(10)
+    assert time_budget.estimate == 10
+    time_budget.observe(20)
+    assert time_budget.estimate == 15
+
+
+def test_admits_while_one_more_row_fits_before_the_reserve(clock):
+    time_budget = TimeBudget(600, reserve_seconds=100, initial_estimate=50)
+    assert time_budget.admit()
+    # 150s left: one more 50s row ends exactly at the reserve
+    clock[0] += 450
+    assert time_budget.admit()
+    clock[0] += 1
+    assert not time_budget.admit()
+    assert time_budget.exhausted
+
+
+def test_slow_rows_stop_admission_earlier(clock):
+    time_budget = TimeBudget(600, reserve_seconds=100, initial_estimate=10)
+    clock[0] += 300
+    assert time_budget.admit()
+    time_budget.observe(250)
+    assert not time_budget.admit()
+
+
+def test_refusal_is_final_and_logged_once(clock, caplog):
+    time_budget = TimeBudget(100, reserve_seconds=50, initial_estimate=60)
+    with caplog.at_level(logging.INFO, logger="screenshot_app.budget"):
+        assert not time_budget.admit()
+        # Faster rows later on do not reopen the run
+        time_budget.observe(1)
+        assert not time_budget.admit()
+    assert [r.getMessage() for r in caplog.records if "Time budget reached" in r.getMessage()] == [
+        "Time budget reached: 100s left, ~60.0s per row over 0 row(s), 50s reserved"
+    ]
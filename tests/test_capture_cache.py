@@ -0,0 +1,175 @@
+import io
+import os
+import random
+from typing import Any
+
+from PIL import Image
+
+from fakes import FakeDrive, FakePageDriver
+from screenshot_app.capture_cache import CaptureCache, DHash, app_properties, fingerprint, hash_distance, normalize_url
+from screenshot_app.config import CaptureConfig, ReadinessConfig
+from screenshot_app.models import CaptureStats, RowRecord
+from screenshot_app.processor import process_record
+from screenshot_app.uploader import UploadPool
+
+
+def page(width=120, height=700, seed=1):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), "white")
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        block = Image.new("RGB", (rng.randrange(5, 40), rng.randrange(5, 80)), tuple(rng.randrange(256) for _ in range(3)))
+        image.paste(block, (x, y))
+    return image
+
+
+def png_of(image):
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_normalize_url_drops_cosmetic_differences():
+    assert normalize_url("https://www.Example.com/path/?b=2&utm_source=x&a=1#top") == "example.com/path?a=1&b=2"
+    assert normalize_url("http://example.com:80/path") == normalize_url("https://example.com/path/")
+    assert normalize_url("https://example.com:8443/") == "example.com:8443"
+
+
+def test_streamed_hash_matches_full_decode():
+    image = page()
+    png = png_of(image)
+    hasher = DHash()
+    hasher.begin(image.height)
+    # Uneven strips, as the tiled capture produces them
+    for top in range(0, image.height, 137):
+        strip = image.crop((0, top, image.width, min(image.height, top + 137)))
+        hasher.add_image(strip)
+    stats = CaptureStats()
+    streamed = fingerprint(png, hasher, stats)
+    decoded = fingerprint(png)
+    assert streamed == decoded
+    # The image was never decoded, so no decode is billed to the capture
+    assert stats.peak_bytes == 0
+
+
+def test_partial_hasher_falls_back_to_decode():
+    image = page()
+    png = png_of(image)
+    hasher = DHash()
+    hasher.begin(image.height)
+    hasher.add_image(image.crop((0, 0, image.width, 100)))
+    stats = CaptureStats()
+    assert fingerprint(png, hasher, stats) == fingerprint(png)
+    assert stats.peak_bytes >= image.width * image.height * 3
+
+
+def test_rows_past_strip_are_white():
+    image = page(height=300)
+    padded = Image.new("RGB", (image.width, 400), "white")
+    padded.paste(image, (0, 0))
+    hasher = DHash()
+    hasher.begin(400)
+    hasher.add_image(image, rows=400)
+    assert hasher.hexdigest() == fingerprint(png_of(padded)).phash
+
+
+def test_perceptual_hash_tolerates_small_changes():
+    image = page()
+    touched = image.copy()
+    touched.putpixel((5, 5), (0, 0, 0))
+    assert hash_distance(fingerprint(png_of(image)).phash, fingerprint(png_of(touched)).phash) <= 2
+    assert hash_distance(fingerprint(png_of(image)).phash, fingerprint(png_of(page(seed=2))).phash) > 6
+
+
+def test_cache_match_and_store(tmp_path):
+    cache = CaptureCache(os.path.join(str(tmp_path), "cache.sqlite3"), max_distance=6)
+    capture = fingerprint(png_of(page()))
+    assert cache.match("https://a.com/", capture) is None
+    cache.store("https://a.com/", capture, "folder-1", "file-1", extension="webp")
+    cache.store("https://www.a.com/?utm_source=x", capture, "folder-2", "file-2")
+    cached = cache.match("http://a.com", capture)
+    assert cached is not None
+    assert cached.files == {"folder-1": "file-1", "folder-2": "file-2"}
+    assert cached.extensions == {"folder-1": "webp", "folder-2": ""}
+    # A different page replaces the files that held the old one
+    changed = fingerprint(png_of(page(seed=2)))
+    assert cache.match("https://a.com/", changed) is None
+    cache.store("https://a.com/", changed, "folder-1", "file-3", extension="png")
+    cached = cache.lookup("https://a.com/")
+    assert cached is not None and cached.files == {"folder-1": "file-3"}
+    cache.forget("https://a.com/", "folder-1")
+    cached = cache.lookup("https://a.com/")
+    assert cached is not None and cached.files == {}
+
+
+def test_lost_local_cache_is_rebuilt_from_drive(tmp_path):
+    drive: Any = FakeDrive()
+    old, new = fingerprint(png_of(page(seed=2))), fingerprint(png_of(page()))
+    drive.add_file({"name": "old.png", "parents": ["folder-1"], "appProperties": app_properties("https://a.com/", old)})
+    for folder_id in ("folder-1", "folder-2"):
+        drive.add_file(
+            {"name": "a.webp", "parents": [folder_id], "appProperties": app_properties("https://www.a.com", new)}
+        )
+    drive.add_file({"name": "b.png", "parents": ["folder-1"], "appProperties": app_properties("https://b.com/", new)})
+    cache = CaptureCache(os.path.join(str(tmp_path), "cache.sqlite3"), drive_service=drive)
+    # The older capture of a.com no longer shows the page
+    cached = cache.match("https://a.com/", new)
+    assert cached is not None
+    assert cached.files == {"folder-1": "file-2", "folder-2": "file-3"}
+    assert cached.extensions == {"folder-1": "webp", "folder-2": "webp"}
+    # Found once, the entry is local again
+    requests = drive.requests
+    assert cache.match("https://a.com/", new) is not None
+    assert drive.requests == requests
+    assert cache.lookup("https://c.com/") is None
+
+
+def test_exists_checks_drive(tmp_path):
+    drive: Any = FakeDrive()
+    kept = drive.add_file({"name": "a.png", "parents": ["folder"]})
+    trashed = drive.add_file({"name": "b.png", "parents": ["folder"], "trashed": True})
+    cache = CaptureCache(os.path.join(str(tmp_path), "cache.sqlite3"), drive_service=drive)
+    assert cache.exists(kept)
+    assert not cache.exists(trashed)
+    assert not cache.exists("deleted")
+    # Without a Drive client there is nothing to check against
+    assert CaptureCache(os.path.join(str(tmp_path), "local.sqlite3")).exists("deleted")
+
+
+def capture_row(cache, drive, image):
+    results = {}
+    uploader = UploadPool(drive, lambda row_idx, result: results.__setitem__(row_idx, result), workers=1)
+    record = RowRecord(link="https://a.com/", platform="Web", folder_id="folder", client="Client")
+    result = process_record(
+        FakePageDriver(image),
+        uploader,
+        record,
+        0,
+        debug_cloudflare=False,
+        capture=CaptureConfig(in_memory=True, max_height=0),
+        readiness=ReadinessConfig(engine="fixed", settle_seconds=0),
+        cache=cache,
+    )
+    uploader.close()
+    return results.get(0, result)
+
+
+def test_unchanged_only_while_the_file_is_on_drive(tmp_path):
+    drive: Any = FakeDrive()
+    image = page()
+    cache = CaptureCache(os.path.join(str(tmp_path), "cache.sqlite3"), drive_service=drive)
+    uploaded = capture_row(cache, drive, image)
+    assert uploaded.status == "True"
+    properties = drive.files_by_id[uploaded.file_id]["appProperties"]
+    assert properties == app_properties("https://a.com/", uploaded.fingerprint)
+    cache.store("https://a.com/", uploaded.fingerprint, "folder", uploaded.file_id)
+
+    # A later run whose runner lost the local cache still recognises the page
+    fresh = CaptureCache(os.path.join(str(tmp_path), "fresh.sqlite3"), drive_service=drive)
+    unchanged = capture_row(fresh, drive, image)
+    assert (unchanged.status, unchanged.file_id) == ("Unchanged", uploaded.file_id)
+
+    # Someone deleted the screenshot on Drive
+    del drive.files_by_id[uploaded.file_id]
+    again = capture_row(cache, drive, image)
+    assert again.status == "True" and again.file_id != uploaded.file_id
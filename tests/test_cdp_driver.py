@@ -0,0 +1,48 @@
+import concurrent.futures
+from typing import Any
+
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+from screenshot_app import cdp_driver
+from screenshot_app.cdp_driver import PageDriver
+from screenshot_app.watchdog import DeadlineExceeded, Watchdog
+
+
+class HungPage:
+    async def title(self):
+        return "never"
+
+
+class HungBrowser:
+    """Accepts page calls that never finish, like a renderer stuck in a script."""
+
+    def __init__(self):
+        self.futures = []
+
+    def run(self, coro):
+        coro.close()
+        return None, HungPage(), None
+
+    def submit(self, coro):
+        coro.close()
+        future = concurrent.futures.Future()
+        self.futures.append(future)
+        return future
+
+
+def test_call_gives_up_at_the_phase_deadline():
+    browser: Any = HungBrowser()
+    driver = PageDriver(browser, None)
+    # The call returns shortly after the deadline, which then reports the phase as timed out
+    with pytest.raises(DeadlineExceeded):
+        with Watchdog().deadline("readiness", 0.05):
+            driver.title
+    assert browser.futures[0].cancelled()
+
+
+def test_call_outside_a_phase_has_a_default_bound(monkeypatch):
+    monkeypatch.setattr(cdp_driver, "CALL_TIMEOUT_SECONDS", 0.01)
+    browser: Any = HungBrowser()
+    with pytest.raises(TimeoutException):
+        PageDriver(browser, None).title
@@ -0,0 +1,69 @@
+import os
+
+from screenshot_app.checkpoint import (
+    CAPTURED,
+    FAILED,
+    PENDING,
+    SKIPPED,
+    UPLOADED,
+    CheckpointStore,
+    state_for_status,
+)
+
+
+def store(tmp_path, sheet_key="sheet"):
+    return CheckpointStore(os.path.join(str(tmp_path), "checkpoints.sqlite3"), sheet_key)
+
+
+def test_state_for_status():
+    assert state_for_status("True") == UPLOADED
+    assert state_for_status("True (truncated)") == UPLOADED
+    assert state_for_status("Captured") == CAPTURED
+    assert state_for_status("Unchanged") == SKIPPED
+    assert state_for_status("Timeout (capture)") == FAILED
+
+
+def test_attempts_count_per_link(tmp_path):
+    checkpoints = store(tmp_path)
+    assert checkpoints.start(3, "https://a.com/") == 1
+    assert checkpoints.start(3, "https://a.com/") == 2
+    # The row now holds another link, so its history no longer applies
+    assert checkpoints.start(3, "https://b.com/") == 1
+    checkpoint = checkpoints.get(3)
+    assert checkpoint is not None
+    assert (checkpoint.link, checkpoint.state, checkpoint.attempts) == ("https://b.com/", PENDING, 1)
+
+
+def test_record_and_load_range(tmp_path):
+    checkpoints = store(tmp_path)
+    for row_idx in range(4):
+        checkpoints.start(row_idx, f"https://site{row_idx}.com/")
+    checkpoints.record(1, "True")
+    checkpoints.record(2, "Timeout")
+    loaded = checkpoints.load(1, 3)
+    assert sorted(loaded) == [1, 2]
+    assert (loaded[1].state, loaded[1].status) == (UPLOADED, "True")
+    assert (loaded[2].state, loaded[2].status) == (FAILED, "Timeout")
+
+
+def test_survives_reopen_and_is_scoped_by_sheet(tmp_path):
+    checkpoints = store(tmp_path)
+    checkpoints.start(0, "https://a.com/")
+    checkpoints.record(0, "Captured")
+    reopened = store(tmp_path)
+    checkpoint = reopened.get(0)
+    assert checkpoint is not None and checkpoint.state == CAPTURED
+    assert store(tmp_path, "other").get(0) is None
+
+
+def test_clear_and_prune(tmp_path):
+    checkpoints = store(tmp_path)
+    other = store(tmp_path, "other")
+    checkpoints.start(0, "https://a.com/")
+    other.start(0, "https://a.com/")
+    checkpoints.clear()
+    assert checkpoints.get(0) is None
+    assert other.get(0) is not None
+    other.max_age_seconds = -1
+    other.prune()
+    assert other.get(0) is None
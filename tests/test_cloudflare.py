@@ -0,0 +1,96 @@
+import os
+import time
+from typing import Any
+
+from PIL import Image
+
+from fakes import FakePageDriver, FakeSpreadsheet, FakeWorksheet
+from screenshot_app.cloudflare import MEMORY_HEADER, ChallengeMemory, challenge_markers, is_cloudflare_verification
+from screenshot_app.sheets import open_or_add_worksheet
+
+
+def page(markers=None) -> Any:
+    return FakePageDriver(Image.new("RGB", (8, 8)), script_result=markers)
+
+
+def test_markers_come_from_the_probe_and_the_response_header():
+    assert challenge_markers(page()) == []
+    assert not is_cloudflare_verification(page(), {"server": "cloudflare"})
+    assert challenge_markers(page(["title:just a moment", "#challenge-form"])) == ["title:just a moment", "#challenge-form"]
+    assert challenge_markers(page(["turnstile"]), {"cf-mitigated": "Challenge"}) == ["header:cf-mitigated", "turnstile"]
+
+
+def test_probe_failure_counts_as_a_clean_page():
+    driver = page()
+
+    def broken(script, *args):
+        raise RuntimeError("target closed")
+
+    driver.execute_script = broken
+    assert challenge_markers(driver) == []
+
+
+def test_policy_follows_failed_bypasses(tmp_path):
+    memory = ChallengeMemory(os.path.join(str(tmp_path), "memory.json"), skip_after=2)
+    assert memory.policy("a.com") == "normal"
+    memory.record("a.com", challenged=True)
+    assert memory.policy("a.com") == "defer"
+    memory.record("a.com", challenged=True)
+    assert memory.policy("a.com") == "skip"
+    # A successful bypass or a clean page ends the run of failures
+    memory.record("a.com", challenged=True, bypassed=True)
+    assert memory.policy("a.com") == "normal"
+    memory.record("b.com", challenged=True)
+    memory.record("b.com", challenged=False)
+    assert memory.policy("b.com") == "normal"
+
+
+def test_history_survives_in_the_file_and_expires(tmp_path):
+    path = os.path.join(str(tmp_path), "state", "memory.json")
+    ChallengeMemory(path, skip_after=1).record("a.com", challenged=True)
+    assert ChallengeMemory(path, skip_after=1).policy("a.com") == "skip"
+    assert ChallengeMemory(path, skip_after=1, max_age_days=0).policy("a.com") == "normal"
+
+
+def test_history_survives_in_the_sheet_without_the_file(tmp_path):
+    sheet: Any = FakeWorksheet([], title="Cloudflare")
+    memory = ChallengeMemory("", skip_after=1, sheet=sheet)
+    memory.record("a.com", challenged=True)
+    memory.record("b.com", challenged=True, bypassed=True)
+    memory.flush()
+    values = sheet.get_all_values()
+    assert values[0] == MEMORY_HEADER
+    assert [row[:5] for row in values[1:]] == [["a.com", "1", "1", "0", "0"], ["b.com", "0", "1", "1", "0"]]
+    # A later run on a fresh runner, with no local state at all
+    later = ChallengeMemory(os.path.join(str(tmp_path), "memory.json"), skip_after=1, sheet=sheet)
+    assert (later.policy("a.com"), later.policy("b.com")) == ("skip", "normal")
+
+
+def test_flush_keeps_other_shards_domains_and_drops_expired_ones():
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    sheet: Any = FakeWorksheet(
+        [
+            MEMORY_HEADER,
+            ["old.com", "3", "3", "0", "0", "2000-01-01T00:00:00Z"],
+            ["a.com", "2", "2", "0", "0", stamp],
+        ],
+        title="Cloudflare",
+    )
+    memory = ChallengeMemory("", skip_after=5, sheet=sheet)
+    # Recorded by another shard after this one read the sheet
+    sheet.update(range_name="A4", values=[["c.com", "1", "1", "0", "0", stamp]])
+    memory.record("b.com", challenged=False)
+    memory.flush()
+    assert [row[0] for row in sheet.get_all_values()[1:]] == ["a.com", "b.com", "c.com"]
+
+
+def test_flush_without_records_leaves_the_sheet_alone():
+    sheet: Any = FakeWorksheet([], title="Cloudflare")
+    ChallengeMemory("", sheet=sheet).flush()
+    assert sheet.get_all_values() == []
+
+
+def test_missing_memory_sheet_is_added():
+    spreadsheet: Any = FakeSpreadsheet({})
+    sheet = open_or_add_worksheet(spreadsheet, "Cloudflare", len(MEMORY_HEADER))
+    assert open_or_add_worksheet(spreadsheet, "Cloudflare", len(MEMORY_HEADER)) is sheet
@@ -0,0 +1,41 @@
+from typing import Any
+
+import pytest
+from PIL import Image
+
+from fakes import FakePageDriver
+from screenshot_app.devices import PRESET_PROFILES, clear_emulation, emulate, parse_profiles
+from screenshot_app.models import DeviceProfile
+
+
+def test_presets_and_custom_viewports():
+    assert parse_profiles(" Mobile , desktop") == [PRESET_PROFILES["mobile"], PRESET_PROFILES["desktop"]]
+    assert parse_profiles("1440x900@2,800x600") == [
+        DeviceProfile("1440x900@2", 1440, 900, scale=2.0),
+        DeviceProfile("800x600", 800, 600),
+    ]
+
+
+def test_repeated_and_blank_names_are_captured_once():
+    assert parse_profiles("mobile,,MOBILE, mobile") == [PRESET_PROFILES["mobile"]]
+    assert parse_profiles("") == []
+
+
+@pytest.mark.parametrize("value", ["watch", "1440x", "1x1", "1440x900@"])
+def test_unknown_profiles_are_rejected(value):
+    with pytest.raises(ValueError, match="Unknown device profile"):
+        parse_profiles(f"desktop,{value}")
+
+
+def test_emulation_is_applied_and_cleared():
+    driver: Any = FakePageDriver(Image.new("RGB", (8, 8)))
+    emulate(driver, PRESET_PROFILES["laptop"], default_user_agent="Browser/1")
+    clear_emulation(driver, "Browser/1")
+    assert driver.commands == [
+        "Emulation.setDeviceMetricsOverride",
+        "Emulation.setTouchEmulationEnabled",
+        "Network.setUserAgentOverride",
+        "Emulation.clearDeviceMetricsOverride",
+        "Emulation.setTouchEmulationEnabled",
+        "Network.setUserAgentOverride",
+    ]
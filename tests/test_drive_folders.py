@@ -0,0 +1,80 @@
+from typing import Any
+
+from fakes import FakeDrive, http_error
+from screenshot_app.drive_folders import BATCH_LIMIT, DriveFolderCache
+from screenshot_app.uploader import is_retryable_upload_error
+
+
+def folders(drive, **kwargs) -> DriveFolderCache:
+    return DriveFolderCache(drive, backoff_base=0, **kwargs)
+
+
+def test_folders_are_checked_in_batches():
+    drive: Any = FakeDrive()
+    ids = [drive.add_folder(f"folder-{i}") for i in range(BATCH_LIMIT + 20)]
+    drive.add_folder("trashed", trashed=True)
+    drive.add_folder("read-only", capabilities={"canAddChildren": False})
+    drive.add_file({"name": "file.png", "parents": ["folder-0"]})
+    cache = folders(drive)
+    cache.prefetch(ids + ["trashed", "read-only", "missing", "file-1", " ", "folder-0"])
+    assert drive.batch_sizes == [BATCH_LIMIT, 24]
+    assert [cache.problem(f) for f in ("folder-7", "trashed", "read-only", "missing", "file-1", " ")] == [
+        "",
+        "trashed",
+        "read-only",
+        "not found or not shared",
+        "not a folder",
+        "empty",
+    ]
+    # Folders already checked are not looked up again
+    cache.prefetch(["folder-0", "trashed"])
+    assert len(drive.batch_sizes) == 2
+
+
+def test_uploaded_screenshots_are_listed_by_prefix():
+    drive: Any = FakeDrive()
+    drive.add_folder("folder")
+    uploaded = drive.add_file({"name": "2024-05 Client.webp", "parents": ["folder"]})
+    drive.add_file({"name": "Old 2024-05 Client.png", "parents": ["folder"]})
+    cache = folders(drive)
+    cache.prefetch(["folder", "missing"], name_prefix="2024-05")
+    assert cache.find_file("folder", "2024-05 Client.png") == uploaded
+    assert cache.find_file("folder", "Old 2024-05 Client.png") is None
+    assert cache.find_file("missing", "2024-05 Client.png") is None
+
+
+def test_failed_batches_and_rate_limited_calls_are_retried():
+    drive: Any = FakeDrive()
+    for folder_id in ("a", "b", "c"):
+        drive.add_folder(folder_id)
+    drive.batch_errors = [http_error(503, "backendError")]
+    drive.errors = {"a": [http_error(403, "rateLimitExceeded")], "b": [http_error(403, "userRateLimitExceeded")]}
+    cache = folders(drive)
+    cache.prefetch(["a", "b", "c"])
+    assert [cache.problem(f) for f in ("a", "b", "c")] == ["", "", ""]
+    # All three again after the failed batch, then the two rate-limited lookups
+    assert drive.batch_sizes == [3, 2]
+
+
+def test_only_permission_errors_mean_no_access():
+    drive: Any = FakeDrive()
+    for folder_id in ("denied", "forbidden", "limited"):
+        drive.add_folder(folder_id)
+    drive.errors = {
+        "denied": [http_error(403, "insufficientPermissions")],
+        "forbidden": [http_error(403, "forbidden")],
+        "limited": [http_error(403, "rateLimitExceeded")] * 2,
+    }
+    cache = folders(drive, max_attempts=2)
+    cache.prefetch(["denied", "forbidden", "limited"])
+    assert (cache.problem("denied"), cache.problem("forbidden")) == ("no access", "no access")
+    # Still rate limited after the last attempt: unknown, so its rows go ahead
+    assert cache.folder("limited") is None and cache.problem("limited") == ""
+
+
+def test_rate_limit_403s_are_retryable():
+    assert is_retryable_upload_error(http_error(403, "rateLimitExceeded"))
+    assert is_retryable_upload_error(http_error(403, "userRateLimitExceeded"))
+    assert not is_retryable_upload_error(http_error(403, "insufficientPermissions"))
+    assert not is_retryable_upload_error(http_error(403))
+    assert is_retryable_upload_error(http_error(503))
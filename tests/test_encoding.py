@@ -0,0 +1,134 @@
+import io
+import logging
+import random
+from typing import Any
+
+import pytest
+from PIL import Image
+
+from fakes import FakeDrive, FakePageDriver
+from screenshot_app.config import CaptureConfig, EncodeConfig, ReadinessConfig
+from screenshot_app.encoding import (
+    MIN_QUALITY,
+    WEBP_MAX_DIMENSION,
+    encode_screenshot,
+    output_extension,
+    output_format,
+)
+from screenshot_app.models import RowRecord
+from screenshot_app.processor import process_record
+from screenshot_app.uploader import UploadPool
+
+
+def png_of(image):
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def noisy(width, height):
+    # Random pixels keep lossy encoders from shrinking the image to nothing
+    return Image.frombytes("RGB", (width, height), random.Random(0).randbytes(width * height * 3))
+
+
+def decoded(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_format_names():
+    assert output_format("JPG") == "jpeg"
+    assert output_extension("jpeg") == "jpg"
+    assert output_extension("webp") == "webp"
+    with pytest.raises(ValueError):
+        encode_screenshot(png_of(noisy(4, 4)), fmt="gif")
+
+
+def test_plain_png_passes_through():
+    png = png_of(noisy(10, 10))
+    encoded = encode_screenshot(png)
+    assert encoded.data is png
+    assert (encoded.mimetype, encoded.extension) == ("image/png", "png")
+
+
+def test_webp_and_jpeg_output():
+    png = png_of(Image.new("RGBA", (40, 30), (10, 20, 30, 128)))
+    webp = encode_screenshot(png, fmt="webp")
+    assert (webp.mimetype, webp.extension, decoded(webp.data).format) == ("image/webp", "webp", "WEBP")
+    jpeg = encode_screenshot(png, fmt="jpg")
+    assert (jpeg.mimetype, jpeg.extension) == ("image/jpeg", "jpg")
+    # JPEG has no alpha channel
+    assert decoded(jpeg.data).mode == "RGB"
+
+
+def test_page_too_tall_for_webp_falls_back_to_jpeg():
+    png = png_of(Image.new("RGB", (8, WEBP_MAX_DIMENSION + 1), "white"))
+    encoded = encode_screenshot(png, fmt="webp")
+    assert (encoded.mimetype, encoded.extension) == ("image/jpeg", "jpg")
+    assert decoded(encoded.data).size == (8, WEBP_MAX_DIMENSION + 1)
+
+
+def test_max_width_downscales_proportionally():
+    encoded = encode_screenshot(png_of(noisy(400, 200)), fmt="png", max_width=100)
+    assert decoded(encoded.data).size == (100, 50)
+
+
+def test_byte_budget_lowers_quality_before_size():
+    png = png_of(noisy(400, 400))
+    full = encode_screenshot(png, fmt="jpeg", quality=95)
+    at_floor = encode_screenshot(png, fmt="jpeg", quality=MIN_QUALITY)
+    # Just over what the quality floor reaches at full size, so only lowering quality is not enough
+    budget = len(at_floor.data) - 1
+    fitted = encode_screenshot(png, fmt="jpeg", quality=95, byte_budget=budget)
+    assert len(fitted.data) <= budget < len(full.data)
+    assert decoded(fitted.data).width < 400
+    # A budget the full-size image meets at a lower quality keeps its size
+    kept = encode_screenshot(png, fmt="jpeg", quality=95, byte_budget=len(full.data) - 1)
+    assert decoded(kept.data).size == (400, 400)
+
+
+def test_unreachable_budget_returns_smallest_attempt(caplog):
+    png = png_of(noisy(400, 100))
+    with caplog.at_level(logging.WARNING, logger="screenshot_app.encoding"):
+        encoded = encode_screenshot(png, fmt="png", byte_budget=10)
+    assert decoded(encoded.data).width < 400
+    assert "Could not fit screenshot into 10 bytes" in caplog.text
+
+
+def capture_row(page, encode, caplog):
+    drive: Any = FakeDrive()
+    results = {}
+    uploader = UploadPool(drive, lambda row_idx, result: results.__setitem__(row_idx, result), workers=1)
+    record = RowRecord(link="https://example.com/", platform="Web", folder_id="folder", client="Client")
+    with caplog.at_level(logging.INFO, logger="screenshot_app.processor"):
+        result = process_record(
+            FakePageDriver(page),
+            uploader,
+            record,
+            0,
+            debug_cloudflare=False,
+            capture=CaptureConfig(in_memory=True, max_height=0),
+            encode=encode,
+            readiness=ReadinessConfig(engine="fixed", settle_seconds=0),
+        )
+    uploader.close()
+    return result, results[0], drive
+
+
+def test_row_logs_bytes_before_and_after_encoding(caplog):
+    page = noisy(64, 48)
+    result, uploaded, drive = capture_row(page, EncodeConfig(format="webp", quality=50), caplog)
+    assert (result.status, uploaded.status) == ("Captured", "True")
+    name = drive.files_by_id[uploaded.file_id]["name"]
+    assert name.endswith(".webp")
+    encoded = [r.getMessage() for r in caplog.records if "Encoded" in r.getMessage()]
+    assert len(encoded) == 1
+    before, after = (int(part.split()[0]) for part in encoded[0].split(": Encoded ")[1].split(" -> "))
+    assert before == len(png_of(page))
+    assert encoded[0].endswith("bytes (image/webp)") and after > 0
+
+
+def test_row_falling_back_to_jpeg_is_named_jpg(caplog):
+    page = Image.new("RGB", (8, WEBP_MAX_DIMENSION + 100), "white")
+    _, uploaded, drive = capture_row(page, EncodeConfig(format="webp"), caplog)
+    assert drive.files_by_id[uploaded.file_id]["name"].endswith(".jpg")
+    assert uploaded.file_extension == "jpg"
@@ -0,0 +1,132 @@
+import csv
+import json
+import os
+
+from screenshot_app.metrics import RunReport, percentile, timed
+from screenshot_app.models import CaptureStats, NetworkStats, ProcessResult, Readiness
+
+
+def test_percentile_interpolates():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    assert percentile([4.0, 1.0], 1.0) == 4.0
+
+
+def test_timed_adds_up_and_survives_errors():
+    timings = {"capture": 1.0}
+    try:
+        with timed(timings, "capture"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert timings["capture"] >= 1.0
+
+
+def test_add_sums_phases_across_results():
+    report = RunReport()
+    report.add(0, ProcessResult(status="Captured", timings={"navigate": 1.0, "capture": 2.0}), "https://a.com/", "a.com")
+    report.add(0, ProcessResult(status="True", timings={"upload": 0.5}))
+    report.add(0, ProcessResult(status="Captured", timings={"cleanup": 0.25, "capture": 0.5}))
+    row = report.rows()[0]
+    assert row["status"] == "True"
+    assert (row["navigate"], row["capture"], row["upload"], row["cleanup"]) == (1.0, 2.5, 0.5, 0.25)
+    assert (row["url"], row["domain"]) == ("https://a.com/", "a.com")
+
+
+def test_summary_by_domain():
+    report = RunReport()
+    for row_idx, (domain, seconds) in enumerate([("a.com", 1.0), ("a.com", 3.0), ("b.com", 2.0)]):
+        report.add(row_idx, ProcessResult(status="True", timings={"capture": seconds}), f"https://{domain}/", domain)
+    summary = report.summary("domain")
+    assert summary["a.com"]["capture"]["count"] == 2
+    assert summary["a.com"]["capture"]["p50"] == 2.0
+    assert report.summary()[""]["capture"]["sum"] == 6.0
+
+
+def test_write_jsonl_csv_and_prometheus(tmp_path):
+    report = RunReport()
+    stats = CaptureStats(page_height=900, captured_height=800, truncated=True, peak_bytes=3 * 1024 * 1024)
+    report.add(0, ProcessResult(status="True", timings={"capture": 1.5}, capture=stats), "https://a.com/", "a.com")
+    report.add(1, ProcessResult(status="Timeout", timings={"navigate": 30.0}), "https://b.com/", "b.com")
+
+    jsonl = os.path.join(str(tmp_path), "report.jsonl")
+    report.write(jsonl)
+    with open(jsonl, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["status"] for row in rows] == ["True", "Timeout"]
+    assert rows[0]["capture_peak_mb"] == 3.0
+
+    csv_path = os.path.join(str(tmp_path), "report.csv")
+    report.write(csv_path)
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["capture"] == "1.5" and rows[0]["truncated"] == "True"
+
+    prom = os.path.join(str(tmp_path), "metrics.prom")
+    report.write_prometheus(prom)
+    with open(prom, encoding="utf-8") as f:
+        text = f.read()
+    assert 'screenshot_phase_seconds_count{phase="capture"} 1' in text
+    assert 'screenshot_domain_phase_seconds_sum{domain="b.com",phase="navigate"} 30.000' in text
+    assert 'screenshot_rows{status="Timeout"} 1' in text
+
+
+def test_readiness_verdict_is_reported(tmp_path, caplog):
+    report = RunReport()
+    stable = Readiness(ready=True, reason="stable: network,dom", seconds=1.25)
+    timeout = Readiness(ready=False, reason="timeout waiting for network", seconds=10.0)
+    report.add(0, ProcessResult(status="Captured", readiness=stable), "https://a.com/", "a.com")
+    # The uploader's result carries no verdict and keeps the one the capture reported
+    report.add(0, ProcessResult(status="True"))
+    report.add(1, ProcessResult(status="True", readiness=timeout), "https://b.com/", "b.com")
+    report.add(2, ProcessResult(status="Timeout", readiness=timeout), "https://c.com/", "c.com")
+    row = report.rows()[0]
+    assert (row["ready"], row["ready_reason"], row["ready_seconds"]) == (True, "stable: network,dom", 1.25)
+    assert report.readiness_counts() == {(True, "stable: network,dom"): 1, (False, "timeout waiting for network"): 2}
+
+    with caplog.at_level("INFO", logger="screenshot_app.metrics"):
+        report.log_summary()
+    assert "Readiness: 1 of 3 row(s) stable; 2 timeout waiting for network" in caplog.text
+
+    csv_path = os.path.join(str(tmp_path), "report.csv")
+    report.write(csv_path)
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert (rows[1]["ready"], rows[1]["ready_seconds"]) == ("False", "10.0")
+
+    prom = os.path.join(str(tmp_path), "metrics.prom")
+    report.write_prometheus(prom)
+    with open(prom, encoding="utf-8") as f:
+        text = f.read()
+    assert 'screenshot_readiness_rows{ready="false",reason="timeout waiting for network"} 2' in text
+    assert 'screenshot_readiness_rows{ready="true",reason="stable: network,dom"} 1' in text
+
+
+def test_network_counts_and_estimated_savings(tmp_path, caplog):
+    report = RunReport()
+    busy = NetworkStats(requests=10, blocked=4, bytes_received=600, finished=6)
+    plain = NetworkStats(requests=5, blocked=0, bytes_received=1400, finished=4)
+    report.add(0, ProcessResult(status="True", network=busy))
+    report.add(1, ProcessResult(status="True", network=plain))
+    report.add(2, ProcessResult(status="Timeout"))
+    rows = report.rows()
+    assert {k: rows[0][k] for k in ("requests", "blocked", "bytes_received", "bytes_saved")} == {
+        "requests": 10,
+        "blocked": 4,
+        "bytes_received": 600,
+        "bytes_saved": 400,
+    }
+    assert "requests" not in rows[2]
+    # 2000 bytes over 10 completed requests prices the 4 blocked ones at 200 each
+    assert report.network_totals() == {"requests": 15, "blocked": 4, "bytes_received": 2000, "bytes_saved": 800}
+
+    with caplog.at_level("INFO", logger="screenshot_app.metrics"):
+        report.log_summary()
+    assert "Network: 15 request(s), 4 blocked" in caplog.text
+
+    prom = os.path.join(str(tmp_path), "metrics.prom")
+    report.write_prometheus(prom)
+    with open(prom, encoding="utf-8") as f:
+        text = f.read()
+    assert 'screenshot_network_requests{outcome="blocked"} 4' in text
+    assert 'screenshot_network_bytes{kind="saved"} 800' in text
@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+
+from screenshot_app.models import ProcessResult, RowRecord
+from screenshot_app.pool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_calls = 0
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+def rows(count):
+    return [(i, RowRecord(link=f"https://site{i}.com/", platform="Web", folder_id="f", client="C")) for i in range(count)]
+
+
+def test_single_worker_runs_on_calling_thread_with_one_driver():
+    drivers = []
+    threads = set()
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    def handler(driver, row_idx, record):
+        threads.add(threading.current_thread())
+        assert driver is drivers[0]
+        return ProcessResult(status="True")
+
+    results = BrowserPool(1, factory).run(rows(4), handler)
+    assert sorted(results) == [0, 1, 2, 3]
+    assert threads == {threading.current_thread()}
+    # The driver serves every row and is quit once the batch is drained
+    assert len(drivers) == 1 and drivers[0].quit_calls == 1
+
+
+def test_workers_share_rows_and_keep_their_own_driver():
+    drivers = []
+    seen = []
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            drivers.append(FakeDriver())
+            return drivers[-1]
+
+    def handler(driver, row_idx, record):
+        with lock:
+            seen.append((threading.current_thread().name, driver, row_idx))
+        return ProcessResult(status="True")
+
+    results = BrowserPool(3, factory).run(rows(12), handler)
+    assert sorted(results) == list(range(12))
+    assert sorted(row_idx for _, _, row_idx in seen) == list(range(12))
+    # A worker thread always hands rows the same driver
+    for name in {name for name, _, _ in seen}:
+        assert len({id(driver) for n, driver, _ in seen if n == name}) == 1
+    assert len(drivers) <= 3
+    assert all(driver.quit_calls == 1 for driver in drivers)
+
+
+def test_rows_are_pulled_lazily():
+    pulled = []
+
+    def generate():
+        for item in rows(3):
+            pulled.append(item[0])
+            yield item
+
+    def handler(driver, row_idx, record):
+        # The next row is not read before this one is handled
+        assert pulled[-1] == row_idx
+        return ProcessResult(status="True")
+
+    BrowserPool(1, FakeDriver).run(generate(), handler)
+    assert pulled == [0, 1, 2]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_driver_start_failure_releases_every_row(workers):
+    def factory():
+        raise RuntimeError("no chrome")
+
+    released = []
+    lock = threading.Lock()
+
+    def release(row_idx, record):
+        with lock:
+            released.append(row_idx)
+
+    handled = []
+
+    def handler(driver, row_idx, record):
+        handled.append(row_idx)
+        return ProcessResult(status="True")
+
+    results = BrowserPool(workers, factory).run(rows(5), handler, release=release)
+    assert handled == []
+    assert sorted(released) == list(range(5))
+    assert {r.status for r in results.values()} == {"WebDriver error"}
+    assert all("no chrome" in (r.error_message or "") for r in results.values())
+
+
+def test_handler_error_releases_row_and_recycles_driver():
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    def handler(driver, row_idx, record):
+        if row_idx == 1:
+            raise ValueError("boom")
+        return ProcessResult(status="True")
+
+    released = []
+    results = BrowserPool(1, factory).run(rows(3), handler, release=lambda i, r: released.append(i))
+    assert released == [0, 1, 2]
+    assert [results[i].status for i in range(3)] == ["True", "WebDriver error", "True"]
+    assert "cleanup" in results[1].timings
+    # The driver that served the failed row is killed rather than reused; its replacement is quit
+    assert len(drivers) == 2
+    assert (drivers[0].quit_calls, drivers[1].quit_calls) == (0, 1)
+
+
+def test_failing_release_does_not_lose_result():
+    def release(row_idx, record):
+        raise RuntimeError("release failed")
+
+    results = BrowserPool(1, FakeDriver).run(rows(2), lambda d, i, r: ProcessResult(status="True"), release=release)
+    assert [results[i].status for i in range(2)] == ["True", "True"]
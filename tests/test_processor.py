@@ -0,0 +1,90 @@
+import os
+import threading
+from typing import Any
+
+import pytest
+
+from fakes import FakeDrive, FakeSheetsClient, database
+from screenshot_app import processor
+from screenshot_app.config import (
+    CaptureCacheConfig,
+    CheckpointConfig,
+    CloudflareConfig,
+    MetricsConfig,
+    PolitenessConfig,
+    PoolConfig,
+    UploadConfig,
+)
+
+
+def failing_driver(monkeypatch):
+    def start_driver(**kwargs):
+        raise RuntimeError("no chrome")
+
+    monkeypatch.setattr(processor, "start_driver", start_driver)
+
+
+def run_batch(tmp_path, spreadsheet, workers=1):
+    # Stands in for gspread's client
+    gc: Any = FakeSheetsClient(spreadsheet)
+    drive: Any = FakeDrive()
+    drive.add_folder("folder")
+    outcome = {}
+
+    def target():
+        outcome["result"] = processor.process_batch(
+            gc=gc,
+            drive_service=drive,
+            spreadsheet_id="sheet",
+            database_sheet_name="Database",
+            config_sheet_name="Configurations",
+            debug_cloudflare=False,
+            pool=PoolConfig(workers=workers, prespawn_browsers=False),
+            upload=UploadConfig(session_dir=os.path.join(str(tmp_path), "sessions")),
+            checkpoint=CheckpointConfig(path=""),
+            politeness=PolitenessConfig(min_interval_seconds=0, max_interval_seconds=0),
+            capture_cache=CaptureCacheConfig(path=""),
+            cloudflare=CloudflareConfig(memory_path=""),
+            metrics=MetricsConfig(report_path=""),
+        )
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(30)
+    assert not thread.is_alive(), "process_batch hung"
+    return outcome["result"]
+
+
+@pytest.mark.parametrize(
+    "urls, workers",
+    [
+        # Rows of one domain wait for each other's release
+        (["https://a.com/1", "https://a.com/2", "https://a.com/3"], 1),
+        (["https://a.com/1", "https://a.com/2", "https://b.com/1", "https://c.com/1"], 2),
+    ],
+)
+def test_rows_settle_when_driver_fails_to_start(tmp_path, monkeypatch, urls, workers):
+    failing_driver(monkeypatch)
+    # A row past the batch, so finishing the batch does not wrap the cursor back to 0
+    spreadsheet, sheet, config = database(urls + ["https://tail.com/"], batch_size=len(urls))
+    run_batch(tmp_path, spreadsheet, workers)
+    assert sheet.column(6, 2, len(urls) + 2) == ["WebDriver error"] * len(urls) + [""]
+    assert config.column(2, 2, 2) == [str(len(urls))]
+
+
+def test_blank_row_after_the_batch_is_not_the_end_of_the_sheet(tmp_path, monkeypatch):
+    failing_driver(monkeypatch)
+    spreadsheet, sheet, config = database(
+        ["https://a.com/", "https://b.com/", "https://c.com/", "", "https://d.com/", "https://e.com/"], batch_size=3
+    )
+    assert run_batch(tmp_path, spreadsheet) is False
+    assert sheet.column(6, 2, 7) == ["WebDriver error"] * 3 + [""] * 3
+    assert config.column(2, 2, 2) == ["3"]
+
+
+def test_batch_ending_at_the_last_link_resets_the_cursor(tmp_path, monkeypatch):
+    failing_driver(monkeypatch)
+    spreadsheet, sheet, config = database(["https://a.com/", "", "https://c.com/"], batch_size=1, start_row=2)
+    assert run_batch(tmp_path, spreadsheet) is True
+    assert sheet.column(6, 2, 4) == ["", "", "WebDriver error"]
+    assert config.column(2, 2, 2) == ["0"]
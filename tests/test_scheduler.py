@@ -0,0 +1,67 @@
+import threading
+import time
+
+from screenshot_app.models import RowRecord
+from screenshot_app.scheduler import DomainScheduler, domain_of
+
+
+def row(row_idx, url):
+    return (row_idx, RowRecord(link=url, platform="Web", folder_id="f", client="C"))
+
+
+def test_domain_of_folds_www():
+    assert domain_of("https://www.Example.com/a") == "example.com"
+    assert domain_of("http://example.com:8080/") == "example.com"
+    assert domain_of("not a url") == ""
+
+
+def test_take_prefers_largest_domain_and_caps_in_flight():
+    scheduler = DomainScheduler(min_interval=0, max_interval=0)
+    scheduler.add([row(0, "https://a.com/1"), row(1, "https://a.com/2"), row(2, "https://b.com/1")])
+    first = scheduler.take(block=False)
+    assert first is not None and first[0] == 0
+    # a.com has a row in flight, so b.com goes next
+    second = scheduler.take(block=False)
+    assert second is not None and second[0] == 2
+    assert scheduler.take(block=False) is None
+    scheduler.release("https://a.com/1")
+    third = scheduler.take(block=False)
+    assert third is not None and third[0] == 1
+    assert scheduler.pending == 0
+    assert scheduler.take() is None
+
+
+def test_deferred_domains_go_last():
+    scheduler = DomainScheduler(min_interval=0, max_interval=0, defer=lambda domain: domain == "a.com")
+    scheduler.add([row(0, "https://a.com/1"), row(1, "https://a.com/2"), row(2, "https://b.com/1")])
+    taken = scheduler.take(block=False)
+    assert taken is not None and taken[0] == 2
+
+
+def test_take_waits_for_interval():
+    scheduler = DomainScheduler(min_interval=0.2, max_interval=0.2, max_per_domain=2)
+    scheduler.add([row(0, "https://a.com/1"), row(1, "https://a.com/2")])
+    assert scheduler.take() is not None
+    assert scheduler.take(block=False) is None
+    start = time.monotonic()
+    assert scheduler.take() is not None
+    assert time.monotonic() - start >= 0.15
+
+
+def test_take_wakes_on_release():
+    scheduler = DomainScheduler(min_interval=0, max_interval=0)
+    scheduler.add([row(0, "https://a.com/1"), row(1, "https://a.com/2")])
+    assert scheduler.take() is not None
+    threading.Timer(0.1, scheduler.release, args=("https://a.com/1",)).start()
+    taken = scheduler.take(timeout=5)
+    assert taken is not None and taken[0] == 1
+
+
+def test_take_gives_up_after_timeout_when_never_released():
+    scheduler = DomainScheduler(min_interval=0, max_interval=0)
+    scheduler.add([row(0, "https://a.com/1"), row(1, "https://a.com/2")])
+    assert scheduler.take() is not None
+    start = time.monotonic()
+    assert scheduler.take(timeout=0.2) is None
+    assert time.monotonic() - start < 2
+    assert scheduler.pending == 1
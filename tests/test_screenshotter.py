@@ -0,0 +1,45 @@
+import io
+
+from PIL import Image, ImageChops
+
+from screenshot_app.screenshotter import PngStreamWriter
+
+
+def raw_rows(image):
+    return image.convert("RGB").tobytes()
+
+
+def test_writer_output_decodes_to_the_written_rows():
+    image = Image.linear_gradient("L").convert("RGB").resize((50, 600))
+    out = io.BytesIO()
+    writer = PngStreamWriter(out, image.width, image.height, level=1)
+    for top in range(0, image.height, 170):
+        strip = image.crop((0, top, image.width, min(image.height, top + 170)))
+        writer.write_rows(raw_rows(strip), strip.width, strip.height)
+    writer.close()
+    with Image.open(io.BytesIO(out.getvalue())) as decoded:
+        assert decoded.size == image.size
+        assert ImageChops.difference(decoded.convert("RGB"), image).getbbox() is None
+
+
+def test_writer_crops_pads_and_fills_missing_rows_with_white():
+    strip = Image.new("RGB", (30, 10), (200, 10, 10))
+    out = io.BytesIO()
+    writer = PngStreamWriter(out, 20, 40)
+    # Wider than the image: cropped
+    writer.write_rows(raw_rows(strip), strip.width, strip.height)
+    # Narrower than the image, and fewer rows of pixels than claimed: padded with white
+    narrow = Image.new("RGB", (10, 5), (10, 200, 10))
+    writer.write_rows(raw_rows(narrow), narrow.width, 10)
+    # Rows past the image height are dropped
+    writer.write_rows(b"", 20, 100)
+    assert writer.rows_written == 40
+    writer.close()
+    with Image.open(io.BytesIO(out.getvalue())) as decoded:
+        decoded = decoded.convert("RGB")
+        assert decoded.size == (20, 40)
+        assert decoded.getpixel((19, 0)) == (200, 10, 10)
+        assert decoded.getpixel((5, 12)) == (10, 200, 10)
+        assert decoded.getpixel((15, 12)) == (255, 255, 255)
+        assert decoded.getpixel((5, 17)) == (255, 255, 255)
+        assert decoded.getpixel((0, 39)) == (255, 255, 255)
@@ -0,0 +1,50 @@
+from typing import Any
+
+from fakes import FakeWorksheet
+from screenshot_app.sharding import ShardCursor, shard_of
+
+
+def config_sheet(start_row: str = "0") -> Any:
+    # Stands in for a gspread worksheet
+    return FakeWorksheet([["Batch size", "10"], ["Start row", start_row]])
+
+
+def test_shard_of_is_stable_per_domain():
+    assert shard_of("https://www.a.com/x", 4) == shard_of("http://a.com/y", 4)
+    assert all(0 <= shard_of(f"https://site{i}.com/", 3) < 3 for i in range(20))
+
+
+def test_load_falls_back_to_start_row_without_own_cursor():
+    sheet = config_sheet()
+    assert ShardCursor(sheet, 0, 2).load(5) == 5
+
+
+def test_save_moves_b2_to_lowest_cursor():
+    sheet = config_sheet()
+    first, second = ShardCursor(sheet, 0, 2), ShardCursor(sheet, 1, 2)
+    first.load(4)
+    second.load(4)
+    first.save(10)
+    # The second shard has no cursor yet and stands at the run's start row
+    assert sheet.column(2, 2, 2) == ["4"]
+    second.save(7)
+    assert sheet.column(4, 1, 2) == ["10/2", "7/2"]
+    assert sheet.column(2, 2, 2) == ["7"]
+    assert ShardCursor(sheet, 0, 2).load(4) == 10
+
+
+def test_cursor_for_other_shard_count_is_ignored():
+    sheet = config_sheet()
+    sheet.update(range_name="D1", values=[["12/3"]])
+    assert ShardCursor(sheet, 0, 2).load(4) == 4
+
+
+def test_last_shard_to_complete_resets_cycle():
+    sheet = config_sheet()
+    first, second = ShardCursor(sheet, 0, 2), ShardCursor(sheet, 1, 2)
+    first.load(0)
+    second.load(0)
+    assert first.complete(20) is False
+    assert second.complete(20) is True
+    assert sheet.column(4, 1, 2) == ["0/2", "0/2"]
+    assert sheet.column(2, 2, 2) == ["0"]
@@ -0,0 +1,71 @@
+from typing import Any, Tuple
+
+from fakes import DATABASE_HEADER, FakeWorksheet
+from screenshot_app.sheets import StatusFlusher, status_ranges
+
+
+def sheets(rows: int = 6) -> Tuple[Any, Any]:
+    # Stand in for gspread worksheets
+    database = FakeWorksheet([DATABASE_HEADER] + [[f"https://site{i}.com/", "Web", "f", "C"] for i in range(rows)])
+    config = FakeWorksheet([["Batch size", str(rows)], ["Start row", "0"]])
+    return database, config
+
+
+def test_status_ranges_groups_contiguous_rows():
+    data = status_ranges({0: "True", 1: "Timeout", 3: "True"})
+    assert data == [
+        {"range": "F2:F3", "values": [["True"], ["Timeout"]]},
+        {"range": "F5:F5", "values": [["True"]]},
+    ]
+
+
+def test_cursor_advances_past_longest_finished_run():
+    database, config = sheets()
+    flusher = StatusFlusher(database, config, start_row=0, flush_rows=100, flush_seconds=3600)
+    flusher.record(1, "True")
+    flusher.record(2, "Timeout")
+    assert flusher.cursor == 0
+    flusher.record(0, "True")
+    assert flusher.cursor == 3
+    flusher.skip(4)
+    assert flusher.cursor == 3
+    flusher.flush()
+    assert database.column(6, 2, 6) == ["True", "True", "Timeout", "", ""]
+    assert config.column(2, 2, 2) == ["3"]
+
+
+def test_flushes_once_enough_rows_are_pending():
+    database, config = sheets()
+    flusher = StatusFlusher(database, config, start_row=0, flush_rows=2, flush_seconds=3600)
+    flusher.record(0, "True")
+    assert database.column(6, 2, 2) == [""]
+    flusher.record(1, "True")
+    assert database.column(6, 2, 3) == ["True", "True"]
+    assert config.column(2, 2, 2) == ["2"]
+
+
+def test_cursor_sink_replaces_b2():
+    database, config = sheets()
+    saved = []
+    flusher = StatusFlusher(database, config, start_row=2, flush_rows=100, flush_seconds=3600, cursor_sink=saved.append)
+    flusher.record(2, "True")
+    flusher.flush()
+    assert saved == [3]
+    assert config.column(2, 2, 2) == ["0"]
+
+
+def test_failed_write_keeps_statuses_and_cursor_for_retry(monkeypatch):
+    database, config = sheets()
+    flusher = StatusFlusher(database, config, start_row=0, flush_rows=100, flush_seconds=3600)
+    flusher.record(0, "True")
+
+    def rejected(data):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(database, "batch_update", rejected)
+    flusher.flush()
+    assert config.column(2, 2, 2) == ["0"]
+    monkeypatch.undo()
+    flusher.flush()
+    assert database.column(6, 2, 2) == ["True"]
+    assert config.column(2, 2, 2) == ["1"]
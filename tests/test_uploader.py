@@ -0,0 +1,228 @@
+import os
+import threading
+from typing import Any
+
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+
+from fakes import FakeDrive
+from screenshot_app.uploader import UploadJob, UploadPool, UploadSessionStore, resumable_upload
+
+
+def run_pool(pool: UploadPool, jobs, timeout: float = 10.0) -> None:
+    """Submit ``jobs`` and close ``pool``, failing instead of hanging when the uploaders die."""
+
+    def target():
+        for job in jobs:
+            pool.submit(job)
+        pool.close()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "upload pool hung"
+
+
+def test_pool_uploads_files_and_removes_them(tmp_path):
+    drive: Any = FakeDrive()
+    results = {}
+    pool = UploadPool(drive, lambda row_idx, result: results.__setitem__(row_idx, result), workers=2)
+    jobs = []
+    for row_idx in range(3):
+        path = os.path.join(str(tmp_path), f"row{row_idx}.png")
+        with open(path, "wb") as f:
+            f.write(b"png")
+        jobs.append(UploadJob(row_idx=row_idx, path=path, name=f"shot{row_idx}.png", folder_id="folder"))
+    jobs.append(UploadJob(row_idx=3, path=None, name="shot3.webp", folder_id="folder", data=b"webp"))
+    run_pool(pool, jobs)
+    assert {row_idx: result.status for row_idx, result in results.items()} == {0: "True", 1: "True", 2: "True", 3: "True"}
+    assert results[3].file_extension == "webp"
+    assert drive.files_by_id[results[0].file_id]["parents"] == ["folder"]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_failing_result_callback_keeps_uploaders_alive():
+    drive: Any = FakeDrive()
+    handled = []
+
+    def on_result(row_idx, result):
+        handled.append(row_idx)
+        raise RuntimeError("callback failed")
+
+    pool = UploadPool(drive, on_result, workers=1, queue_size=1)
+    # More jobs than the queue holds: a dead uploader would block submit() for good
+    jobs = [UploadJob(row_idx=i, path=None, name=f"shot{i}.png", folder_id="folder", data=b"png") for i in range(5)]
+    run_pool(pool, jobs)
+    assert handled == [0, 1, 2, 3, 4]
+
+
+URI = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&upload_id=session"
+CHUNK = 256 * 1024
+
+
+class FlakyHttp(HttpMockSequence):
+    """Replays responses in order; a ``None`` entry drops the connection instead."""
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        if self._iterable and self._iterable[0] is None:
+            self._iterable.pop(0)
+            self.request_sequence.append((uri, method, body, headers))
+            raise ConnectionResetError("connection reset")
+        return super().request(uri, method, body, headers, redirections, connection_type)
+
+
+def drive_with(responses):
+    http = FlakyHttp(responses)
+    return build("drive", "v3", http=http, static_discovery=True), http
+
+
+def content_ranges(http):
+    ranges = []
+    for _, method, _, headers in http.request_sequence:
+        if method == "PUT":
+            ranges.append({name.lower(): value for name, value in headers.items()}.get("content-range"))
+    return ranges
+
+
+def write_file(tmp_path, size):
+    path = os.path.join(str(tmp_path), "shot.png")
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_resumable_upload_sends_chunks_in_order():
+    service, http = drive_with(
+        [
+            ({"status": "200", "location": URI}, ""),
+            ({"status": "308", "range": "bytes=0-262143"}, ""),
+            ({"status": "308", "range": "bytes=0-524287"}, ""),
+            ({"status": "200"}, '{"id": "uploaded"}'),
+        ]
+    )
+    data = b"x" * (2 * CHUNK + 1000)
+    assert resumable_upload(service, None, "shot.png", "folder", chunk_size=CHUNK, data=data) == "uploaded"
+    assert content_ranges(http) == [
+        f"bytes 0-{CHUNK - 1}/{len(data)}",
+        f"bytes {CHUNK}-{2 * CHUNK - 1}/{len(data)}",
+        f"bytes {2 * CHUNK}-{len(data) - 1}/{len(data)}",
+    ]
+
+
+def test_server_errors_are_retried():
+    service, http = drive_with(
+        [
+            ({"status": "200", "location": URI}, ""),
+            ({"status": "503"}, ""),
+            # Asked for its progress after the error, Drive has none of the bytes
+            ({"status": "308"}, ""),
+            ({"status": "200"}, '{"id": "uploaded"}'),
+        ]
+    )
+    assert resumable_upload(service, None, "shot.png", "folder", data=b"png", backoff_base=0) == "uploaded"
+    assert content_ranges(http) == ["bytes 0-2/3", "bytes */3", "bytes 0-2/3"]
+
+
+def test_non_retryable_error_is_raised():
+    service, _ = drive_with([({"status": "200", "location": URI}, ""), ({"status": "400"}, "")])
+    with pytest.raises(HttpError):
+        resumable_upload(service, None, "shot.png", "folder", data=b"png", backoff_base=0)
+
+
+def test_dropped_connection_resyncs_before_the_next_chunk():
+    size = CHUNK + 100
+    service, http = drive_with(
+        [
+            ({"status": "200", "location": URI}, ""),
+            ({"status": "308", "range": f"bytes=0-{CHUNK - 1}"}, ""),
+            None,
+            # Drive already has the second chunk's first half
+            ({"status": "308", "range": f"bytes=0-{CHUNK + 49}"}, ""),
+            ({"status": "200"}, '{"id": "uploaded"}'),
+        ]
+    )
+    data = b"x" * size
+    assert resumable_upload(service, None, "shot.png", "folder", chunk_size=CHUNK, data=data, backoff_base=0) == "uploaded"
+    assert content_ranges(http) == [
+        f"bytes 0-{CHUNK - 1}/{size}",
+        f"bytes {CHUNK}-{size - 1}/{size}",
+        f"bytes */{size}",
+        f"bytes {CHUNK + 50}-{size - 1}/{size}",
+    ]
+
+
+def test_interrupted_file_upload_resumes_from_persisted_session(tmp_path):
+    size = CHUNK + 100
+    path = write_file(tmp_path, size)
+    store = UploadSessionStore(os.path.join(str(tmp_path), "sessions"))
+    service, _ = drive_with(
+        [
+            ({"status": "200", "location": URI}, ""),
+            ({"status": "308", "range": f"bytes=0-{CHUNK - 1}"}, ""),
+            ({"status": "403"}, ""),
+        ]
+    )
+    with pytest.raises(HttpError):
+        resumable_upload(service, path, "shot.png", "folder", chunk_size=CHUNK, session_store=store)
+    assert store.load(path, "shot.png", "folder") == URI
+
+    # A later run asks Drive how far the session got instead of starting over
+    service, http = drive_with(
+        [
+            ({"status": "308", "range": f"bytes=0-{CHUNK - 1}"}, ""),
+            ({"status": "200"}, '{"id": "uploaded"}'),
+        ]
+    )
+    assert resumable_upload(service, path, "shot.png", "folder", chunk_size=CHUNK, session_store=store) == "uploaded"
+    assert [uri for uri, _, _, _ in http.request_sequence] == [URI, URI]
+    assert content_ranges(http) == [f"bytes */{size}", f"bytes {CHUNK}-{size - 1}/{size}"]
+    assert store.load(path, "shot.png", "folder") is None
+
+
+def test_resync_finds_upload_already_complete(tmp_path):
+    path = write_file(tmp_path, 100)
+    store = UploadSessionStore(os.path.join(str(tmp_path), "sessions"))
+    store.save(path, "shot.png", "folder", URI)
+    service, http = drive_with([({"status": "200"}, '{"id": "uploaded"}')])
+    assert resumable_upload(service, path, "shot.png", "folder", session_store=store) == "uploaded"
+    assert content_ranges(http) == ["bytes */100"]
+
+
+def test_expired_session_starts_a_new_upload(tmp_path):
+    path = write_file(tmp_path, 100)
+    store = UploadSessionStore(os.path.join(str(tmp_path), "sessions"))
+    store.save(path, "shot.png", "folder", URI)
+    fresh = URI.replace("session", "fresh")
+    service, http = drive_with(
+        [
+            ({"status": "404"}, ""),
+            ({"status": "200", "location": fresh}, ""),
+            ({"status": "200"}, '{"id": "uploaded"}'),
+        ]
+    )
+    assert resumable_upload(service, path, "shot.png", "folder", session_store=store, backoff_base=0) == "uploaded"
+    assert [uri for uri, _, _, _ in http.request_sequence][-1] == fresh
+    assert store.load(path, "shot.png", "folder") is None
+
+
+def test_session_store_only_trusts_unchanged_files(tmp_path):
+    path = write_file(tmp_path, 100)
+    store = UploadSessionStore(os.path.join(str(tmp_path), "sessions"))
+    store.save(path, "shot.png", "folder", URI)
+    assert store.has_session(path, "shot.png", "folder")
+    assert store.load(path, "other.png", "folder") is None
+    assert store.load(path, "shot.png", "other") is None
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert store.load(path, "shot.png", "folder") is None
+
+
+def test_session_store_prunes_expired_sessions_and_their_files(tmp_path):
+    path = write_file(tmp_path, 100)
+    store = UploadSessionStore(os.path.join(str(tmp_path), "sessions"), max_age_seconds=-1)
+    store.save(path, "shot.png", "folder", URI)
+    store.prune()
+    assert not os.path.exists(path)
+    assert os.listdir(store.directory) == []
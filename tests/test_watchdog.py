@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from screenshot_app.watchdog import DeadlineExceeded, Watchdog, current_deadline
+
+
+def test_expired_deadline_fires_callback_and_raises():
+    fired = threading.Event()
+    with pytest.raises(DeadlineExceeded, match="navigate exceeded"):
+        with Watchdog().deadline("navigate", 0.05, on_expire=fired.set) as deadline:
+            # Stands in for a call the callback breaks, e.g. by killing the browser
+            assert fired.wait(5)
+            raise ConnectionError("browser killed")
+    assert deadline.expired
+
+
+def test_cooperative_check_stops_the_phase():
+    with pytest.raises(DeadlineExceeded):
+        with Watchdog().deadline("capture", 0.01) as deadline:
+            while True:
+                deadline.check()
+                time.sleep(0.005)
+
+
+def test_finished_phase_is_cancelled():
+    fired = threading.Event()
+    watchdog = Watchdog()
+    with watchdog.deadline("readiness", 0.05, on_expire=fired.set) as deadline:
+        pass
+    time.sleep(0.1)
+    assert deadline.cancelled and not deadline.expired
+    assert not fired.is_set()
+
+
+def test_phase_ending_as_the_deadline_fires_still_raises():
+    firing = threading.Event()
+    left = threading.Event()
+
+    class SlowFire(threading.Event):
+        # Holds the watchdog between deciding to fire and firing, while the phase ends
+        def set(self):
+            firing.set()
+            left.wait(0.5)
+            super().set()
+
+    fired = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        try:
+            with Watchdog().deadline("upload", 0.01, on_expire=fired.set) as deadline:
+                deadline._fired = SlowFire()
+                assert firing.wait(5)
+        finally:
+            left.set()
+    # The callback only ever runs for a deadline the phase saw expire
+    assert fired.wait(5)
+
+
+def test_current_deadline_is_the_innermost_phase_of_this_thread():
+    watchdog = Watchdog()
+    assert current_deadline() is None
+    with watchdog.deadline("row", 60) as row:
+        with watchdog.deadline("navigate", 10) as navigate:
+            assert current_deadline() is navigate
+            assert 0 < navigate.remaining() <= 10
+        assert current_deadline() is row
+        other = []
+        thread = threading.Thread(target=lambda: other.append(current_deadline()))
+        thread.start()
+        thread.join()
+        assert other == [None]
+    assert current_deadline() is None